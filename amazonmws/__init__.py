@@ -1,2 +1,56 @@
-from .api import *
-from .throttler import Throttler, DEFAULT_LIMITS
+"""The names below are imported from their submodules the first time they are used, so that importing amazonmws
+stays fast (see tests/test_imports.py)."""
+
+from importlib import import_module
+
+
+#: Public names, and the submodules they come from.
+_EXPORTS = {
+    **dict.fromkeys([
+        'MWS_DOMAINS', 'PA_ENDPOINT', 'MARKETID', 'ParamList', 'encode_params', 'structured_list', 'nested_params',
+        'ServerClock', 'SignedRequest', 'AmzCall', 'Feeds', 'Finances', 'FulfillmentInboundShipment',
+        'FulfillmentInventory', 'FulfillmentOutboundShipment', 'MerchantFulfillment', 'Orders', 'Products',
+        'Recommendations', 'Reports', 'Sellers', 'Subscriptions', 'ProductAdvertising'
+    ], 'api'),
+    **dict.fromkeys([
+        'Throttler', 'DEFAULT_LIMITS', 'cache_key', 'TTLCache', 'CancelToken', 'Cancelled', 'DeadlineExceeded'
+    ], 'throttler'),
+    'PacingClock': 'pacing',
+    **dict.fromkeys(['Recorder', 'Replayer'], 'replay'),
+    **dict.fromkeys(['MWSError', 'parse_xml', 'iter_pages'], 'responses'),
+    **dict.fromkeys(['ResponseDecoder', 'decode_response'], 'decoding'),
+    'WatermarkStore': 'watermarks',
+    **dict.fromkeys(['OrderSync', 'OrderItemFetcher'], 'orders'),
+    'InventoryTracker': 'inventory',
+    **dict.fromkeys(['SnapshotBuilder', 'SnapshotIndex'], 'snapshot'),
+    **dict.fromkeys(['CircuitBreaker', 'CircuitOpen', 'breaker_for'], 'health'),
+    'FeesEngine': 'fees',
+    **dict.fromkeys(['OfferRecord', 'PriceRecord', 'OrderRecord', 'OrderItemRecord', 'InventoryRecord'], 'records'),
+    **dict.fromkeys(['InboundPlanner', 'ShipmentIndex', 'iter_shipment_items'], 'inbound'),
+    **dict.fromkeys(['iter_financial_events', 'iter_financial_event_groups', 'EventSpool'], 'finances'),
+    **dict.fromkeys(['NotificationManager', 'NotificationConsumer', 'MemoryQueue', 'FileQueue', 'SQSQueue'],
+                    'notifications'),
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    if name in _EXPORTS:
+        value = getattr(import_module(f'.{_EXPORTS[name]}', __name__), name)
+        globals()[name] = value     # Later lookups don't reach __getattr__()
+        return value
+
+    # Submodules, like amazonmws.api, are imported on first use too (importing one sets it on the package)
+    if not name.startswith('__'):
+        try:
+            return import_module(f'.{name}', __name__)
+        except ModuleNotFoundError as e:
+            if e.name != f'{__name__}.{name}':
+                raise
+
+    raise AttributeError(f'module {__name__!r} has no attribute {name!r}')
+
+
+def __dir__():
+    return sorted({*globals(), *__all__})
@@ -11,12 +11,16 @@ Contains the implementation of the API and a few extras.
 
 
 import hmac
-import urllib
+import urllib.parse
 
 from base64 import b64encode
+from collections import namedtuple
+from collections.abc import Mapping
 from functools import partial
 from hashlib import sha256, md5
-from time import strftime, gmtime
+from time import strftime, gmtime, time
+
+from .operations import CatalogAttribute, batches, find_operation, operation_method, section_operations
 
 
 #: A dictionary of endpoints for the MWS API, keyed by country code.
@@ -60,30 +64,216 @@ MARKETID = {
 }
 
 
+#: How long a signed request can be reused, in seconds. Amazon accepts requests for 15 minutes after their
+#: timestamp; the rest is left as a margin.
+REQUEST_VALIDITY = 14 * 60
+
+#: A request that has been signed by AmzCall.sign_request(), and can be sent (and resent) with AmzCall.send().
+SignedRequest = namedtuple('SignedRequest', ['action', 'params', 'method', 'url', 'data', 'headers', 'signed_at'])
+
+#: The (time tuple, string) most recently formatted by _timestamp().
+_last_timestamp = (None, None)
+
+
+def _timestamp(now):
+    """Return now (in seconds since the epoch) as an MWS timestamp. The string is formatted at most once a second;
+    other calls within the same second reuse it."""
+    global _last_timestamp
+
+    struct = gmtime(now)
+    last_struct, string = _last_timestamp
+    if struct != last_struct:
+        string = strftime('%Y-%m-%dT%H:%M:%SZ', struct)
+        _last_timestamp = struct, string
+
+    return string
+
+
+class ServerClock:
+    """Estimates the offset between the local clock and Amazon's, from the Date headers of responses, so that
+    request timestamps can be taken from Amazon's clock instead of a local one that might be off (which leads to
+    RequestExpired errors). Since Date headers are only accurate to the second, differences of less than a second
+    are ignored."""
+
+    def __init__(self, offset=0.0):
+        """Initialize the ServerClock object."""
+        self.offset = offset
+
+    def time(self):
+        """Return the estimated server time, in seconds since the epoch."""
+        return time() + self.offset
+
+    def observe(self, date, received=None):
+        """Update the offset from a Date header (an RFC 1123 date) received at local time received (by default,
+        now). Returns the new offset."""
+        from email.utils import parsedate_to_datetime
+
+        received = time() if received is None else received
+        sample = parsedate_to_datetime(date).timestamp() + 0.5 - received     # The header is rounded down
+        if abs(sample - self.offset) >= 1:
+            self.offset = sample
+
+        return self.offset
+
+    def observe_response(self, response):
+        """Update the offset from response's Date header, if it has one. Returns the offset."""
+        headers = getattr(response, 'headers', None)
+        date = headers.get('Date') if isinstance(headers, Mapping) else None
+        if date:
+            try:
+                self.observe(date)
+            except (TypeError, ValueError):
+                pass
+
+        return self.offset
+
+
+#: The ServerClock used by AmzCall objects that aren't given one.
+SERVER_CLOCK = ServerClock()
+
+
+def _quote(value):
+    """Percent-encode a parameter value the way MWS expects."""
+    return urllib.parse.quote(str(value), safe='-_.~', encoding='utf-8')
+
+
+def _sign_batch(secret_key, prefix, param_strings):
+    """Return a list of quoted signatures, one for each string in param_strings. prefix is the part of the string
+    to sign that comes before the parameters (method, domain and URI); it is hashed only once, and the HMAC state
+    copied for each parameter string. This is a module-level function so that it can be used with a process pool."""
+    base = hmac.new(secret_key.encode(), prefix.encode(), sha256)
+    signatures = []
+
+    for param_string in param_strings:
+        digest = base.copy()
+        digest.update(param_string.encode())
+        signatures.append(urllib.parse.quote(b64encode(digest.digest()).decode(), safe=''))
+
+    return signatures
+
+
+def _build_url_batch(secret_key, prefix, base_url, constant_params, action_type, requests):
+    """Return a list of signed URLs for a batch of (action, params) tuples. constant_params must already be
+    quoted. Used by AmzCall.build_request_urls()."""
+    param_strings = [
+        encode_params({action_type: action, **params}, quoted=constant_params) for action, params in requests
+    ]
+
+    signatures = _sign_batch(secret_key, prefix, param_strings)
+    return [f'{base_url}{params}&Signature={signature}' for params, signature in zip(param_strings, signatures)]
+
+
+class ParamList(Mapping):
+    """A structured list of parameters, like ReportRequestIdList.Id.1, ReportRequestIdList.Id.2, etc. Keys and
+    values are generated on demand instead of being stored, and encode_params() writes them straight into the query
+    string. A ParamList can still be used like a (read-only) dict, or unpacked with **."""
+
+    __slots__ = ('root', 'label', 'entries')
+
+    def __init__(self, root, label, values):
+        self.root = root
+        self.label = label
+        self.entries = values if isinstance(values, (list, tuple)) else list(values)
+
+    def pairs(self):
+        """Yield (key, value) tuples for each parameter in the list."""
+        prefix = f'{self.root}.{self.label}.'
+        for idx, value in enumerate(self.entries, start=1):
+            if isinstance(value, dict):
+                for sub_key, sub_value in value.items():
+                    yield f'{prefix}{idx}.{sub_key}', sub_value
+            else:
+                yield f'{prefix}{idx}', value
+
+    def __getitem__(self, key):
+        prefix = f'{self.root}.{self.label}.'
+        if isinstance(key, str) and key.startswith(prefix):
+            idx, _, sub_key = key[len(prefix):].partition('.')
+            if idx.isdigit() and 0 < int(idx) <= len(self.entries):
+                value = self.entries[int(idx) - 1]
+                if isinstance(value, dict) and sub_key in value:
+                    return value[sub_key]
+                elif not isinstance(value, dict) and not sub_key:
+                    return value
+
+        raise KeyError(key)
+
+    def __iter__(self):
+        return (key for key, value in self.pairs())
+
+    def __len__(self):
+        return sum(len(value) if isinstance(value, dict) else 1 for value in self.entries)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({self.root!r}, {self.label!r}, {self.entries!r})'
+
+
+def encode_params(params, quoted=None):
+    """Return the canonical query string for params: percent-encoded, sorted by key, and joined with '&'. Values
+    that are None are left out, ParamList values are expanded in place (their key is ignored), and lists or tuples
+    are expanded using AmzCall.enumerate_param(). quoted is an optional dict of parameters that have already been
+    percent-encoded; params takes precedence over it."""
+    pairs = [(key, value) for key, value in quoted.items() if key not in params] if quoted else []
+    append = pairs.append
+
+    for key, value in params.items():
+        if value is None:
+            continue
+        elif isinstance(value, (list, tuple)):
+            value = AmzCall.enumerate_param(key, value)
+
+        if isinstance(value, ParamList):
+            for sub_key, sub_value in value.pairs():
+                append((sub_key, _quote(sub_value)))
+        else:
+            append((key, _quote(value)))
+
+    pairs.sort()
+    return '&'.join([f'{key}={value}' for key, value in pairs])
+
+
 def structured_list(root_label, sub_label, items):
     """Build a structured list of parameters. Example: structured_list('ReportRequestIdList', 'Id', ['one', 'two'])
-    returns {'ReportRequestIdList.Id.1': 'one', 'ReportRequestIdList.Id.2': 'two'}"""
-    result = {}
-    for idx, item in enumerate(items, start=1):
-        sub_items = {f'{idx}.{key}': val for key, val in item.items()} if isinstance(item, dict) else {f'{idx}': item}
-        for sub_item, value in sub_items.items():
-            result[f'{root_label}.{sub_label}.{sub_item}'] = value
+    returns a ParamList equal to {'ReportRequestIdList.Id.1': 'one', 'ReportRequestIdList.Id.2': 'two'}. The result
+    can be passed to an API call using any keyword, e.g. api.GetReportRequestList(ids=structured_list(...))."""
+    return ParamList(root_label, sub_label, items)
+
 
-    return result
+def nested_params(root, value):
+    """Flatten a structured parameter into dotted parameter names. Example: nested_params('ShipFromAddress',
+    {'Name': 'Me', 'City': 'Here'}) returns {'ShipFromAddress.Name': 'Me', 'ShipFromAddress.City': 'Here'}. Nested
+    dicts are flattened as well; other values (including lists) are left as they are."""
+    if not isinstance(value, dict):
+        return {root: value}
+
+    params = {}
+    for key, sub_value in value.items():
+        params.update(nested_params(f'{root}.{key}', sub_value))
+
+    return params
 
 
 class AmzCall:
-    """Base class for API objects. Handles building and signing requests.
+    """Base class for API objects. Handles building and signing requests. Subclasses set SECTION to the name of
+    their section in the operation catalog; each operation then becomes a method of the class the first time it is
+    used. URI, VERSION and METHOD are also read from the catalog. If SECTION is None, any attribute is treated as an
+    operation name.
     """
 
-    URI = '/'
-    VERSION = '2009-01-01'
+    SECTION = None
+    URI = CatalogAttribute('uri', '/')
+    VERSION = CatalogAttribute('version', '2009-01-01')
+    METHOD = CatalogAttribute('method', 'POST')
     ACCOUNT_TYPE = 'SellerId'
     ACTION_TYPE = 'Action'
     USER_AGENT = 'amazonmws/0.0.1 (Language=Python)'
 
-    def __init__(self, access_key, secret_key, seller_id, auth_token=None, domain='NA', default_market='US', make_request=None):
-        """Initialize the AmzCall object."""
+    def __init__(self, access_key, secret_key, seller_id, auth_token=None, domain='NA', default_market='US', make_request=None,
+                 clock=None, decoder=None):
+        """Initialize the AmzCall object. If decoder is given (a callable, usually a ResponseDecoder; see
+        amazonmws.decoding), every response is passed through it, and calls return what it returns instead of the
+        raw response, so large responses are parsed in other processes. Helpers that parse raw responses themselves,
+        like iter_pages(), need an API object without a decoder."""
 
         if None in (access_key, secret_key, seller_id):
             raise ValueError('access_key, secret_key, or seller_id can not be None.')
@@ -101,53 +291,64 @@ class AmzCall:
         self._auth_token = auth_token
         self._domain = MWS_DOMAINS[domain] if len(domain) == 2 else domain
         self._default_market = MARKETID[default_market] if len(default_market) == 2 else default_market
-        self.make_request = make_request or print
+        self.make_request = print if make_request is None else make_request
+        self.clock = SERVER_CLOCK if clock is None else clock
+        self.decoder = decoder
 
     @staticmethod
     def enumerate_param(root, values):
-        """Formats a list of values into a parameter list acceptable to MWS."""
+        """Formats a list of values into a parameter list acceptable to MWS. Returns a ParamList."""
         if root == 'MarketplaceId':
             ptype = 'Id'
         else:
             ptype = root.replace('List', '')        # Ex: ASINList -> ASIN
 
-        params = {}
+        return ParamList(root, ptype, values)
 
-        for num, val in enumerate(values, start=1):
-            base = '{}.{}.{}'.format(root, ptype, num)
-            if isinstance(val, dict):
-                params.update({'{}.{}'.format(base, k):str(v) for k,v in val.items()})
-            else:
-                params.update({base:val})
+    def list_params(self, action, params):
+        """Return params with the list values of action's structured list parameters converted to ParamLists, using
+        the labels given in the operation catalog. Other lists are left for enumerate_param(). Raises ValueError if
+        a list is longer than the operation accepts."""
+        operation = find_operation(self.SECTION, action) if self.SECTION else None
+        if operation is None or not operation.lists:
+            return params
 
-        return params
+        converted = None
+        for key, (label, max_items) in operation.lists.items():
+            value = params.get(key)
+            if not isinstance(value, (list, tuple)):
+                continue
 
-    def build_request_params(self, action, **kwargs):
-        """Return a dict populated with request parameters."""
+            if max_items is not None and len(value) > max_items:
+                raise ValueError(f'{action} accepts at most {max_items} values for {key}, got {len(value)}.')
 
+            converted = converted or dict(params)
+            converted[key] = ParamList(key, label, value)
+
+        return params if converted is None else converted
+
+    def common_params(self):
+        """Return a dict of the parameters sent with every request (credentials, signature settings, timestamp and
+        version). Used by build_request_params() and build_request_urls(); subclasses add their own here."""
         params = {
             'AWSAccessKeyId': self._access_key,
-            self.ACTION_TYPE: action,
             self.ACCOUNT_TYPE: self._account_id,
             'SignatureMethod': 'HmacSHA256',
             'SignatureVersion': '2',
-            'Timestamp': strftime('%Y-%m-%dT%H:%M:%SZ', gmtime()),
+            'Timestamp': _timestamp(self.clock.time()),
             'Version': self.VERSION,
-            **kwargs
         }
 
         if self._auth_token:
             params['MWSAuthToken'] = self._auth_token
 
-        quoted_params = {key:
-            urllib.parse.quote(
-                str(value),
-                safe='-_.~',
-                encoding='utf-8'
-            ) for key, value in params.items() if value is not None
-        }
+        return params
 
-        return '&'.join((f'{key}={quoted_params[key]}' for key in sorted(quoted_params)))
+    def build_request_params(self, action, **kwargs):
+        """Return the canonical query string for a request. List values are expanded using list_params(), or
+        enumerate_param() for lists the catalog doesn't describe."""
+        kwargs = self.list_params(action, kwargs)
+        return encode_params({**self.common_params(), self.ACTION_TYPE: action, **kwargs})
 
     def build_request_url(self, method, action, **kwargs):
         """Return a properly formatted and signed request URL based on the given parameters."""
@@ -171,10 +372,76 @@ class AmzCall:
         # Create the URL
         return f'https://{self._domain}{self.URI}?{params}&Signature={signature}'
 
+    def build_request_urls(self, requests, method=None, processes=None, chunk_size=500):
+        """Return a list of signed request URLs, one for each (action, params) tuple in requests. This produces
+        the same URLs as calling build_request_url() for each request, but does the constant work only once: the
+        common parameters are quoted once, all URLs share a single timestamp, and the method/domain/URI part of
+        the string to sign is hashed once. method defaults to the section's METHOD. If processes is given, signing
+        is split into chunks of chunk_size requests and distributed (quoting included) across a process pool of
+        that size."""
+        requests = [(action, self.list_params(action, params)) for action, params in requests]
+        method = (method or self.METHOD).upper()
+        constant_params = {key: _quote(value) for key, value in self.common_params().items()}
+
+        prefix = '\n'.join((method, self._domain.lower(), self.URI, ''))
+        base_url = f'https://{self._domain}{self.URI}?'
+        build = partial(_build_url_batch, self._secret_key, prefix, base_url, constant_params, self.ACTION_TYPE)
+
+        if processes and len(requests) > chunk_size:
+            from concurrent.futures import ProcessPoolExecutor
+
+            chunks = [requests[i:i + chunk_size] for i in range(0, len(requests), chunk_size)]
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                return [url for chunk in executor.map(build, chunks) for url in chunk]
+
+        return build(requests)
+
+    @classmethod
+    def operations(cls):
+        """Return a dict of the Operations in this class's section, or None if SECTION is not set."""
+        return None if cls.SECTION is None else section_operations(cls.SECTION)
+
     def __getattr__(self, name):
-        return partial(self._do_api_call, name)
+        if name.startswith('_'):
+            raise AttributeError(name)
 
-    def _do_api_call(self, operation, **kwargs):
+        cls = type(self)
+        if cls.SECTION is None:
+            return partial(self._do_api_call, name)
+
+        operation = find_operation(cls.SECTION, name)
+        if operation is None:
+            raise AttributeError(f'{cls.__name__} has no operation named {name}.')
+
+        # Cache the method on the class, so that later lookups don't reach __getattr__()
+        method = operation_method(operation)
+        setattr(cls, name, method)
+        return method.__get__(self, cls)
+
+    def call_batched(self, action, param, values, **kwargs):
+        """Call action once for each batch of values, passing the batch as param. Batches are as large as the
+        operation catalog allows for param. Returns a list of results, one per batch."""
+        operation = find_operation(self.SECTION, action) if self.SECTION else None
+        return [self._do_api_call(action, **{param: batch}, **kwargs) for batch in batches(operation, param, values)]
+
+    def __dir__(self):
+        return sorted({*super().__dir__(), *(self.operations() or ())})
+
+    @staticmethod
+    def _transport_options(kwargs):
+        """Remove the timeout and cancel options from kwargs, and return the ones to pass to make_request. If cancel
+        (a CancelToken) has been cancelled, raises Cancelled instead of making the request."""
+        timeout = kwargs.pop('timeout', None)
+        cancel = kwargs.pop('cancel', None)
+
+        if cancel is not None:
+            cancel.check()
+
+        return {} if timeout is None else {'timeout': timeout}
+
+    def sign_request(self, action, **kwargs):
+        """Build and sign a request for action, and return it as a SignedRequest. The request can be sent (or
+        retried) with send() for REQUEST_VALIDITY seconds without being signed again."""
         headers = {
             'User-Agent': self.USER_AGENT
         }
@@ -193,9 +460,28 @@ class AmzCall:
                 'Content-Type': 'text/xml'
             })
 
-        url = self.build_request_url('POST', operation, **kwargs)
+        signed_at = self.clock.time()
+        url = self.build_request_url(self.METHOD, action, **kwargs)
+
+        return SignedRequest(action, kwargs, self.METHOD, url, body, headers, signed_at)
 
-        return self._make_request(method='POST', url=url, data=body, headers=headers)
+    def send(self, request, **options):
+        """Send a SignedRequest using make_request, and return the response (decoded, if a decoder is set). If the
+        request is too old to be accepted, it is signed again first. The clock is updated from the response's Date
+        header."""
+        if self.clock.time() - request.signed_at > REQUEST_VALIDITY:
+            request = self.sign_request(request.action, body=request.data, **request.params)
+
+        if request.data is not None:
+            options['data'] = request.data
+
+        response = self._make_request(method=request.method, url=request.url, headers=request.headers, **options)
+        self.clock.observe_response(response)
+        return response if self.decoder is None else self.decoder(response)
+
+    def _do_api_call(self, operation, **kwargs):
+        options = self._transport_options(kwargs)
+        return self.send(self.sign_request(operation, **kwargs), **options)
 
     @property
     def make_request(self):
@@ -210,91 +496,81 @@ class AmzCall:
 
 class Feeds(AmzCall):
     """Interface to the Feeds section of the MWS API."""
-    URI = '/'
-    VERSION = '2009-01-01'
+    SECTION = 'Feeds'
 
 
 class Finances(AmzCall):
     """Interface to the Finances section of the API."""
-    URI = '/Finances/2015-05-01'
-    VERSION = '2015-05-01'
-
-
-class Products(AmzCall):
-    """Interface to the Products section of the MWS API."""
-    URI = '/Products/2011-10-01'
-    VERSION = '2011-10-01'
+    SECTION = 'Finances'
 
 
 class FulfillmentInboundShipment(AmzCall):
     """Interface to the Fulfillment Inbound Shipment section of the API."""
-    URI = '/FulfillmentInboundShipment/2010-10-01'
-    VERSION = '2010-10-01'
+    SECTION = 'FulfillmentInboundShipment'
 
 
 class FulfillmentInventory(AmzCall):
     """Interface to the Fulfillment Inventory section of the API."""
-    URI = '/FulfillmentInventory/2010-10-01'
-    VERSION = '2010-10-01'
+    SECTION = 'FulfillmentInventory'
 
 
 class FulfillmentOutboundShipment(AmzCall):
     """Interface to the Fulfillment Outbound Shipment section of the API."""
-    URI = '/FulfillmentOutboundShipment/2010-10-01'
-    VERSION = '2010-10-01'
+    SECTION = 'FulfillmentOutboundShipment'
 
 
 class MerchantFulfillment(AmzCall):
     """Interface to the Merchant Fulfillment section of the API."""
-    URI = '/MerchantFulfillment/2015-06-01'
-    VERSION = '2015-06-01'
+    SECTION = 'MerchantFulfillment'
 
 
 class Orders(AmzCall):
     """Interface to the Orders section of the API."""
-    URI = '/Orders/2013-09-01'
-    VERSION = '2013-09-01'
+    SECTION = 'Orders'
 
 
 class Products(AmzCall):
     """Interface to the Products section of the API."""
-    URI = '/Products/2011-10-01'
-    VERSION = '2011-10-01'
+    SECTION = 'Products'
+
+    def fees_engine(self, **kwargs):
+        """Return a FeesEngine (see amazonmws.fees) that estimates fees using this object."""
+        from .fees import FeesEngine
+
+        return FeesEngine(self, **kwargs)
 
 
 class Recommendations(AmzCall):
     """Interface to the Recommendations section of the API."""
-    URI = '/Recommendations/2013-04-01'
-    VERSION = '2013-04-01'
+    SECTION = 'Recommendations'
 
 
 class Reports(AmzCall):
     """Interface to the Reports section of the API."""
-    URI = '/'
-    VERSION ='2009-01-01'
+    SECTION = 'Reports'
 
 
 class Sellers(AmzCall):
     """Interface to the Sellers section of the API."""
-    URI = '/Sellers'
-    VERSION = '2011-07-01'
+    SECTION = 'Sellers'
 
 
 class Subscriptions(AmzCall):
     """Interface to the Subscriptions section of the API."""
-    URI = '/Subscriptions/2013-07-01'
-    VERSION = '2013-07-01'
+    SECTION = 'Subscriptions'
 
 
 class ProductAdvertising(AmzCall):
-    """Interface to the Product Advertising API."""
-    URI = '/onca/xml'
-    VERSION = ''
+    """Interface to the Product Advertising API. If pacing is provided (see amazonmws.pacing.PacingClock), each
+    request waits for a slot from it first, which can be used to keep several processes within the associate tag's
+    request rate."""
+    SECTION = 'ProductAdvertising'
     ACCOUNT_TYPE = 'AssociateTag'
     ACTION_TYPE = 'Operation'
 
     def __init__(self, access_key, secret_key, account_id, **kwargs):
         region = kwargs.pop('region', 'US')
+        self.pacing = kwargs.pop('pacing', None)
         super(ProductAdvertising, self).__init__(access_key, secret_key, account_id, **kwargs)
 
         try:
@@ -302,9 +578,53 @@ class ProductAdvertising(AmzCall):
         except KeyError:
             raise ValueError(f'Invalid region: {region}. Recognized values are {", ".join(PA_ENDPOINT.keys())}')
 
-    def _api_call(self, operation, **kwargs):
-        kwargs['Service'] = 'AWSECommerceService'
-        headers = self.build_headers()
-        url = self.build_request_url('GET', operation, **kwargs)
+    def common_params(self):
+        return {**super().common_params(), 'Service': 'AWSECommerceService'}
+
+    def _do_api_call(self, operation, **kwargs):
+        options = self._transport_options(kwargs)
+
+        if self.pacing is not None:
+            self.pacing.wait()
+
+        return self.send(self.sign_request(operation, **kwargs), **options)
+
+    @classmethod
+    def batch_item_ids(cls, item_ids):
+        """Split item_ids into comma-separated strings, each as long as the catalog allows for ItemLookup."""
+        return batches(find_operation(cls.SECTION, 'ItemLookup'), 'ItemId', item_ids)
+
+    def item_lookup(self, item_ids, **kwargs):
+        """Look up any number of items, as many at a time as ItemLookup allows. Returns a list of results, one per
+        batch."""
+        return self.call_batched('ItemLookup', 'ItemId', item_ids, **kwargs)
+
+    async def item_lookup_async(self, item_ids, decoder=None, **kwargs):
+        """Like item_lookup(), but the batches are requested concurrently. If make_request is a coroutine function
+        it is awaited directly; otherwise, requests are made in the event loop's default executor. If decoder (see
+        amazonmws.decoding.ResponseDecoder, or any function of a response; by default, the API object's decoder) is
+        given, the results are decoded responses. A ResponseDecoder parses large ones outside of the event loop;
+        other decoders are run in the default executor."""
+        import asyncio
+
+        decoder = self.decoder if decoder is None else decoder
+
+        loop = asyncio.get_running_loop()
+        is_async = asyncio.iscoroutinefunction(self._make_request)
+
+        async def lookup(batch):
+            if self.pacing is not None:
+                await self.pacing.wait_async()
+
+            signed = self.sign_request('ItemLookup', ItemId=batch, **kwargs)
+            request = partial(self._make_request, method=signed.method, url=signed.url, headers=signed.headers)
+
+            response = await request() if is_async else await loop.run_in_executor(None, request)
+            self.clock.observe_response(response)
+            if decoder is None:
+                return response
+            elif hasattr(decoder, 'decode_async'):
+                return await decoder.decode_async(response)
+            return await loop.run_in_executor(None, decoder, response)
 
-        return self._make_request('GET', url, headers=headers)
\ No newline at end of file
+        return await asyncio.gather(*(lookup(batch) for batch in self.batch_item_ids(item_ids)))
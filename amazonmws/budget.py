@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`budget` -- Sharing hourly request limits
+----------------------------------------------
+
+.. module:: budget
+
+Contains HourlyCounter, which counts events over a rolling hour, and HourlyBudget, which divides an action's
+hourly_max between the jobs (consumers) using it. Throttler creates an HourlyBudget for each action that has an
+hourly_max; see Throttler.register_consumer().
+"""
+
+
+from array import array
+from threading import RLock
+from time import time
+
+
+class HourlyCounter:
+    """Counts events over a rolling window (an hour by default). Counts are kept in a ring buffer of resolution
+    buckets, each covering window / resolution seconds, so adding an event and reading the total are both O(1), and
+    old buckets are cleared as the window moves on. An event stays counted until its whole bucket has left the
+    window, which errs on the side of counting it up to one bucket longer than necessary."""
+
+    def __init__(self, window=3600, resolution=60):
+        """Initialize the HourlyCounter object."""
+        self.width = window / resolution
+        self._counts = array('l', [0]) * (resolution + 1)
+        self._head = None       # The number of the most recent bucket
+        self._total = 0
+
+    def _advance(self, now):
+        """Move the window forward to now, clearing the buckets that leave it. Returns the current bucket number."""
+        bucket = int(now // self.width)
+        if self._head is None:
+            self._head = bucket
+        elif bucket > self._head:
+            size = len(self._counts)
+            for cleared in range(self._head + 1, min(bucket, self._head + size) + 1):
+                slot = cleared % size
+                self._total -= self._counts[slot]
+                self._counts[slot] = 0
+            self._head = bucket
+
+        return bucket
+
+    def add(self, count=1, now=None):
+        """Count count events at time now (by default, the current time)."""
+        bucket = self._advance(time() if now is None else now)
+        if bucket > self._head - len(self._counts):
+            self._counts[bucket % len(self._counts)] += count
+            self._total += count
+
+    def total(self, now=None):
+        """Return the number of events in the window ending at now."""
+        self._advance(time() if now is None else now)
+        return self._total
+
+    def snapshot(self):
+        """Return the counts in the window as a JSON-serializable list of [bucket start time, count] pairs, oldest
+        first. See restore()."""
+        if self._head is None:
+            return []
+
+        size = len(self._counts)
+        return [
+            [bucket * self.width, self._counts[bucket % size]]
+            for bucket in range(self._head - size + 1, self._head + 1) if self._counts[bucket % size]
+        ]
+
+    def restore(self, snapshot):
+        """Add the counts from a snapshot() back. Buckets that have left the window since are cleared the next time
+        the counter is used, as usual."""
+        for start, count in snapshot:
+            self.add(count, start)
+
+    def next_expiry(self, now=None):
+        """Return how long (in seconds) until the oldest counted events leave the window, or 0 if there are none."""
+        now = time() if now is None else now
+        self._advance(now)
+        size = len(self._counts)
+
+        for bucket in range(self._head - size + 1, self._head + 1):
+            if self._counts[bucket % size]:
+                return max((bucket + size) * self.width - now, 0)
+
+        return 0
+
+
+class HourlyBudget:
+    """Divides hourly_max requests per hour between consumers, in proportion to their weights (a dict of
+    {consumer: weight}; consumers that aren't in it have a weight of 1). Only active consumers, those that have asked
+    for a request within the last idle_timeout seconds, get a share. A consumer can always use its own share, and can
+    also use any part of the budget that isn't set aside for the other active consumers, so shares that go unused
+    aren't wasted. Safe to use from multiple threads."""
+
+    def __init__(self, hourly_max, weights=None, idle_timeout=600, resolution=60):
+        """Initialize the HourlyBudget object."""
+        self.hourly_max = hourly_max
+        self.weights = {} if weights is None else weights
+        self.idle_timeout = idle_timeout
+        self.resolution = resolution
+        self.used = HourlyCounter(resolution=resolution)
+        self._used_by = {}
+        self._last_seen = {}
+        self._lock = RLock()
+
+    def _counter(self, consumer):
+        counter = self._used_by.get(consumer)
+        if counter is None:
+            counter = self._used_by[consumer] = HourlyCounter(resolution=self.resolution)
+
+        return counter
+
+    def shares(self, now=None):
+        """Return a dict of each active consumer's share of the budget."""
+        now = time() if now is None else now
+        with self._lock:
+            active = [consumer for consumer, seen in self._last_seen.items() if now - seen < self.idle_timeout]
+
+        total_weight = sum(self.weights.get(consumer, 1) for consumer in active)
+        return {consumer: self.hourly_max * self.weights.get(consumer, 1) / total_weight for consumer in active}
+
+    def wait(self, consumer=None, now=None):
+        """Return how long consumer must wait (in seconds) before its next request fits in the budget, or 0 if it
+        can be made now. Also marks consumer as active."""
+        now = time() if now is None else now
+        with self._lock:
+            return self._wait(consumer, now)
+
+    def _wait(self, consumer, now):
+        self._last_seen[consumer] = now
+
+        used = self.used.total(now)
+        if used >= self.hourly_max:
+            return self.used.next_expiry(now)
+
+        shares = self.shares(now)
+        own = self._counter(consumer)
+        if own.total(now) < shares[consumer]:
+            return 0
+
+        others = [other for other in shares if other != consumer]
+        reserved = sum(max(shares[other] - self._counter(other).total(now), 0) for other in others)
+        if used + reserved < self.hourly_max:
+            return 0
+
+        # Wait until some of our own requests expire, or another consumer goes idle and frees its share
+        idle = [self._last_seen[other] + self.idle_timeout - now for other in others]
+        return max(min([own.next_expiry(now), *idle]), 0)
+
+    def record(self, consumer=None, now=None):
+        """Count a request made by consumer."""
+        now = time() if now is None else now
+        with self._lock:
+            self._last_seen[consumer] = now
+            self.used.add(1, now)
+            self._counter(consumer).add(1, now)
+
+    def snapshot(self):
+        """Return a JSON-serializable copy of the budget's usage: the requests counted over the last hour, and
+        each consumer's requests and when it was last seen. Only consumers named by strings (or None) are included.
+        See restore()."""
+        with self._lock:
+            return {
+                'used': self.used.snapshot(),
+                'consumers': [
+                    [consumer, self._last_seen.get(consumer), counter.snapshot()]
+                    for consumer, counter in self._used_by.items() if consumer is None or isinstance(consumer, str)
+                ]
+            }
+
+    def restore(self, snapshot):
+        """Add the usage from a snapshot() back, e.g. after a restart, so that requests made within the last hour
+        still count against hourly_max."""
+        with self._lock:
+            self.used.restore(snapshot.get('used', []))
+            for consumer, last_seen, counts in snapshot.get('consumers', []):
+                if last_seen is not None:
+                    self._last_seen[consumer] = max(last_seen, self._last_seen.get(consumer, last_seen))
+                self._counter(consumer).restore(counts)
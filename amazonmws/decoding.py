@@ -0,0 +1,112 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`decoding` -- Decoding large responses in other processes
+--------------------------------------------------------------
+
+.. module:: decoding
+
+Contains ResponseDecoder, which turns API responses into plain dicts. Small responses are decoded where they are;
+large ones (like a GetMatchingProductForId response for five products, or a report) are handed to a process pool, so
+that parsing them doesn't hold up an event loop or the other threads of the process. The response body is copied
+once into a shared memory block, and the worker parses it from there; only the decoded dict is sent back.
+
+Pass a ResponseDecoder to an API object (AmzCall(..., decoder=decoder)) to decode every response it returns, including
+calls made through a Throttler; ProductAdvertising.item_lookup_async() also accepts one directly.
+"""
+
+
+from .responses import element_to_dict, parse_xml, response_body
+
+try:
+    from multiprocessing.shared_memory import SharedMemory
+except ImportError:     # Not available on some platforms
+    SharedMemory = None
+
+
+def decode_response(response):
+    """Parse response and return it as a dict (see element_to_dict), without the root element or ResponseMetadata.
+    Raises MWSError if the response is an ErrorResponse."""
+    record = element_to_dict(parse_xml(response))
+    record.pop('ResponseMetadata', None)
+    return record
+
+
+def _decode_shared(name, size, decode):
+    """Decode the first size bytes of the shared memory block called name. Runs in a worker process."""
+    block = SharedMemory(name=name)
+    try:
+        with block.buf[:size] as body:
+            return decode(body)
+    finally:
+        block.close()
+
+
+class ResponseDecoder:
+    """Decodes responses using decode (a picklable function, decode_response() by default). Responses of threshold
+    bytes or more are decoded in a pool of max_workers processes, which is started the first time it's needed. Call
+    close() (or use the decoder as a context manager) to shut the pool down."""
+
+    def __init__(self, threshold=256 * 1024, max_workers=None, decode=decode_response):
+        """Initialize the ResponseDecoder object."""
+        self.threshold = threshold
+        self.max_workers = max_workers
+        self.decode = decode
+        self._executor = None
+
+    def submit(self, response):
+        """Start decoding response, and return a Future for the result. Small responses are decoded immediately."""
+        from concurrent.futures import Future, ProcessPoolExecutor
+
+        body = response_body(response)
+        if len(body) < self.threshold:
+            future = Future()
+            try:
+                future.set_result(self.decode(body))
+            except Exception as e:
+                future.set_exception(e)
+            return future
+
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+
+        if SharedMemory is None:
+            return self._executor.submit(self.decode, body)
+
+        block = SharedMemory(create=True, size=len(body))
+
+        def release(future=None):
+            block.close()
+            block.unlink()
+
+        try:
+            block.buf[:len(body)] = body
+            future = self._executor.submit(_decode_shared, block.name, len(body), self.decode)
+        except BaseException:
+            release()
+            raise
+
+        future.add_done_callback(release)
+        return future
+
+    def __call__(self, response):
+        """Decode response, waiting for the pool if necessary."""
+        return self.submit(response).result()
+
+    async def decode_async(self, response):
+        """Decode response without blocking the running event loop on large responses."""
+        import asyncio
+
+        return await asyncio.wrap_future(self.submit(response))
+
+    def close(self):
+        """Shut down the process pool, if it was started."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
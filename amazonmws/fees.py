@@ -0,0 +1,126 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`fees` -- Estimating fees in bulk
+--------------------------------------
+
+.. module:: fees
+
+Contains FeesEngine, which estimates the fees for many (ASIN, price) pairs using as few GetMyFeesEstimate calls as
+possible. Requests are sent in batches of the largest size the operation accepts, and results are remembered by
+ASIN, marketplace, fulfillment channel and price band. Fees are piecewise-linear in the price (a percentage referral
+fee plus fixed fees), so within a band the fees for a new price can be interpolated from two known prices instead of
+being requested again.
+"""
+
+
+from collections import namedtuple
+
+from .api import MARKETID, structured_list
+from .operations import batches, find_operation
+from .responses import amount, parse_xml, result_element, to_cents
+
+
+#: Returned by FeesEngine. price and fees are in hundredths of the currency (see to_cents()). source is 'api' for
+#: fees returned by Amazon, 'cache' for remembered ones and 'interpolated' for ones calculated from other prices.
+FeeEstimate = namedtuple('FeeEstimate', ['asin', 'price', 'fees', 'source'])
+
+
+class FeesEngine:
+    """Estimates fees for ASINs in one marketplace and fulfillment channel (fulfilled=True for FBA). Prices are in
+    hundredths of currency, and are grouped into bands of band_width; fees are assumed to be linear in the price
+    within a band, so choose a band_width that doesn't straddle the referral fee thresholds of the categories you
+    sell in.
+
+    api can be a Products object or a Throttler wrapping one."""
+
+    def __init__(self, api, market='US', currency='USD', fulfilled=True, band_width=500):
+        """Initialize the FeesEngine object."""
+        self.api = api
+        self.market = MARKETID.get(market, market)
+        self.currency = currency
+        self.fulfilled = fulfilled
+        self.band_width = band_width
+        self._samples = {}
+
+    def _key(self, asin, price):
+        return asin, self.market, self.fulfilled, price // self.band_width
+
+    def cached(self, asin, price):
+        """Return a FeeEstimate for asin at price from the cache, or None if it can't be worked out from it. If
+        price itself isn't known, the fees are interpolated from the two nearest known prices in the same band."""
+        samples = self._samples.get(self._key(asin, price))
+        if not samples:
+            return None
+        elif price in samples:
+            return FeeEstimate(asin, price, samples[price], 'cache')
+        elif len(samples) < 2:
+            return None
+
+        (price1, fees1), (price2, fees2) = sorted(samples.items(), key=lambda sample: abs(sample[0] - price))[:2]
+        fees = fees1 + (fees2 - fees1) * (price - price1) / (price2 - price1)
+        return FeeEstimate(asin, price, round(fees), 'interpolated')
+
+    def remember(self, asin, price, fees):
+        """Add the fees for asin at price to the cache."""
+        self._samples.setdefault(self._key(asin, price), {})[price] = fees
+
+    def estimate(self, asin, price):
+        """Return a FeeEstimate for a single ASIN and price (in hundredths), or None if Amazon couldn't estimate
+        it."""
+        return self.estimate_many([(asin, price)])[0]
+
+    def estimate_many(self, items):
+        """Return a list of FeeEstimates (or None, where Amazon couldn't estimate the fees), one for each
+        (asin, price) tuple in items. Prices can be given in hundredths or as decimal strings. Prices that can't be
+        answered from the cache are requested in batches of up to 20, and each distinct (asin, price) is only
+        requested once."""
+        items = [(asin, price if isinstance(price, int) else to_cents(price)) for asin, price in items]
+        results = [self.cached(asin, price) for asin, price in items]
+
+        missing = list(dict.fromkeys(item for item, result in zip(items, results) if result is None))
+        operation = find_operation('Products', 'GetMyFeesEstimate')
+        fetched = {}
+        for chunk in batches(operation, 'FeesEstimateRequestList', missing):
+            if chunk:
+                fetched.update(self._fetch(chunk))
+
+        return [
+            result if result is not None else fetched.get(item)
+            for item, result in zip(items, results)
+        ]
+
+    def _fetch(self, chunk):
+        """Call GetMyFeesEstimate for a chunk of (asin, price) tuples, and return a dict of FeeEstimates keyed by
+        (asin, price). Failed estimates are left out."""
+        requests = [
+            {
+                'MarketplaceId': self.market,
+                'IdType': 'ASIN',
+                'IdValue': asin,
+                'IsAmazonFulfilled': 'true' if self.fulfilled else 'false',
+                'Identifier': str(idx),
+                'PriceToEstimateFees.ListingPrice.CurrencyCode': self.currency,
+                'PriceToEstimateFees.ListingPrice.Amount': amount(price),
+            }
+            for idx, (asin, price) in enumerate(chunk)
+        ]
+
+        response = self.api.GetMyFeesEstimate(
+            FeesEstimateRequestList=structured_list('FeesEstimateRequestList', 'FeesEstimateRequest', requests)
+        )
+
+        identifiers = {str(idx) for idx in range(len(chunk))}
+        estimates = {}
+        for result in result_element(parse_xml(response)).iterfind('FeesEstimateResultList/FeesEstimateResult'):
+            identifier = result.findtext('FeesEstimateIdentifier/SellerInputIdentifier')
+            total = result.findtext('FeesEstimate/TotalFeesEstimate/Amount')
+            if result.findtext('Status') != 'Success' or total is None or identifier not in identifiers:
+                continue
+
+            asin, price = chunk[int(identifier)]
+            fees = to_cents(total)
+            self.remember(asin, price, fees)
+            estimates[asin, price] = FeeEstimate(asin, price, fees, 'api')
+
+        return estimates
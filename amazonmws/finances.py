@@ -0,0 +1,185 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`finances` -- Higher-level tools for the Finances API
+----------------------------------------------------------
+
+.. module:: finances
+
+Streams financial events and event groups as compact records, and spools them to disk for aggregation.
+"""
+
+
+from collections import namedtuple
+from io import BytesIO
+from xml.etree import ElementTree
+
+from .responses import element_to_dict, iter_pages, parse_xml, response_body, to_cents
+
+
+#: A single monetary component of a financial event, like the Principal charge or the Commission fee for one
+#: item in a ShipmentEvent. event_type is the name of the list the event came from, minus 'List' (so refunds are
+#: 'RefundEvent' even though Amazon calls each one a ShipmentEvent). amount is in hundredths of the currency.
+FinancialEvent = namedtuple(
+    'FinancialEvent', ['event_type', 'posted_date', 'order_id', 'sku', 'name', 'amount', 'currency']
+)
+
+#: Summary of a financial event group. total is in hundredths of the currency.
+FinancialEventGroup = namedtuple(
+    'FinancialEventGroup', ['group_id', 'processing_status', 'transfer_status', 'start', 'end', 'total', 'currency']
+)
+
+
+def _parse_events(body):
+    """Parse a ListFinancialEvents(ByNextToken) response incrementally, yielding a FinancialEvent for each amount.
+    Elements are discarded as soon as their event has been handled, so memory use doesn't grow with the size of
+    the response. The generator's return value is the response's NextToken, or None."""
+    path = []       # Tags of the current element's ancestors. Events are at <Response>/<Result>/FinancialEvents/<List>
+    event_type = order_id = posted_date = sku = name = next_token = None
+    pending = []
+
+    for action, element in ElementTree.iterparse(BytesIO(body), events=('start', 'end')):
+        tag = element.tag.rpartition('}')[2]
+
+        if action == 'start':
+            if not path and tag == 'ErrorResponse':
+                parse_xml(body)     # Raises MWSError
+            elif len(path) == 4 and path[2] == 'FinancialEvents':
+                event_type, order_id, posted_date, sku = path[-1][:-4], None, None, None
+            path.append(tag)
+            continue
+
+        path.pop()
+        element.tag = tag       # So that the parent can find() this element without a namespace
+
+        if tag == 'NextToken' and path and path[-1].endswith('Result'):
+            next_token = element.text
+        elif event_type is None:
+            continue
+        elif len(path) == 4:
+            # End of an event: now that all of its fields are known, emit its amounts
+            for event_sku, event_name, amount, currency in pending:
+                yield FinancialEvent(event_type, posted_date, order_id, event_sku, event_name, amount, currency)
+
+            pending.clear()
+            event_type = None
+            element.clear()
+        elif tag == 'AmazonOrderId':
+            order_id = element.text
+        elif tag == 'PostedDate' and len(path) == 5:
+            posted_date = element.text
+        elif tag == 'SellerSKU':
+            sku = element.text
+        elif tag == 'ShipmentItem':
+            sku = None
+        elif tag.endswith('Type') and element.text:
+            name = element.text
+        elif element.find('CurrencyAmount') is not None:
+            amount = to_cents(element.findtext('CurrencyAmount'))
+            pending.append((sku, name or tag, amount, element.findtext('CurrencyCode')))
+            name = None
+
+    return next_token
+
+
+def iter_financial_events(api, spool=None, **kwargs):
+    """Call ListFinancialEvents with kwargs (PostedAfter, AmazonOrderId, etc.) and yield a FinancialEvent for each
+    amount in the response, following ListFinancialEventsByNextToken. If spool (an EventSpool) is given, each
+    record is also appended to it. api can be a Finances object or a Throttler wrapping one."""
+    action = 'ListFinancialEvents'
+
+    while True:
+        next_token = None
+        parser = _parse_events(response_body(getattr(api, action)(**kwargs)))
+
+        while True:
+            try:
+                record = next(parser)
+            except StopIteration as stop:
+                next_token = stop.value
+                break
+
+            if spool is not None:
+                spool.append(record)
+            yield record
+
+        if not next_token:
+            break
+
+        action, kwargs = 'ListFinancialEventsByNextToken', {'NextToken': next_token}
+
+
+def iter_financial_event_groups(api, **kwargs):
+    """Call ListFinancialEventGroups with kwargs (FinancialEventGroupStartedAfter, etc.) and yield a
+    FinancialEventGroup for each group, following ListFinancialEventGroupsByNextToken."""
+    for result in iter_pages(api, 'ListFinancialEventGroups', **kwargs):
+        for element in result.iterfind('FinancialEventGroupList/FinancialEventGroup'):
+            group = element_to_dict(element)
+            total = group.get('OriginalTotal') or {}
+
+            yield FinancialEventGroup(
+                group.get('FinancialEventGroupId'),
+                group.get('ProcessingStatus'),
+                group.get('FundTransferStatus'),
+                group.get('FinancialEventGroupStart'),
+                group.get('FinancialEventGroupEnd'),
+                to_cents(total['CurrencyAmount']) if 'CurrencyAmount' in total else None,
+                total.get('CurrencyCode')
+            )
+
+
+class EventSpool:
+    """An append-only, tab-separated file of FinancialEvents. Spooling events lets a month of financial data be
+    aggregated without keeping it all in memory, and re-aggregated later without calling the API again."""
+
+    def __init__(self, path):
+        """Initialize the EventSpool object."""
+        self.path = path
+        self._file = None
+
+    def append(self, record):
+        """Append a FinancialEvent to the spool."""
+        if self._file is None:
+            self._file = open(self.path, 'a', encoding='utf-8')
+
+        self._file.write('\t'.join('' if field is None else str(field) for field in record) + '\n')
+
+    def close(self):
+        """Flush and close the spool file."""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __iter__(self):
+        """Read the spooled events back, one at a time."""
+        if self._file is not None:
+            self._file.flush()
+
+        try:
+            file = open(self.path, encoding='utf-8')
+        except FileNotFoundError:
+            return
+
+        with file:
+            for line in file:
+                fields = [field or None for field in line.rstrip('\n').split('\t')]
+                fields[5] = int(fields[5])
+                yield FinancialEvent(*fields)
+
+    def totals(self, event_types=None):
+        """Return a dict of total amounts (in hundredths), keyed by (event_type, name, currency). If event_types is
+        given, only events of those types are counted. For example, spool.totals(['RefundEvent']) sums refunds by
+        charge and fee type."""
+        totals = {}
+        for event in self:
+            if event_types is None or event.event_type in event_types:
+                key = event.event_type, event.name, event.currency
+                totals[key] = totals.get(key, 0) + event.amount
+
+        return totals
@@ -0,0 +1,235 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`health` -- Circuit breakers for API sections
+--------------------------------------------------
+
+.. module:: health
+
+Contains CircuitBreaker, which keeps track of how requests to one section of the API (one URI) are going, and stops
+sending them while the section is failing. When too many requests fail, or take too long, the breaker opens: calls
+are rejected right away with CircuitOpen, instead of waiting on a service that isn't answering and using up quota.
+While it is open, the breaker asks GetServiceStatus how the section is doing (within that operation's own quota);
+once the section is GREEN again, requests are let through gradually until the breaker closes. Sections without
+GetServiceStatus (Feeds and Reports) start letting requests through again after a fixed time instead. Each section has
+its own breaker (see breaker_for()), so problems in one section don't slow down the others.
+"""
+
+
+from collections import deque
+from threading import Lock
+from time import time
+
+from xml.etree.ElementTree import ParseError
+
+from .operations import find_operation
+from .responses import MWSError, parse_xml, result_element
+from .throttler import Throttler
+
+
+#: Breaker states.
+CLOSED, OPEN, RECOVERING = 'closed', 'open', 'recovering'
+
+#: Error codes that mean a request was throttled, rather than that the service is in trouble.
+THROTTLING_CODES = ('RequestThrottled', 'QuotaExceeded')
+
+_breakers = {}
+_breakers_lock = Lock()
+
+
+class CircuitOpen(Exception):
+    """Raised instead of making a request while a section's circuit breaker is open."""
+
+
+def _section_api(api):
+    """Return the API object behind api, which can be a Throttler wrapping one."""
+    return api.api if isinstance(api, Throttler) else api
+
+
+def breaker_for(api, **kwargs):
+    """Return the CircuitBreaker shared by all API objects for api's section (its class and URI, on its domain),
+    creating it with kwargs if necessary. The class is part of the key because some sections share a URI (Feeds and
+    Reports are both at /). api can be a Throttler wrapping the API object."""
+    api = _section_api(api)
+    key = (type(api), getattr(api, '_domain', None), api.URI)
+    with _breakers_lock:
+        breaker = _breakers.get(key)
+        if breaker is None:
+            breaker = _breakers[key] = CircuitBreaker(api, **kwargs)
+
+    return breaker
+
+
+def is_failure(error=None, response=None):
+    """Return True if an exception raised by a request, or the response it returned, means that the service is in
+    trouble. Errors that are the caller's fault (a Sender MWSError) and throttling (see THROTTLING_CODES) don't
+    count, whether they are raised or returned as an ErrorResponse with a 5xx status."""
+    if error is not None:
+        if isinstance(error, MWSError):
+            return error.error_type == 'Receiver' and error.code not in THROTTLING_CODES
+        return True
+
+    status = getattr(response, 'status_code', None)
+    if not isinstance(status, int) or status < 500:
+        return False
+
+    try:
+        parse_xml(response)
+    except MWSError as e:
+        return is_failure(error=e)
+    except (ParseError, ValueError, TypeError):
+        pass
+
+    return True
+
+
+class CircuitBreaker:
+    """Watches the requests made to one section of the API. Outcomes are kept for the last window seconds; once at
+    least min_calls have been made, the breaker opens if failure_rate of them failed or took longer than slow_call
+    seconds. While it is open, every call raises CircuitOpen, and the section's status is checked with
+    GetServiceStatus, no more often than its quota allows. When the status is GREEN (or, if it can't be checked or the
+    section has no GetServiceStatus, after probe_interval seconds), the share of calls let through rises from 0 to
+    all of them over recovery seconds; a failure during that time opens the breaker again. A YELLOW status also
+    starts a recovery, so that calls to a degraded section are spread out.
+
+    api is used for GetServiceStatus calls. It can be a Throttler, but the calls are made with the API object it
+    wraps, since the breaker keeps them within GetServiceStatus's quota itself. Use breaker_for() to share one breaker
+    between API objects."""
+
+    def __init__(self, api, window=60, min_calls=10, failure_rate=0.5, slow_call=10.0, recovery=60,
+                 probe_interval=None):
+        """Initialize the CircuitBreaker object."""
+        api = _section_api(api)
+        status = find_operation(getattr(api, 'SECTION', None), 'GetServiceStatus')
+        quota = status.quota if status is not None and status.quota else (2, 300, None)
+
+        self.api = api
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call = slow_call
+        self.recovery = recovery
+        self.probe_interval = quota[1] if probe_interval is None else probe_interval
+        self.probe_burst = quota[0]
+        self.can_probe = status is not None
+
+        self.state = CLOSED
+        self.status = None
+        self._since = time()
+        self._outcomes = deque()
+        self._failures = 0
+        self._credit = 0
+        self._probes = deque()
+        self._lock = Lock()
+        self._probe_lock = Lock()
+
+    def check(self):
+        """Raise CircuitOpen if a call should not be made now. Probes the section's status first, if it's time to."""
+        if self.state != CLOSED:
+            self._maybe_probe()
+
+        with self._lock:
+            if self.state == CLOSED:
+                return
+
+            if self.state == OPEN:
+                raise CircuitOpen(f'{self.api.URI} is unavailable (status: {self.status or "unknown"}).')
+
+            # Recovering: let through a share of calls that grows over the recovery period
+            share = min((time() - self._since) / self.recovery, 1) if self.recovery else 1
+            if share >= 1:
+                self._set_state(CLOSED)
+                return
+
+            # Each call earns share of a call's worth of credit, and is let through when there's a whole one
+            self._credit += share
+            if self._credit < 1:
+                raise CircuitOpen(f'{self.api.URI} is recovering; request shed.')
+
+            self._credit -= 1
+
+    def run(self, func, *args, **kwargs):
+        """Call func, record how it went, and return its result."""
+        start = time()
+        try:
+            response = func(*args, **kwargs)
+        except Exception as e:
+            self.record(not is_failure(error=e), time() - start)
+            raise
+
+        self.record(not is_failure(response=response), time() - start)
+        return response
+
+    def call(self, func, *args, **kwargs):
+        """Call func if the breaker allows it (see check()), and return its result."""
+        self.check()
+        return self.run(func, *args, **kwargs)
+
+    def record(self, success, latency=0):
+        """Record the outcome of a call. Calls that took longer than slow_call count as failures."""
+        now = time()
+        failed = not success or latency > self.slow_call
+
+        with self._lock:
+            self._outcomes.append((now, failed))
+            self._failures += failed
+            while self._outcomes and self._outcomes[0][0] < now - self.window:
+                self._failures -= self._outcomes.popleft()[1]
+
+            if self.state == RECOVERING and failed:
+                self._set_state(OPEN)
+            elif self.state == CLOSED and len(self._outcomes) >= self.min_calls \
+                    and self._failures >= self.failure_rate * len(self._outcomes):
+                self._set_state(OPEN)
+
+    def probe(self):
+        """Call GetServiceStatus, update the breaker from the result, and return the status ('GREEN', 'GREEN_I',
+        'YELLOW' or 'RED'). Returns None if the status can't be read, or the section has no GetServiceStatus."""
+        if not self.can_probe:
+            return None
+
+        try:
+            status = result_element(parse_xml(self.api.GetServiceStatus())).findtext('Status')
+        except Exception:
+            status = None
+
+        with self._lock:
+            self.status = status
+            if status == 'RED':
+                self._set_state(OPEN)
+            elif status == 'YELLOW' or (status in ('GREEN', 'GREEN_I') and self.state == OPEN):
+                self._set_state(RECOVERING)
+
+        return status
+
+    def _maybe_probe(self):
+        """Probe the section's status if GetServiceStatus's quota allows it, and no other thread is probing. If the
+        status can't be read (or the section has no GetServiceStatus) and the breaker has been open for probe_interval
+        seconds, start recovering anyway."""
+        now = time()
+        if not self._probe_lock.acquire(blocking=False):
+            return
+
+        try:
+            while self._probes and self._probes[0] <= now - self.probe_interval:
+                self._probes.popleft()
+
+            if self.can_probe and len(self._probes) < self.probe_burst:
+                self._probes.append(now)
+                if self.probe() is not None:
+                    return
+
+            with self._lock:
+                if self.state == OPEN and now - self._since >= self.probe_interval:
+                    self._set_state(RECOVERING)
+        finally:
+            self._probe_lock.release()
+
+    def _set_state(self, state):
+        """Change state, resetting the counters used for the new one. Call with _lock held."""
+        self.state = state
+        self._since = time()
+        self._credit = 0
+        if state == CLOSED:
+            self._outcomes.clear()
+            self._failures = 0
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`inbound` -- Higher-level tools for the Fulfillment Inbound Shipment API
+-----------------------------------------------------------------------------
+
+.. module:: inbound
+
+Contains InboundPlanner, which plans and creates inbound shipments for any number of SKUs, and ShipmentIndex, which
+keeps the quantities shipped and received for each shipment's items. Item lists are split into the largest chunks
+each operation accepts (see amazonmws.operations), and independent calls are made concurrently; wrap the API object
+in a Throttler to keep them within quota.
+"""
+
+
+from array import array
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from sys import intern
+from threading import Lock
+
+from .api import nested_params
+from .operations import batches, find_operation
+from .responses import element_to_dict, iter_pages, parse_xml, result_element
+
+
+#: Returned by InboundPlanner.plan(). items is a list of (sku, quantity) tuples; address is a dict.
+ShipmentPlan = namedtuple('ShipmentPlan', ['shipment_id', 'destination', 'label_prep', 'address', 'items'])
+
+_SECTION = 'FulfillmentInboundShipment'
+
+
+def iter_shipment_items(api, shipment_id=None, **kwargs):
+    """Yield a dict for each item in a shipment, one page at a time, following ListInboundShipmentItemsByNextToken.
+    If shipment_id is None, kwargs should give LastUpdatedAfter and LastUpdatedBefore instead."""
+    if shipment_id is not None:
+        kwargs['ShipmentId'] = shipment_id
+
+    for result in iter_pages(api, 'ListInboundShipmentItems', **kwargs):
+        for member in result.iterfind('ItemData/member'):
+            yield element_to_dict(member)
+
+
+def _plan_item(item):
+    """Convert a (sku, quantity) tuple to an InboundShipmentPlanRequestItems member. Dicts are used as they are."""
+    if isinstance(item, dict):
+        return item
+
+    sku, quantity = item
+    return {'SellerSKU': sku, 'Quantity': quantity}
+
+
+def _parse_plan(member):
+    """Convert an InboundShipmentPlans member element to a ShipmentPlan."""
+    return ShipmentPlan(
+        member.findtext('ShipmentId'),
+        member.findtext('DestinationFulfillmentCenterId'),
+        member.findtext('LabelPrepType'),
+        element_to_dict(member.find('ShipToAddress')) if member.find('ShipToAddress') is not None else {},
+        [
+            (item.findtext('SellerSKU'), int(item.findtext('Quantity') or 0))
+            for item in member.iterfind('Items/member')
+        ]
+    )
+
+
+class InboundPlanner:
+    """Plans and creates inbound shipments from ship_from (an address dict: Name, AddressLine1, City,
+    StateOrProvinceCode, PostalCode, CountryCode, ...).
+
+    api can be a FulfillmentInboundShipment object, but should usually be a Throttler wrapping one, since up to
+    max_workers calls are made at once."""
+
+    def __init__(self, api, ship_from, ship_to_country=None, label_prep='SELLER_LABEL', max_workers=4):
+        """Initialize the InboundPlanner object."""
+        self.api = api
+        self.ship_from = ship_from
+        self.ship_to_country = ship_to_country
+        self.label_prep = label_prep
+        self.max_workers = max_workers
+
+    def _map(self, func, *iterables):
+        """Return a list of func's results for each item in iterables, calling it concurrently."""
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            return list(executor.map(func, *iterables))
+
+    def plan(self, items):
+        """Return a list of ShipmentPlans for items, which can be (sku, quantity) tuples or
+        InboundShipmentPlanRequestItems dicts. Items are sent in chunks of the largest size
+        CreateInboundShipmentPlan accepts, and the chunks are planned concurrently."""
+        operation = find_operation(_SECTION, 'CreateInboundShipmentPlan')
+        chunks = batches(operation, 'InboundShipmentPlanRequestItems', map(_plan_item, items))
+        return [plan for plans in self._map(self._plan_chunk, chunks) for plan in plans]
+
+    def _plan_chunk(self, items):
+        """Call CreateInboundShipmentPlan for a single chunk of items."""
+        if not items:
+            return []
+
+        params = {
+            **nested_params('ShipFromAddress', self.ship_from),
+            'LabelPrepPreference': self.label_prep,
+            'ShipToCountryCode': self.ship_to_country,
+            'InboundShipmentPlanRequestItems': items
+        }
+
+        result = result_element(parse_xml(self.api.CreateInboundShipmentPlan(**params)))
+        return [_parse_plan(member) for member in result.iterfind('InboundShipmentPlans/member')]
+
+    def create(self, plans, name, status='WORKING', **header):
+        """Create a shipment for each of plans, concurrently, and return their ids. Each shipment is created with as
+        many items as CreateInboundShipment accepts, and the rest are added with UpdateInboundShipment. header can
+        give other InboundShipmentHeader fields, like AreCasesRequired or IntendedBoxContentsSource."""
+        return self._map(lambda plan: self._send(plan, name, status, header, create=True), plans)
+
+    def update(self, plans, name, status='WORKING', **header):
+        """Update the shipments for plans, concurrently, setting their name, status and item quantities. Returns
+        the shipment ids."""
+        return self._map(lambda plan: self._send(plan, name, status, header, create=False), plans)
+
+    def _send(self, plan, name, status, header, create):
+        """Create or update the shipment for a single plan, one chunk of items at a time."""
+        header = nested_params('InboundShipmentHeader', {
+            'ShipmentName': name,
+            'ShipFromAddress': self.ship_from,
+            'DestinationFulfillmentCenterId': plan.destination,
+            'LabelPrepPreference': self.label_prep,
+            'ShipmentStatus': status,
+            **header
+        })
+
+        items = [{'SellerSKU': sku, 'QuantityShipped': quantity} for sku, quantity in plan.items]
+        operation = find_operation(_SECTION, 'CreateInboundShipment')
+
+        for idx, chunk in enumerate(batches(operation, 'InboundShipmentItems', items)):
+            action = 'CreateInboundShipment' if create and idx == 0 else 'UpdateInboundShipment'
+            parse_xml(getattr(self.api, action)(ShipmentId=plan.shipment_id, InboundShipmentItems=chunk, **header))
+
+        return plan.shipment_id
+
+    def reconcile(self, shipment_ids, index=None):
+        """Fetch the items of each of shipment_ids, concurrently, into index (a ShipmentIndex; by default, a new
+        one), and return the index. Items are read into the index's arrays page by page, so a shipment's items are
+        never all held as dicts at once."""
+        index = ShipmentIndex() if index is None else index
+
+        def fetch(shipment_id):
+            index.add_shipment(shipment_id, (
+                (item.get('SellerSKU'), int(item.get('QuantityShipped') or 0), int(item.get('QuantityReceived') or 0))
+                for item in iter_shipment_items(self.api, shipment_id)
+            ))
+
+        self._map(fetch, shipment_ids)
+        return index
+
+
+class ShipmentIndex:
+    """Keeps the quantities shipped and received for the SKUs in each shipment. As in InventoryTracker, each
+    shipment's quantities are kept in two arrays indexed by a slot number per SKU, and SKU strings are interned, so
+    that SKUs shared by many shipments are only stored once."""
+
+    def __init__(self):
+        """Initialize the ShipmentIndex object."""
+        self._shipments = {}
+        self._lock = Lock()
+
+    def add_shipment(self, shipment_id, items):
+        """Add (or replace) a shipment, given an iterable of (sku, shipped, received) tuples. Quantities for SKUs
+        that appear more than once are added together."""
+        slots, skus, shipped, received = {}, [], array('l'), array('l')
+
+        for sku, sku_shipped, sku_received in items:
+            slot = slots.get(sku)
+            if slot is None:
+                sku = intern(sku)
+                slots[sku] = len(skus)
+                skus.append(sku)
+                shipped.append(sku_shipped)
+                received.append(sku_received)
+            else:
+                shipped[slot] += sku_shipped
+                received[slot] += sku_received
+
+        with self._lock:
+            self._shipments[shipment_id] = (slots, skus, shipped, received)
+
+    def items(self, shipment_id):
+        """Yield (sku, shipped, received) tuples for each SKU in a shipment."""
+        slots, skus, shipped, received = self._shipments[shipment_id]
+        return zip(skus, shipped, received)
+
+    def quantities(self, shipment_id, sku):
+        """Return the (shipped, received) quantities for sku in a shipment, or None if it isn't in the shipment."""
+        slots, skus, shipped, received = self._shipments[shipment_id]
+        slot = slots.get(sku)
+        return None if slot is None else (shipped[slot], received[slot])
+
+    def totals(self, shipment_id):
+        """Return the total (shipped, received) quantities for a shipment."""
+        slots, skus, shipped, received = self._shipments[shipment_id]
+        return sum(shipped), sum(received)
+
+    def discrepancies(self):
+        """Yield (shipment_id, sku, shipped, received) tuples for each SKU whose received quantity doesn't match the
+        quantity shipped."""
+        for shipment_id in list(self._shipments):
+            for sku, shipped, received in self.items(shipment_id):
+                if shipped != received:
+                    yield shipment_id, sku, shipped, received
+
+    def __contains__(self, shipment_id):
+        return shipment_id in self._shipments
+
+    def __len__(self):
+        return len(self._shipments)
+
+    def __iter__(self):
+        return iter(list(self._shipments))
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`inventory` -- Higher-level tools for the Fulfillment Inventory API
+------------------------------------------------------------------------
+
+.. module:: inventory
+
+Contains InventoryTracker, which follows changes to FBA inventory levels.
+"""
+
+
+from array import array
+from collections import namedtuple
+from datetime import datetime, timezone
+from sys import intern
+
+from .api import AmzCall, MARKETID, SERVER_CLOCK
+from .responses import iter_pages, format_timestamp
+from .throttler import Throttler
+from .watermarks import WatermarkStore
+
+
+#: Emitted by InventoryTracker when a SKU's quantities change. The old quantities are None for new SKUs.
+InventoryChange = namedtuple('InventoryChange', ['sku', 'old_total', 'new_total', 'old_in_stock', 'new_in_stock'])
+
+#: Used as the QueryStartDateTime for a tracker's first poll, to get the whole catalog.
+INITIAL_QUERY_START = '2000-01-01T00:00:00Z'
+
+
+class InventoryTracker:
+    """Keeps track of TotalSupplyQuantity and InStockSupplyQuantity for every SellerSKU, and reports only the SKUs
+    whose quantities have changed. Each poll asks ListInventorySupply only for SKUs changed since the previous
+    poll (using QueryStartDateTime) and follows ListInventorySupplyByNextToken.
+
+    Quantities are stored in two arrays, indexed by a slot number assigned to each SKU, so that tracking a large
+    catalog costs a few bytes per SKU rather than a dict per SKU.
+
+    api can be a FulfillmentInventory object or a Throttler wrapping one. The poll position is kept in watermarks
+    (a WatermarkStore; by default, an in-memory one) under key, which defaults to 'inventory/<marketplace id>'. It is
+    taken from clock (a ServerClock; by default, the API object's), so that it follows Amazon's clock rather than the
+    local one."""
+
+    def __init__(self, api, market=None, watermarks=None, key=None, clock=None):
+        """Initialize the InventoryTracker object."""
+        self.api = api
+        self.market = MARKETID.get(market, market)
+        self.watermarks = WatermarkStore() if watermarks is None else watermarks
+        self.key = key or (f'inventory/{self.market}' if self.market else 'inventory')
+
+        if clock is None:
+            section = api.api if isinstance(api, Throttler) else api
+            clock = section.clock if isinstance(section, AmzCall) else SERVER_CLOCK
+        self.clock = clock
+
+        self._slots = {}
+        self._skus = []
+        self._total = array('l')
+        self._in_stock = array('l')
+
+    def poll(self):
+        """Fetch the SKUs that changed since the last poll, and yield an InventoryChange for each one whose
+        quantities are different from the last known ones. The watermark is saved once all changes have been
+        yielded."""
+        poll_started = format_timestamp(datetime.fromtimestamp(self.clock.time(), timezone.utc))
+        params = {
+            'QueryStartDateTime': self.watermarks.get(self.key, INITIAL_QUERY_START),
+            'ResponseGroup': 'Basic',
+            'MarketplaceId': self.market
+        }
+
+        for result in iter_pages(self.api, 'ListInventorySupply', **params):
+            for member in result.iterfind('InventorySupplyList/member'):
+                change = self.update(
+                    member.findtext('SellerSKU'),
+                    int(member.findtext('TotalSupplyQuantity') or 0),
+                    int(member.findtext('InStockSupplyQuantity') or 0)
+                )
+
+                if change is not None:
+                    yield change
+
+        self.watermarks.set(self.key, poll_started)
+
+    def update(self, sku, total, in_stock):
+        """Record new quantities for sku. Returns an InventoryChange if they differ from the last known ones,
+        otherwise None."""
+        slot = self._slots.get(sku)
+
+        if slot is None:
+            sku = intern(sku)
+            self._slots[sku] = len(self._skus)
+            self._skus.append(sku)
+            self._total.append(total)
+            self._in_stock.append(in_stock)
+            return InventoryChange(sku, None, total, None, in_stock)
+
+        old_total, old_in_stock = self._total[slot], self._in_stock[slot]
+        if old_total == total and old_in_stock == in_stock:
+            return None
+
+        self._total[slot] = total
+        self._in_stock[slot] = in_stock
+        return InventoryChange(sku, old_total, total, old_in_stock, in_stock)
+
+    def quantities(self, sku):
+        """Return the last known (total, in_stock) quantities for sku, or None if it hasn't been seen."""
+        slot = self._slots.get(sku)
+        return None if slot is None else (self._total[slot], self._in_stock[slot])
+
+    def __contains__(self, sku):
+        return sku in self._slots
+
+    def __len__(self):
+        return len(self._skus)
+
+    def __iter__(self):
+        return iter(self._skus)
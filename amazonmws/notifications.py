@@ -0,0 +1,361 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`notifications` -- Receiving notifications through the Subscriptions API
+-----------------------------------------------------------------------------
+
+.. module:: notifications
+
+Instead of polling GetLowestPricedOffersForASIN, a seller can subscribe to AnyOfferChanged notifications, which
+Amazon delivers to an SQS queue. This module contains NotificationManager, which sets up the destination and
+subscriptions; a few queue implementations; and NotificationConsumer, which decodes notifications from a queue into
+the cache used by a Throttler, so that callers get offer data without spending quota.
+"""
+
+
+import os
+
+from collections import deque, namedtuple
+from itertools import count
+from time import time, sleep
+from xml.etree.ElementTree import ParseError, tostring
+from xml.sax.saxutils import escape
+
+from .api import MARKETID, structured_list
+from .responses import MWSError, amount, parse_xml, parse_timestamp, result_element, to_cents
+from .throttler import cache_key
+
+
+#: A decoded AnyOfferChanged notification. offers is a tuple of NotificationOffer, and summary is the notification's
+#: Summary element (lowest prices, buy box prices, offer counts) as an XML string, or None if it has none.
+OfferChange = namedtuple(
+    'OfferChange', ['asin', 'market', 'condition', 'changed_at', 'published_at', 'offers', 'summary'],
+    defaults=(None,)
+)
+
+#: One offer from an AnyOfferChanged notification. Prices are in hundredths of the currency.
+NotificationOffer = namedtuple(
+    'NotificationOffer',
+    ['seller_id', 'sub_condition', 'listing_price', 'shipping', 'currency', 'is_fba', 'is_buy_box_winner']
+)
+
+
+def decode_any_offer_changed(body):
+    """Decode the XML body of an AnyOfferChanged notification into an OfferChange. Raises ValueError if body is
+    not an AnyOfferChanged notification, or is missing the parts needed to identify the offers."""
+    try:
+        root = parse_xml(body)
+    except ParseError as error:
+        raise ValueError(f'Can not parse notification: {error}') from None
+
+    if root.findtext('NotificationMetaData/NotificationType') != 'AnyOfferChanged':
+        raise ValueError('Not an AnyOfferChanged notification.')
+
+    payload = root.find('NotificationPayload/AnyOfferChangedNotification')
+    trigger = None if payload is None else payload.find('OfferChangeTrigger')
+    if trigger is None or not all(trigger.findtext(tag) for tag in ('ASIN', 'MarketplaceId', 'ItemCondition')):
+        raise ValueError('Malformed AnyOfferChangedNotification.')
+
+    summary = payload.find('Summary')
+    if summary is not None:
+        summary.tail = None
+        summary = tostring(summary, encoding='unicode')
+
+    def price(offer, tag):
+        value = offer.findtext(f'{tag}/Amount')
+        return None if value is None else to_cents(value)
+
+    offers = tuple(
+        NotificationOffer(
+            offer.findtext('SellerId'),
+            offer.findtext('SubCondition'),
+            price(offer, 'ListingPrice'),
+            price(offer, 'Shipping'),
+            offer.findtext('ListingPrice/CurrencyCode'),
+            offer.findtext('IsFulfilledByAmazon') == 'true',
+            offer.findtext('IsBuyBoxWinner') == 'true'
+        )
+        for offer in payload.iterfind('Offers/Offer')
+    )
+
+    return OfferChange(
+        trigger.findtext('ASIN'),
+        trigger.findtext('MarketplaceId'),
+        trigger.findtext('ItemCondition'),
+        trigger.findtext('TimeOfOfferChange'),
+        root.findtext('NotificationMetaData/PublishTime'),
+        offers,
+        summary
+    )
+
+
+def offers_response(change):
+    """Return a GetLowestPricedOffersForASIN response (as a string) holding the summary and offers in an
+    OfferChange, so that it can be read like any other response, e.g. with parse_xml() or records.offer_records()."""
+    def text(tag, value):
+        return '' if value is None else f'<{tag}>{escape(str(value))}</{tag}>'
+
+    def money(tag, cents, currency):
+        if cents is None:
+            return ''
+        return f'<{tag}>{text("CurrencyCode", currency)}{text("Amount", amount(cents))}</{tag}>'
+
+    offers = ''.join(
+        '<Offer>'
+        + text('SellerId', offer.seller_id)
+        + text('SubCondition', offer.sub_condition)
+        + money('ListingPrice', offer.listing_price, offer.currency)
+        + money('Shipping', offer.shipping, offer.currency)
+        + text('IsFulfilledByAmazon', 'true' if offer.is_fba else 'false')
+        + text('IsBuyBoxWinner', 'true' if offer.is_buy_box_winner else 'false')
+        + '</Offer>'
+        for offer in change.offers
+    )
+    identifier = (
+        text('MarketplaceId', change.market) + text('ASIN', change.asin) + text('ItemCondition', change.condition)
+        + text('TimeOfOfferChange', change.changed_at)
+    )
+
+    return (
+        '<?xml version="1.0"?>\n<GetLowestPricedOffersForASINResponse>'
+        f'<GetLowestPricedOffersForASINResult status="Success"><Identifier>{identifier}</Identifier>'
+        f'{change.summary or ""}<Offers>{offers}</Offers>'
+        '</GetLowestPricedOffersForASINResult></GetLowestPricedOffersForASINResponse>'
+    )
+
+
+class NotificationManager:
+    """Registers SQS destinations and manages subscriptions using the Subscriptions API. api can be a
+    Subscriptions object or a Throttler wrapping one."""
+
+    def __init__(self, api, market='US'):
+        """Initialize the NotificationManager object."""
+        self.api = api
+        self.market = MARKETID.get(market, market)
+
+    @staticmethod
+    def _destination(queue_url, prefix):
+        """Return the parameters describing an SQS destination."""
+        return {
+            f'{prefix}.DeliveryChannel': 'SQS',
+            'attributes': structured_list(f'{prefix}.AttributeList', 'member', [
+                {'Key': 'sqsQueueUrl', 'Value': queue_url}
+            ])
+        }
+
+    def register_destination(self, queue_url):
+        """Register an SQS queue as a notification destination."""
+        return self.api.RegisterDestination(MarketplaceId=self.market, **self._destination(queue_url, 'Destination'))
+
+    def deregister_destination(self, queue_url):
+        """Remove an SQS queue from the notification destinations."""
+        return self.api.DeregisterDestination(
+            MarketplaceId=self.market, **self._destination(queue_url, 'Destination')
+        )
+
+    def subscribe(self, queue_url, notification_type='AnyOfferChanged'):
+        """Subscribe the queue at queue_url to notifications of notification_type."""
+        return self.api.CreateSubscription(
+            MarketplaceId=self.market,
+            **{'Subscription.NotificationType': notification_type, 'Subscription.IsEnabled': 'true'},
+            **self._destination(queue_url, 'Subscription.Destination')
+        )
+
+    def unsubscribe(self, queue_url, notification_type='AnyOfferChanged'):
+        """Delete the queue's subscription to notifications of notification_type."""
+        return self.api.DeleteSubscription(
+            MarketplaceId=self.market,
+            NotificationType=notification_type,
+            **self._destination(queue_url, 'Destination')
+        )
+
+    def setup(self, queue_url, notification_types=('AnyOfferChanged',)):
+        """Register queue_url as a destination and subscribe it to each of notification_types."""
+        self.register_destination(queue_url)
+        for notification_type in notification_types:
+            self.subscribe(queue_url, notification_type)
+
+
+########################################################################################################################
+
+
+class MemoryQueue:
+    """An in-memory stand-in for an SQS queue, for testing. Messages are (receipt, body) tuples."""
+
+    def __init__(self):
+        """Initialize the MemoryQueue object."""
+        self._messages = deque()
+        self._in_flight = {}
+        self._receipts = count()
+
+    def send(self, body):
+        """Add a message to the queue."""
+        self._messages.append(body)
+
+    def receive(self, max_messages=10):
+        """Return up to max_messages (receipt, body) tuples. Received messages are hidden until deleted."""
+        messages = []
+        while self._messages and len(messages) < max_messages:
+            receipt = next(self._receipts)
+            self._in_flight[receipt] = self._messages.popleft()
+            messages.append((receipt, self._in_flight[receipt]))
+
+        return messages
+
+    def delete(self, receipts):
+        """Delete received messages."""
+        for receipt in receipts:
+            self._in_flight.pop(receipt, None)
+
+    def __len__(self):
+        return len(self._messages) + len(self._in_flight)
+
+
+class FileQueue:
+    """A queue stored as one file per message in a directory, for testing with notifications captured from a real
+    queue. Messages are received in the order they were sent; the receipt is the file name."""
+
+    def __init__(self, path):
+        """Initialize the FileQueue object."""
+        self.path = path
+        self._in_flight = set()
+        self._counter = count()
+        os.makedirs(path, exist_ok=True)
+
+    def send(self, body):
+        """Add a message to the queue."""
+        name = f'{time():017.6f}-{os.getpid()}-{next(self._counter)}.xml'
+        tmp_path = os.path.join(self.path, f'.{name}')
+
+        with open(tmp_path, 'w', encoding='utf-8') as file:
+            file.write(body)
+        os.replace(tmp_path, os.path.join(self.path, name))
+
+    def receive(self, max_messages=10):
+        """Return up to max_messages (receipt, body) tuples. Received messages are hidden until deleted."""
+        messages = []
+        for name in sorted(os.listdir(self.path)):
+            if len(messages) == max_messages:
+                break
+            elif name.startswith('.') or name in self._in_flight:
+                continue
+
+            with open(os.path.join(self.path, name), encoding='utf-8') as file:
+                messages.append((name, file.read()))
+            self._in_flight.add(name)
+
+        return messages
+
+    def delete(self, receipts):
+        """Delete received messages."""
+        for receipt in receipts:
+            self._in_flight.discard(receipt)
+            try:
+                os.remove(os.path.join(self.path, receipt))
+            except FileNotFoundError:
+                pass
+
+
+class SQSQueue:
+    """Adapts an SQS client (for example, boto3.client('sqs')) to the queue interface used by NotificationConsumer.
+    The client is passed in, so boto3 is not a dependency of amazonmws."""
+
+    def __init__(self, client, queue_url, wait_time=20):
+        """Initialize the SQSQueue object. wait_time is the long-polling time, in seconds."""
+        self.client = client
+        self.queue_url = queue_url
+        self.wait_time = wait_time
+
+    def receive(self, max_messages=10):
+        """Return up to max_messages (receipt, body) tuples."""
+        response = self.client.receive_message(
+            QueueUrl=self.queue_url,
+            MaxNumberOfMessages=min(max_messages, 10),
+            WaitTimeSeconds=self.wait_time
+        )
+        return [(message['ReceiptHandle'], message['Body']) for message in response.get('Messages', [])]
+
+    def delete(self, receipts):
+        """Delete received messages, 10 at a time."""
+        receipts = list(receipts)
+        for start in range(0, len(receipts), 10):
+            self.client.delete_message_batch(
+                QueueUrl=self.queue_url,
+                Entries=[{'Id': str(i), 'ReceiptHandle': r} for i, r in enumerate(receipts[start:start + 10])]
+            )
+
+
+########################################################################################################################
+
+
+class NotificationConsumer:
+    """Receives AnyOfferChanged notifications from queue in batches, and stores the offers from each one in cache
+    under the key of the equivalent GetLowestPricedOffersForASIN call, as a response to that call (see
+    offers_response()). Passing the same cache to a Throttler makes it return that response for matching calls, e.g.
+    throttler.GetLowestPricedOffersForASIN(MarketplaceId='ATVPDKIKX0DER', ASIN='B00...', ItemCondition='New'), so
+    callers read it the same way whether it came from the cache or from Amazon (if the API object has a decoder, the
+    Throttler decodes cached responses with it too). Use a TTLCache, so that offers stop being served once they are
+    too old to trust.
+
+    Messages that can't be decoded are left on the queue (so SQS can move them to a dead-letter queue)."""
+
+    def __init__(self, queue, cache, batch_size=10):
+        """Initialize the NotificationConsumer object."""
+        self.queue = queue
+        self.cache = cache
+        self.batch_size = batch_size
+
+    @staticmethod
+    def key(change):
+        """Return the cache key for an OfferChange."""
+        return cache_key(
+            'GetLowestPricedOffersForASIN',
+            MarketplaceId=change.market,
+            ASIN=change.asin,
+            ItemCondition=change.condition.capitalize()
+        )
+
+    @staticmethod
+    def _is_older(change, current):
+        """Return True if change is older than current, which is the response currently in the cache (if any).
+        Notifications can arrive out of order, and an old one shouldn't replace a newer one."""
+        if current is None or not change.changed_at:
+            return False
+
+        try:
+            current_at = result_element(parse_xml(current)).findtext('Identifier/TimeOfOfferChange')
+        except (ParseError, ValueError, MWSError):
+            return False
+
+        return bool(current_at) and parse_timestamp(change.changed_at) < parse_timestamp(current_at)
+
+    def poll(self):
+        """Receive and process one batch of messages. Returns a list of the OfferChanges decoded."""
+        changes, receipts = [], []
+
+        for receipt, body in self.queue.receive(self.batch_size):
+            try:
+                change = decode_any_offer_changed(body)
+            except ValueError:
+                continue
+
+            key = self.key(change)
+            if not self._is_older(change, self.cache.get(key)):
+                self.cache[key] = offers_response(change)
+
+            changes.append(change)
+            receipts.append(receipt)
+
+        if receipts:
+            self.queue.delete(receipts)
+
+        return changes
+
+    def run(self, stop=None, idle_wait=1):
+        """Process batches until stop (a threading.Event) is set. Waits idle_wait seconds after an empty batch."""
+        while stop is None or not stop.is_set():
+            if not self.poll():
+                if stop is None:
+                    sleep(idle_wait)
+                else:
+                    stop.wait(idle_wait)
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`operations` -- The operation catalog
+------------------------------------------
+
+.. module:: operations
+
+Describes every section of the API (its URI, version and HTTP method) and every operation in it: its parameters,
+which of them are structured lists and how many items they take, its quota, and the ByNextToken operation that
+continues it. The catalog itself is stored in operations.json, and is only loaded the first time it is needed.
+
+Everything else that needs to know about an operation reads it from here: the section classes in
+:mod:`api` (URIs, versions, list parameters and batch sizes), DEFAULT_LIMITS in :mod:`throttler`, and iter_pages() in
+:mod:`responses`.
+"""
+
+
+import json
+import os
+
+from collections.abc import Mapping
+from functools import lru_cache
+
+
+#: The path to the default catalog.
+CATALOG_PATH = os.path.join(os.path.dirname(__file__), 'operations.json')
+
+
+class Operation:
+    """Describes a single API operation.
+
+    lists maps the names of structured list parameters to a (label, max_items) tuple; max_items is None if Amazon
+    doesn't document a limit. batch is a (param, max_items) tuple for operations that take a comma-separated list
+    instead (like ItemLookup's ItemId), or None. quota is a (quota_max, restore_rate, hourly_max) tuple, in the units
+    used by Throttler. next_action is the name of the ByNextToken operation that continues this one, or None."""
+
+    __slots__ = ('name', 'section', 'uri', 'version', 'method', 'params', 'lists', 'batch', 'quota', 'next_action')
+
+    def __init__(self, name, section, uri='/', version=None, method='POST', params=(), lists=None, batch=None,
+                 quota=None, next_action=None):
+        """Initialize the Operation object."""
+        self.name = name
+        self.section = section
+        self.uri = uri
+        self.version = version
+        self.method = method
+        self.params = tuple(params)
+        self.lists = {key: tuple(value) for key, value in (lists or {}).items()}
+        self.batch = tuple(batch) if batch else None
+        self.quota = tuple(quota) if quota else None
+        self.next_action = next_action
+
+    def max_items(self, param):
+        """Return the maximum number of items accepted by list parameter param, or None if there is no limit."""
+        if param in self.lists:
+            return self.lists[param][1]
+        elif self.batch and self.batch[0] == param:
+            return self.batch[1]
+
+        return None
+
+    def __repr__(self):
+        return f'<Operation {self.section}.{self.name}>'
+
+
+@lru_cache(maxsize=None)
+def load_catalog(path=CATALOG_PATH):
+    """Load a catalog file, returning a dict of {section: {name: Operation}}. Each file is only read once."""
+    with open(path, encoding='utf-8') as file:
+        data = json.load(file)
+
+    catalog = {}
+    for section, section_data in data.items():
+        defaults = {key: section_data[key] for key in ('uri', 'version', 'method') if key in section_data}
+        catalog[section] = {
+            name: Operation(
+                name, section, **defaults,
+                params=spec.get('params', ()),
+                lists=spec.get('lists'),
+                batch=spec.get('batch'),
+                quota=spec.get('quota'),
+                next_action=spec.get('next')
+            )
+            for name, spec in section_data['operations'].items()
+        }
+
+    return catalog
+
+
+@lru_cache(maxsize=None)
+def _operation_index():
+    """Return a dict of every Operation in the catalog, keyed by name. Operations that appear in more than one
+    section (like GetServiceStatus) are listed under the first section they appear in."""
+    index = {}
+    for operations in load_catalog().values():
+        for name, operation in operations.items():
+            index.setdefault(name, operation)
+
+    return index
+
+
+def section_operations(section):
+    """Return a dict of the Operations in section, keyed by name."""
+    return load_catalog().get(section, {})
+
+
+def find_operation(section, name):
+    """Return the Operation called name in section, or None. If section is None, all sections are searched."""
+    if section is None:
+        return _operation_index().get(name)
+
+    return load_catalog().get(section, {}).get(name)
+
+
+def section_attribute(section, key):
+    """Return the uri, version or method shared by the operations in section."""
+    operation = next(iter(section_operations(section).values()), None)
+    if operation is None:
+        raise KeyError(f'Unknown section: {section}')
+
+    return getattr(operation, key)
+
+
+def batches(operation, param, values):
+    """Split values into lists no longer than the maximum accepted by operation's param. If there is no maximum,
+    all of the values are returned as a single batch. Batches for a comma-separated parameter (see Operation.batch)
+    are joined into strings."""
+    values = list(values)
+    size = operation.max_items(param) if operation is not None else None
+    chunks = [values[i:i + size] for i in range(0, len(values), size)] if size else [values]
+
+    if operation is not None and operation.batch and operation.batch[0] == param:
+        return [','.join(map(str, chunk)) for chunk in chunks]
+
+    return chunks
+
+
+def operation_method(operation):
+    """Return a method that calls operation using an AmzCall object's _do_api_call(). The method's signature lists
+    the operation's documented parameters, for the benefit of help() and IDEs, but any keyword arguments are
+    accepted."""
+    from inspect import Parameter, Signature
+
+    name = operation.name
+
+    def method(self, **kwargs):
+        return self._do_api_call(name, **kwargs)
+
+    method.__name__ = method.__qualname__ = name
+    method.__doc__ = f'Call the {operation.section} {name} operation.'
+    method.__signature__ = Signature([
+        Parameter('self', Parameter.POSITIONAL_ONLY),
+        *(Parameter(param, Parameter.KEYWORD_ONLY, default=None) for param in operation.params),
+        Parameter('kwargs', Parameter.VAR_KEYWORD)
+    ])
+
+    return method
+
+
+class CatalogLimits(Mapping):
+    """A read-only mapping of action names to Throttler limits dicts, built from the catalog's quotas the first time
+    it is used."""
+
+    @property
+    def _limits(self):
+        return _catalog_limits()
+
+    def __getitem__(self, action):
+        return self._limits[action]
+
+    def __iter__(self):
+        return iter(self._limits)
+
+    def __len__(self):
+        return len(self._limits)
+
+    def __repr__(self):
+        return f'{type(self).__name__}({len(self)} actions)'
+
+
+@lru_cache(maxsize=None)
+def _catalog_limits():
+    """Return a dict of Throttler limits for every operation in the catalog that has a quota."""
+    limits = {}
+    for name, operation in _operation_index().items():
+        if operation.quota is None:
+            continue
+
+        quota_max, restore_rate, hourly_max = operation.quota
+        limits[name] = {'quota_max': quota_max, 'restore_rate': restore_rate}
+        if hourly_max is not None:
+            limits[name]['hourly_max'] = hourly_max
+
+    return limits
+
+
+class CatalogAttribute:
+    """A class attribute whose value is read from the catalog section named by the class's SECTION the first time
+    it is used, and then stored on the class. Classes without a SECTION get default."""
+
+    def __init__(self, key, default=None):
+        """Initialize the CatalogAttribute object."""
+        self.key = key
+        self.default = default
+        self.name = None
+
+    def __set_name__(self, owner, name):
+        self.name = name
+
+    def __get__(self, instance, owner):
+        section = getattr(owner, 'SECTION', None)
+        if section is None:
+            return self.default
+
+        value = section_attribute(section, self.key)
+        setattr(owner, self.name, value)
+        return value
@@ -0,0 +1,146 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`orders` -- Higher-level tools for the Orders API
+------------------------------------------------------
+
+.. module:: orders
+
+Contains OrderSync, which keeps a local copy of a seller's orders up to date using as few calls as possible, and
+OrderItemFetcher, which fetches the items for many orders concurrently.
+"""
+
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime, timedelta, timezone
+
+from .api import MARKETID
+from .responses import element_to_dict, iter_pages, parse_timestamp, format_timestamp
+from .watermarks import WatermarkStore
+
+
+#: Emitted by OrderSync for each new or changed order. kind is either 'created' or 'updated'.
+OrderEvent = namedtuple('OrderEvent', ['kind', 'market', 'order_id', 'order', 'items'])
+
+
+def order_items(api, order_id):
+    """Return a list of dicts describing the items in an order, following ListOrderItemsByNextToken."""
+    return [
+        element_to_dict(item)
+        for result in iter_pages(api, 'ListOrderItems', AmazonOrderId=order_id)
+        for item in result.iterfind('OrderItems/OrderItem')
+    ]
+
+
+class OrderSync:
+    """Incrementally syncs orders using ListOrders. For each marketplace, the sync keeps a watermark: the latest
+    LastUpdateDate it has seen, along with the orders updated at exactly that time. Each pass asks only for orders
+    updated since the watermark, follows ListOrdersByNextToken, and fetches order items only for the orders that
+    are new or have changed.
+
+    api can be an Orders object or a Throttler wrapping one. watermarks is a WatermarkStore (by default, an
+    in-memory one). On the first sync, orders updated after start (a datetime, or an ISO 8601 string) are
+    fetched; the default is one day ago."""
+
+    def __init__(self, api, seller_id, markets, watermarks=None, start=None, fetch_items=True):
+        """Initialize the OrderSync object."""
+        self.api = api
+        self.seller_id = seller_id
+        self.markets = [MARKETID.get(market, market) for market in markets]
+        self.watermarks = WatermarkStore() if watermarks is None else watermarks
+        self.fetch_items = fetch_items
+
+        start = start or datetime.now(timezone.utc) - timedelta(days=1)
+        self.start = format_timestamp(start) if isinstance(start, datetime) else start
+
+    def sync(self):
+        """Run a sync pass over all marketplaces, yielding an OrderEvent for each new or changed order."""
+        for market in self.markets:
+            yield from self.sync_market(market)
+
+    def sync_market(self, market):
+        """Run a sync pass for a single marketplace, yielding an OrderEvent for each new or changed order. The
+        watermark is saved once all of the marketplace's orders have been yielded."""
+        key = f'{self.seller_id}/{market}'
+        mark = self.watermarks.get(key) or {'after': self.start, 'ids': []}
+        after, seen = mark['after'], set(mark['ids'])
+        after_date = parse_timestamp(after)
+
+        newest, newest_date, newest_ids = after, after_date, set(seen)
+
+        for result in iter_pages(self.api, 'ListOrders', MarketplaceId=[market], LastUpdatedAfter=after):
+            for element in result.iterfind('Orders/Order'):
+                order_id = element.findtext('AmazonOrderId')
+                last_update = element.findtext('LastUpdateDate')
+                last_update_date = parse_timestamp(last_update)
+
+                if last_update_date == after_date and order_id in seen:
+                    continue        # Already reported during the last sync
+
+                if last_update_date > newest_date:
+                    newest, newest_date, newest_ids = last_update, last_update_date, {order_id}
+                elif last_update_date == newest_date:
+                    newest_ids.add(order_id)
+
+                purchase_date = parse_timestamp(element.findtext('PurchaseDate') or last_update)
+                kind = 'created' if purchase_date >= after_date else 'updated'
+                items = self.order_items(order_id) if self.fetch_items else None
+
+                yield OrderEvent(kind, market, order_id, element_to_dict(element), items)
+
+        self.watermarks.set(key, {'after': newest, 'ids': sorted(newest_ids)})
+
+    def order_items(self, order_id):
+        """Return a list of dicts describing the items in an order."""
+        return order_items(self.api, order_id)
+
+
+class OrderItemFetcher:
+    """Fetches the items for a stream of orders using up to max_in_flight concurrent requests. Requests and
+    response parsing both happen in worker threads, so while the consumer handles one order's items, the requests
+    for the next ones are already under way.
+
+    api can be an Orders object, but should usually be a Throttler wrapping one: the Throttler spaces the requests
+    out according to the ListOrderItems quota, and the fetcher keeps enough of them queued that the quota never
+    goes unused."""
+
+    def __init__(self, api, max_in_flight=10):
+        """Initialize the OrderItemFetcher object."""
+        if max_in_flight < 1:
+            raise ValueError('max_in_flight must be at least 1.')
+
+        self.api = api
+        self.max_in_flight = max_in_flight
+
+    def fetch(self, order_ids):
+        """Yield (order_id, items) tuples in the order the requests complete. order_ids can be any iterable, and is
+        consumed lazily: a new request is only started when a finished one has been handed to the consumer, so no
+        more than max_in_flight orders are ever requested or waiting to be consumed."""
+        order_ids = iter(order_ids)
+        pending = set()
+
+        with ThreadPoolExecutor(max_workers=self.max_in_flight) as executor:
+            try:
+                for order_id in order_ids:
+                    pending.add(executor.submit(self._fetch_one, order_id))
+                    if len(pending) == self.max_in_flight:
+                        break
+
+                while pending:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        result = future.result()
+
+                        next_id = next(order_ids, None)
+                        if next_id is not None:
+                            pending.add(executor.submit(self._fetch_one, next_id))
+
+                        yield result
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def _fetch_one(self, order_id):
+        """Fetch and parse the items for a single order."""
+        return order_id, order_items(self.api, order_id)
@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`pacing` -- Evenly spaced requests across threads and processes
+--------------------------------------------------------------------
+
+.. module:: pacing
+
+Contains PacingClock, which hands out request slots at a fixed interval. Where Throttler tracks quotas for a single
+process, a PacingClock given a path shares its schedule with every other process using the same file.
+"""
+
+
+import os
+
+from threading import Lock
+from time import time, sleep
+
+try:
+    import fcntl
+except ImportError:     # Not available on Windows
+    fcntl = None
+
+
+class PacingClock:
+    """Hands out time slots spaced interval seconds apart. If path is given, the time of the next free slot is kept
+    in that file (locked while it is updated), so that all processes using the same path share one schedule."""
+
+    def __init__(self, interval=1.0, path=None):
+        """Initialize the PacingClock object."""
+        if path is not None and fcntl is None:
+            raise RuntimeError('Sharing a PacingClock between processes requires fcntl, which is not available.')
+
+        self.interval = interval
+        self.path = path
+        self._next_slot = 0
+        self._lock = Lock()
+
+    def reserve(self):
+        """Reserve the next free slot, and return how long to wait (in seconds) before it arrives."""
+        with self._lock:
+            if self.path is None:
+                now = time()
+                slot = max(now, self._next_slot)
+                self._next_slot = slot + self.interval
+                return slot - now
+
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                data = os.pread(fd, 64, 0)
+                now = time()
+                slot = max(now, float(data or 0))
+                os.ftruncate(fd, 0)
+                os.pwrite(fd, repr(slot + self.interval).encode(), 0)
+            finally:
+                os.close(fd)    # Also releases the lock
+
+            return slot - now
+
+    def wait(self):
+        """Reserve a slot and sleep() until it arrives."""
+        sleep(self.reserve())
+
+    async def wait_async(self):
+        """Reserve a slot and asyncio.sleep() until it arrives."""
+        import asyncio
+        await asyncio.sleep(self.reserve())
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`records` -- Compact records for high-volume results
+---------------------------------------------------------
+
+.. module:: records
+
+Contains record classes for the results that tend to be held in large numbers: offers and prices from Products,
+orders and order items from Orders, and supply rows from FulfillmentInventory. Records use __slots__ instead of a
+dict per object, ASINs, SKUs, marketplace ids and other repetitive strings are interned, and money is stored as an
+integer number of hundredths (see responses.to_cents()) rather than as strings or Decimals. See
+benchmarks/bench_records.py for a comparison with element_to_dict().
+"""
+
+
+from sys import intern
+
+from .responses import iter_pages, parse_xml, result_element, to_cents
+
+
+def _text(value):
+    return value
+
+
+def _interned(value):
+    return None if value is None else intern(value)
+
+
+def _cents(value):
+    return None if value is None else to_cents(value)
+
+
+def _integer(value):
+    return None if value is None else int(value)
+
+
+def _boolean(value):
+    return None if value is None else value.strip().lower() == 'true'
+
+
+def _extractor(cls):
+    """Generate the function behind cls.from_element(), with a line for each field instead of a loop over FIELDS.
+    This saves the per-field tuple unpacking, branching and setattr() calls of a loop."""
+    namespace = {'new': cls.__new__, 'cls': cls}
+    lines = [
+        'def extract(element, values):',
+        '    get = {child.tag: child for child in element}.get',
+        '    record = new(cls)',
+    ]
+    for idx, (name, path, convert) in enumerate(cls.FIELDS):
+        if path is None:
+            lines.append(f'    record.{name} = values.get({name!r})')
+            continue
+
+        # Each child is looked up once by its tag; only nested fields search below it
+        tag, _, rest = path.partition('/')
+        namespace[f'convert{idx}'] = convert
+        text = f'child.findtext({rest!r})' if rest else 'child.text'
+        lines.append(f'    child = get({tag!r})')
+        lines.append(f'    record.{name} = None if child is None else convert{idx}({text})')
+
+    lines.append('    return record')
+    exec('\n'.join(lines), namespace)
+    return namespace['extract']
+
+
+class Record:
+    """Base class for records. Subclasses list their fields in FIELDS, as (name, path, convert) tuples: the field
+    is read from the element's child at path and passed through convert, or, if path is None, given by the caller.
+    __slots__ must list the same names in the same order."""
+
+    __slots__ = ()
+    FIELDS = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+
+        cls._extract = staticmethod(_extractor(cls))
+
+    def __init__(self, *args, **kwargs):
+        """Initialize the record. Fields can be given by position or by name; missing fields are None."""
+        if len(args) > len(self.__slots__):
+            raise TypeError(f'{type(self).__name__} takes at most {len(self.__slots__)} fields.')
+
+        for name, value in zip(self.__slots__, args):
+            setattr(self, name, value)
+
+        for name in self.__slots__[len(args):]:
+            setattr(self, name, kwargs.pop(name, None))
+
+        if kwargs:
+            raise TypeError(f'Unknown fields for {type(self).__name__}: {", ".join(kwargs)}')
+
+    @classmethod
+    def from_element(cls, element, **values):
+        """Build a record from an element. values gives the fields whose path is None."""
+        return cls._extract(element, values)
+
+    def as_dict(self):
+        """Return the record's fields as a dict."""
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+
+        return all(getattr(self, name) == getattr(other, name) for name in self.__slots__)
+
+    def __repr__(self):
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in self.__slots__)
+        return f'{type(self).__name__}({fields})'
+
+
+class OfferRecord(Record):
+    """An offer from GetLowestPricedOffersForASIN or GetLowestPricedOffersForSKU."""
+
+    FIELDS = (
+        ('asin', None, _interned),
+        ('market', None, _interned),
+        ('sub_condition', 'SubCondition', _interned),
+        ('currency', 'ListingPrice/CurrencyCode', _interned),
+        ('listing_price', 'ListingPrice/Amount', _cents),
+        ('shipping', 'Shipping/Amount', _cents),
+        ('feedback_rating', 'SellerFeedbackRating/SellerPositiveFeedbackRating', _integer),
+        ('fulfilled_by_amazon', 'IsFulfilledByAmazon', _boolean),
+        ('buy_box_winner', 'IsBuyBoxWinner', _boolean),
+    )
+    __slots__ = tuple(name for name, path, convert in FIELDS)
+
+
+class PriceRecord(Record):
+    """One of the seller's own offers, from GetMyPriceForSKU or GetMyPriceForASIN."""
+
+    FIELDS = (
+        ('asin', None, _interned),
+        ('market', None, _interned),
+        ('sku', 'SellerSKU', _interned),
+        ('condition', 'ItemCondition', _interned),
+        ('fulfillment_channel', 'FulfillmentChannel', _interned),
+        ('currency', 'BuyingPrice/ListingPrice/CurrencyCode', _interned),
+        ('listing_price', 'BuyingPrice/ListingPrice/Amount', _cents),
+        ('shipping', 'BuyingPrice/Shipping/Amount', _cents),
+        ('landed_price', 'BuyingPrice/LandedPrice/Amount', _cents),
+        ('regular_price', 'RegularPrice/Amount', _cents),
+    )
+    __slots__ = tuple(name for name, path, convert in FIELDS)
+
+
+class OrderRecord(Record):
+    """An order from ListOrders or GetOrder. Dates are kept as the ISO 8601 strings Amazon sends."""
+
+    FIELDS = (
+        ('order_id', 'AmazonOrderId', _text),
+        ('market', 'MarketplaceId', _interned),
+        ('status', 'OrderStatus', _interned),
+        ('fulfillment_channel', 'FulfillmentChannel', _interned),
+        ('purchase_date', 'PurchaseDate', _text),
+        ('last_update', 'LastUpdateDate', _text),
+        ('currency', 'OrderTotal/CurrencyCode', _interned),
+        ('total', 'OrderTotal/Amount', _cents),
+        ('items_shipped', 'NumberOfItemsShipped', _integer),
+        ('items_unshipped', 'NumberOfItemsUnshipped', _integer),
+    )
+    __slots__ = tuple(name for name, path, convert in FIELDS)
+
+
+class OrderItemRecord(Record):
+    """An order item from ListOrderItems."""
+
+    FIELDS = (
+        ('order_id', None, _text),
+        ('order_item_id', 'OrderItemId', _text),
+        ('asin', 'ASIN', _interned),
+        ('sku', 'SellerSKU', _interned),
+        ('quantity_ordered', 'QuantityOrdered', _integer),
+        ('quantity_shipped', 'QuantityShipped', _integer),
+        ('currency', 'ItemPrice/CurrencyCode', _interned),
+        ('item_price', 'ItemPrice/Amount', _cents),
+        ('shipping_price', 'ShippingPrice/Amount', _cents),
+        ('item_tax', 'ItemTax/Amount', _cents),
+    )
+    __slots__ = tuple(name for name, path, convert in FIELDS)
+
+
+class InventoryRecord(Record):
+    """A supply row from ListInventorySupply."""
+
+    FIELDS = (
+        ('sku', 'SellerSKU', _interned),
+        ('asin', 'ASIN', _interned),
+        ('fnsku', 'FNSKU', _interned),
+        ('condition', 'Condition', _interned),
+        ('total', 'TotalSupplyQuantity', _integer),
+        ('in_stock', 'InStockSupplyQuantity', _integer),
+    )
+    __slots__ = tuple(name for name, path, convert in FIELDS)
+
+
+def iter_records(elements, record_type, **values):
+    """Yield a record_type for each of elements. values gives the fields that aren't read from the elements."""
+    for element in elements:
+        yield record_type.from_element(element, **values)
+
+
+def page_records(api, action, path, record_type, **kwargs):
+    """Call action (following NextTokens; see iter_pages()) and yield a record_type for each element at path in
+    each result. For example, page_records(api, 'ListOrders', 'Orders/Order', OrderRecord, CreatedAfter=...)."""
+    for result in iter_pages(api, action, **kwargs):
+        yield from iter_records(result.iterfind(path), record_type)
+
+
+def offer_records(response):
+    """Yield an OfferRecord for each offer in a GetLowestPricedOffersForASIN or ...ForSKU response."""
+    result = result_element(parse_xml(response))
+    asin = _interned(result.findtext('Identifier/ASIN'))
+    market = _interned(result.findtext('Identifier/MarketplaceId'))
+
+    yield from iter_records(result.iterfind('Offers/Offer'), OfferRecord, asin=asin, market=market)
+
+
+def price_records(response):
+    """Yield a PriceRecord for each offer in a GetMyPriceForSKU or GetMyPriceForASIN response, which can hold a
+    result for each of several products."""
+    for product in parse_xml(response).iterfind('*/Product'):
+        asin = _interned(product.findtext('Identifiers/MarketplaceASIN/ASIN'))
+        market = _interned(product.findtext('Identifiers/MarketplaceASIN/MarketplaceId'))
+
+        yield from iter_records(product.iterfind('Offers/Offer'), PriceRecord, asin=asin, market=market)
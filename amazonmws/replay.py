@@ -0,0 +1,238 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`replay` -- Recording and replaying API traffic
+----------------------------------------------------
+
+.. module:: replay
+
+Contains Recorder and Replayer, two make_request functions. A Recorder passes requests on to a real transport and
+saves each response in an archive; a Replayer answers requests from that archive instead of calling Amazon, either
+as fast as possible or paced like the original responses. This makes it possible to run a pipeline (AmzCall objects,
+Throttlers and all) offline, repeatably, and without spending any quota.
+
+An archive is two files: path holds the recorded requests and responses, one after another, and path.idx is a hash
+table of where each one starts. The Replayer memory-maps both, so finding a response is a single probe into the
+table no matter how large the archive is, and opening one doesn't read it into memory.
+"""
+
+
+import mmap
+import os
+import struct
+import urllib.parse
+
+from hashlib import blake2b
+from threading import Lock
+from time import time, sleep
+
+from .responses import response_body
+from .watermarks import atomic_write
+
+
+#: Parameters left out of request keys, because they change every time a request is signed.
+IGNORED_PARAMS = ('Timestamp', 'Signature')
+
+#: Version number written to (and expected in) archive index files.
+ARCHIVE_VERSION = 1
+
+_MAGIC = b'AMZR'
+_HEADER = struct.Struct('<4sIQQ')       # Magic, version, number of slots, number of entries
+_SLOT = struct.Struct('<QQIf')          # Key hash (0 for an empty slot), offset, length, elapsed seconds
+_KEY_LENGTH = struct.Struct('<I')
+
+
+def request_key(method, url, data=None):
+    """Return the key a request is recorded under: the method, host, path and parameters of url (leaving out
+    IGNORED_PARAMS), followed by the request body, if any."""
+    parts = urllib.parse.urlsplit(url)
+    params = '&'.join(param for param in parts.query.split('&') if param.partition('=')[0] not in IGNORED_PARAMS)
+    key = f'{method.upper()} {parts.netloc}{parts.path}?{params}'.encode()
+
+    if data:
+        key += b'\n' + (data.encode() if isinstance(data, str) else bytes(data))
+
+    return key
+
+
+def _hash(key):
+    """Return the 64-bit hash of key used in archive indexes. Never returns 0, which marks an empty slot."""
+    return int.from_bytes(blake2b(key, digest_size=8).digest(), 'little') or 1
+
+
+def _index_path(path):
+    return f'{path}.idx'
+
+
+def _read_header(index, path):
+    """Return the (number of slots, number of entries) in index, a buffer holding an index file."""
+    if len(index) < _HEADER.size:
+        raise ValueError(f'{path} is not an archive index.')
+
+    magic, version, size, count = _HEADER.unpack_from(index)
+    if magic != _MAGIC:
+        raise ValueError(f'{path} is not an archive index.')
+    elif version != ARCHIVE_VERSION:
+        raise ValueError(f'Unsupported archive version: {version}')
+
+    return size, count
+
+
+def _read_entries(path):
+    """Return the entries in the index file at path, as a dict of {hash: (offset, length, elapsed)}."""
+    with open(path, 'rb') as file:
+        index = file.read()
+
+    size, count = _read_header(index, path)
+    entries = {}
+    for slot in range(size):
+        key_hash, offset, length, elapsed = _SLOT.unpack_from(index, _HEADER.size + slot * _SLOT.size)
+        if key_hash:
+            entries[key_hash] = (offset, length, elapsed)
+
+    return entries
+
+
+def _write_index(path, entries):
+    """Write entries (see _read_entries()) to the index file at path, replacing it atomically. The table has at
+    least twice as many slots as entries, so that probes stay short."""
+    size = 8
+    while size < 2 * len(entries):
+        size *= 2
+
+    mask = size - 1
+    index = bytearray(_HEADER.size + size * _SLOT.size)
+    _HEADER.pack_into(index, 0, _MAGIC, ARCHIVE_VERSION, size, len(entries))
+
+    for key_hash, (offset, length, elapsed) in entries.items():
+        slot = key_hash & mask
+        while _SLOT.unpack_from(index, _HEADER.size + slot * _SLOT.size)[0]:
+            slot = (slot + 1) & mask
+
+        _SLOT.pack_into(index, _HEADER.size + slot * _SLOT.size, key_hash, offset, length, elapsed)
+
+    with atomic_write(path, 'wb') as file:
+        file.write(index)
+
+
+class Recorder:
+    """A make_request function that passes each request on to make_request, records the response in the archive at
+    path, and returns the response unchanged. Recording into an existing archive adds to it; a request that was
+    already recorded is replaced. The index is written by close(), so a Recorder should be closed (or used as a
+    context manager) when recording is done."""
+
+    def __init__(self, path, make_request):
+        """Initialize the Recorder object."""
+        self.path = path
+        self.make_request = make_request
+        self._entries = _read_entries(_index_path(path)) if os.path.exists(_index_path(path)) else {}
+        self._file = open(path, 'ab')
+        self._lock = Lock()
+
+    def __call__(self, method, url, **kwargs):
+        start = time()
+        response = self.make_request(method=method, url=url, **kwargs)
+        elapsed = time() - start
+
+        self.record(request_key(method, url, kwargs.get('data')), response_body(response), elapsed)
+        return response
+
+    def record(self, key, body, elapsed=0):
+        """Add body to the archive as the response to the request identified by key (see request_key()). elapsed
+        is how long the response took, in seconds."""
+        with self._lock:
+            offset = self._file.tell()
+            self._file.write(_KEY_LENGTH.pack(len(key)))
+            self._file.write(key)
+            self._file.write(body)
+            self._entries[_hash(key)] = (offset, _KEY_LENGTH.size + len(key) + len(body), elapsed)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def close(self):
+        """Finish writing the archive, and write its index."""
+        with self._lock:
+            if self._file.closed:
+                return
+
+            self._file.close()
+            _write_index(_index_path(self.path), self._entries)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class Replayer:
+    """A make_request function that answers requests from the archive at path, written by a Recorder. Responses
+    are returned as bytes. If speed is None, they are returned immediately; otherwise, each one takes as long as the
+    recorded response did, divided by speed (so 1 replays in real time, and 10 ten times faster). Requests that
+    aren't in the archive raise KeyError."""
+
+    def __init__(self, path, speed=None):
+        """Initialize the Replayer object."""
+        self.path = path
+        self.speed = speed
+
+        with open(_index_path(path), 'rb') as file:
+            self._index = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._size, self._count = _read_header(self._index, _index_path(path))
+        self._mask = self._size - 1
+
+        with open(path, 'rb') as file:
+            empty = os.fstat(file.fileno()).st_size == 0
+            self._data = b'' if empty else mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def lookup(self, key):
+        """Return a (body, elapsed) tuple for the request identified by key (see request_key())."""
+        key_hash = _hash(key)
+        slot = key_hash & self._mask
+
+        while True:
+            slot_hash, offset, length, elapsed = _SLOT.unpack_from(self._index, _HEADER.size + slot * _SLOT.size)
+            if slot_hash == key_hash:
+                break
+            elif not slot_hash:
+                raise KeyError(f'No recorded response for {key.decode(errors="replace")}')
+
+            slot = (slot + 1) & self._mask
+
+        key_end = offset + _KEY_LENGTH.size + _KEY_LENGTH.unpack_from(self._data, offset)[0]
+        if self._data[offset + _KEY_LENGTH.size:key_end] != key:
+            raise KeyError(f'No recorded response for {key.decode(errors="replace")}')
+
+        return self._data[key_end:offset + length], elapsed
+
+    def __call__(self, method, url, **kwargs):
+        body, elapsed = self.lookup(request_key(method, url, kwargs.get('data')))
+        if self.speed:
+            sleep(elapsed / self.speed)
+
+        return body
+
+    def __contains__(self, key):
+        try:
+            self.lookup(key)
+        except KeyError:
+            return False
+
+        return True
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        """Unmap the archive."""
+        self._index.close()
+        if self._data:
+            self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`responses` -- Reading API responses
+-----------------------------------------
+
+.. module:: responses
+
+Helpers for turning whatever make_request returned into parsed XML, and for following NextTokens.
+"""
+
+
+from datetime import datetime, timezone
+from xml.etree import ElementTree
+
+from .operations import find_operation
+
+
+class MWSError(Exception):
+    """Raised when Amazon returns an ErrorResponse."""
+
+    def __init__(self, code, message, error_type=None):
+        super().__init__(f'{code}: {message}')
+        self.code = code
+        self.message = message
+        self.error_type = error_type
+
+    def __reduce__(self):
+        return type(self), (self.code, self.message, self.error_type)
+
+
+def parse_timestamp(value):
+    """Convert an ISO 8601 timestamp from MWS (like 2017-10-09T20:59:18.297Z) to an aware datetime."""
+    return datetime.fromisoformat(value.replace('Z', '+00:00'))
+
+
+def format_timestamp(value):
+    """Convert a datetime to an ISO 8601 timestamp suitable for MWS."""
+    return value.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def to_cents(value):
+    """Convert a decimal amount (like '-12.345') to an integer number of hundredths, rounding half away from zero.
+    Avoids the cost of creating Decimal objects for every amount in a large response."""
+    whole, _, fraction = value.partition('.')
+    if len(fraction) == 2 and whole.isdecimal() and fraction.isdecimal():
+        return int(whole + fraction)       # The usual case, like '12.34'
+
+    value = value.strip()
+    negative = value.startswith('-')
+    whole, _, fraction = value.lstrip('+-').partition('.')
+    fraction = fraction.ljust(3, '0')
+
+    cents = int(whole or 0) * 100 + int(fraction[:2]) + (fraction[2] >= '5')
+    return -cents if negative else cents
+
+
+def amount(cents):
+    """Format an integer number of hundredths as a decimal amount (like '-12.35'), the reverse of to_cents()."""
+    sign = '-' if cents < 0 else ''
+    return f'{sign}{abs(cents) // 100}.{abs(cents) % 100:02d}'
+
+
+def response_body(response):
+    """Return the body of response as bytes. response can be bytes (or another bytes-like object, which is returned
+    as is), a string, or an object with a 'content' or 'text' attribute (like requests.Response)."""
+    if isinstance(response, (bytes, bytearray, memoryview)):
+        return response
+    elif isinstance(response, str):
+        return response.encode()
+
+    content = getattr(response, 'content', None)
+    if isinstance(content, bytes):
+        return content
+
+    text = getattr(response, 'text', None)
+    if isinstance(text, str):
+        return text.encode()
+
+    raise TypeError(f'Can not read a response body from {type(response)}')
+
+
+def parse_xml(response):
+    """Parse response into an ElementTree Element, with namespaces removed from tag names. Raises MWSError if the
+    response is an ErrorResponse."""
+    root = ElementTree.fromstring(response_body(response))
+
+    for element in root.iter():
+        if element.tag[0] == '{':
+            element.tag = element.tag.partition('}')[2]
+
+    if root.tag == 'ErrorResponse':
+        error = root.find('Error')
+        raise MWSError(error.findtext('Code'), error.findtext('Message'), error.findtext('Type'))
+
+    return root
+
+
+def element_to_dict(element):
+    """Convert element to a dict. Elements without children become strings; tags that appear more than once
+    become lists."""
+    result = {}
+    for child in element:
+        value = element_to_dict(child) if len(child) else child.text
+        if child.tag in result:
+            if not isinstance(result[child.tag], list):
+                result[child.tag] = [result[child.tag]]
+            result[child.tag].append(value)
+        else:
+            result[child.tag] = value
+
+    return result
+
+
+def result_element(root):
+    """Return the ...Result element of a parsed response."""
+    for child in root:
+        if child.tag.endswith('Result'):
+            return child
+
+    raise ValueError(f'No Result element in {root.tag}')
+
+
+def iter_pages(api, action, **kwargs):
+    """Call action, then the operation that continues it for as long as the responses include a NextToken. Yields
+    the Result element of each response. api can be an AmzCall object or a Throttler. The next operation is read from
+    the operation catalog, defaulting to <action>ByNextToken."""
+    result = result_element(parse_xml(getattr(api, action)(**kwargs)))
+    yield result
+
+    operation = find_operation(None, action)
+    next_action = operation.next_action if operation and operation.next_action else f'{action}ByNextToken'
+    next_token = result.findtext('NextToken')
+    while next_token:
+        result = result_element(parse_xml(getattr(api, next_action)(NextToken=next_token)))
+        yield result
+        next_token = result.findtext('NextToken')
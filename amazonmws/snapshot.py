@@ -0,0 +1,382 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`snapshot` -- Catalog snapshots
+------------------------------------
+
+.. module:: snapshot
+
+Contains SnapshotBuilder, which collects the categories (from GetProductCategoriesForASIN) and recommendations (from
+ListRecommendations) for every ASIN in a catalog, and SnapshotIndex, which reads the result back from disk.
+
+Category trees are shared by many products, so they are kept once, in a CategoryGraph, and each ASIN only holds the
+slots of its leaf categories. Categories are fetched for several ASINs at once (wrap the Products object in a
+Throttler to keep within quota), and each result is appended to a journal as soon as it arrives, so an interrupted
+build picks up where it left off. The finished snapshot is written as a single file that SnapshotIndex memory-maps:
+looking up an ASIN is one probe into a hash table, as in amazonmws.replay.
+"""
+
+
+import json
+import mmap
+import os
+import struct
+
+from array import array
+from concurrent.futures import ThreadPoolExecutor
+from sys import intern
+
+from .api import MARKETID
+from .replay import _hash
+from .responses import MWSError, iter_pages, parse_xml, result_element
+from .watermarks import atomic_write
+
+
+#: Version number written to (and expected in) snapshot index files.
+SNAPSHOT_VERSION = 1
+
+_MAGIC = b'AMZS'
+_HEADER = struct.Struct('<4sIIIIQ')     # Magic, version, number of nodes, number of slots, number of ASINs, strings
+_NODE = struct.Struct('<iII')           # Parent node (-1 for a root), category id string, name string
+_SLOT = struct.Struct('<QQ')            # ASIN hash (0 for an empty slot), record offset
+_COUNT = struct.Struct('<H')
+_REF = struct.Struct('<I')
+
+
+def category_chains(response):
+    """Return a list of the categories in a GetProductCategoriesForASIN (or ...ForSKU) response, each as a list of
+    (category id, name) tuples from the root down to the product's category."""
+    chains = []
+    for category in result_element(parse_xml(response)).iterfind('Self'):
+        chain = []
+        while category is not None:
+            chain.append((category.findtext('ProductCategoryId'), category.findtext('ProductCategoryName')))
+            category = category.find('Parent')
+
+        chains.append(chain[::-1])
+
+    return chains
+
+
+class CategoryGraph:
+    """The categories of a snapshot, each stored once however many products (or child categories) share it. Each
+    category has a slot number; ids and names are interned strings, and parents are kept in an array of slots (-1
+    for a root). A category that appears under more than one parent (which browse trees allow) gets a slot for each,
+    so that every chain leads back to its own root."""
+
+    def __init__(self):
+        """Initialize the CategoryGraph object."""
+        self.ids = []
+        self.names = []
+        self.parents = array('l')
+        self._slots = {}
+
+    def add(self, category_id, name, parent=-1):
+        """Return the slot of a category under parent, adding it if it isn't in the graph yet."""
+        slot = self._slots.get((parent, category_id))
+        if slot is None:
+            slot = self._slots[parent, intern(category_id)] = len(self.ids)
+            self.ids.append(intern(category_id))
+            self.names.append(None if name is None else intern(name))
+            self.parents.append(parent)
+
+        return slot
+
+    def add_chain(self, chain):
+        """Add a chain of (category id, name) tuples, from the root down, and return the slot of its last category."""
+        slot = -1
+        for category_id, name in chain:
+            slot = self.add(category_id, name, slot)
+
+        return slot
+
+    def chain(self, slot):
+        """Return the chain of (category id, name) tuples from the root down to the category in slot."""
+        chain = []
+        while slot >= 0:
+            chain.append((self.ids[slot], self.names[slot]))
+            slot = self.parents[slot]
+
+        return chain[::-1]
+
+    def slot(self, category_id, parent=None):
+        """Return the slot of a category under parent (a slot, or -1 for a root), or None if it isn't in the graph.
+        If parent is None, returns the first slot added for category_id, whatever its parent."""
+        if parent is not None:
+            return self._slots.get((parent, category_id))
+
+        try:
+            return self.ids.index(category_id)
+        except ValueError:
+            return None
+
+    def __len__(self):
+        return len(self.ids)
+
+
+class CatalogSnapshot:
+    """The categories and recommendations of a set of ASINs. categories maps each ASIN to a tuple of slots in graph,
+    and recommendations maps ASINs to lists of (recommendation category, reason) tuples."""
+
+    def __init__(self):
+        """Initialize the CatalogSnapshot object."""
+        self.graph = CategoryGraph()
+        self.categories = {}
+        self.recommendations = {}
+
+    def add_categories(self, asin, chains):
+        """Set the categories of asin, given as chains (see category_chains())."""
+        self.categories[intern(asin)] = tuple(self.graph.add_chain(chain) for chain in chains)
+
+    def add_recommendation(self, asin, category, reason):
+        """Add a recommendation for asin."""
+        reason = None if reason is None else intern(reason)
+        self.recommendations.setdefault(intern(asin), []).append((intern(category), reason))
+
+    def chains(self, asin):
+        """Return the categories of asin as chains (see category_chains()), or None if asin isn't in the snapshot."""
+        slots = self.categories.get(asin)
+        return None if slots is None else [self.graph.chain(slot) for slot in slots]
+
+    def write(self, path):
+        """Write the snapshot to an index file at path (see SnapshotIndex), replacing it atomically."""
+        strings, string_data = {}, bytearray()
+
+        def string(value):
+            ref = strings.get(value)
+            if ref is None:
+                encoded = (value or '').encode()
+                ref = strings[value] = len(string_data)
+                string_data.extend(_COUNT.pack(len(encoded)) + encoded)
+            return ref
+
+        graph = self.graph
+        nodes = b''.join(
+            _NODE.pack(parent, string(category_id), string(name))
+            for category_id, name, parent in zip(graph.ids, graph.names, graph.parents)
+        )
+
+        asins = set(self.categories) | set(self.recommendations)
+        size = 8
+        while size < 2 * len(asins):
+            size *= 2
+
+        mask = size - 1
+        table = bytearray(size * _SLOT.size)
+        records = bytearray()
+        records_offset = _HEADER.size + len(nodes) + len(table)
+
+        for asin in asins:
+            encoded = asin.encode()
+            slots = self.categories.get(asin, ())
+            recommendations = self.recommendations.get(asin, ())
+
+            key_hash = _hash(encoded)
+            slot = key_hash & mask
+            while _SLOT.unpack_from(table, slot * _SLOT.size)[0]:
+                slot = (slot + 1) & mask
+            _SLOT.pack_into(table, slot * _SLOT.size, key_hash, records_offset + len(records))
+
+            records += _COUNT.pack(len(encoded)) + encoded
+            records += _COUNT.pack(len(slots)) + b''.join(_REF.pack(node) for node in slots)
+            records += _COUNT.pack(len(recommendations))
+            for category, reason in recommendations:
+                records += _REF.pack(string(category)) + _REF.pack(string(reason))
+
+        header = _HEADER.pack(_MAGIC, SNAPSHOT_VERSION, len(graph), size, len(asins), records_offset + len(records))
+
+        with atomic_write(path, 'wb') as file:
+            for part in (header, nodes, table, records, string_data):
+                file.write(part)
+
+
+class SnapshotBuilder:
+    """Builds a CatalogSnapshot for the ASINs in one marketplace. products is used for GetProductCategoriesForASIN
+    and recommendations (optional) for ListRecommendations; both should usually be Throttlers, since up to
+    max_workers calls are made at once.
+
+    If journal is given, every result is appended to the file at that path as it arrives, and results already in it
+    are loaded instead of being requested again, so a build that is interrupted can simply be run again."""
+
+    def __init__(self, products, recommendations=None, market='US', journal=None, max_workers=4):
+        """Initialize the SnapshotBuilder object."""
+        self.products = products
+        self.recommendations = recommendations
+        self.market = MARKETID.get(market, market)
+        self.journal = journal
+        self.max_workers = max_workers
+        self.snapshot = CatalogSnapshot()
+        self._recommendations_done = False
+
+        if journal is not None and os.path.exists(journal):
+            self._load_journal(journal)
+
+    def _load_journal(self, path):
+        """Load the results recorded in the journal at path. A last line left incomplete by an interruption is
+        ignored."""
+        with open(path) as file:
+            for line in file:
+                try:
+                    kind, *entry = json.loads(line)
+                except ValueError:
+                    break
+
+                if kind == 'categories':
+                    asin, chains = entry
+                    self.snapshot.add_categories(asin, chains)
+                elif kind == 'recommendations':
+                    for asin, category, reason in entry[0]:
+                        self.snapshot.add_recommendation(asin, category, reason)
+                    self._recommendations_done = True
+
+    def _write_journal(self, file, *entry):
+        if file is not None:
+            file.write(json.dumps(entry, separators=(',', ':')) + '\n')
+            file.flush()
+
+    def build(self, asins):
+        """Fetch the categories of each of asins that isn't in the snapshot yet (and, once, the recommendations for
+        the marketplace), and return the CatalogSnapshot. Call its write() method to save it as an index."""
+        file = None if self.journal is None else open(self.journal, 'a')
+
+        try:
+            if self.recommendations is not None and not self._recommendations_done:
+                found = list(self.fetch_recommendations())
+                for asin, category, reason in found:
+                    self.snapshot.add_recommendation(asin, category, reason)
+
+                self._write_journal(file, 'recommendations', found)
+                self._recommendations_done = True
+
+            todo = list(dict.fromkeys(asin for asin in asins if asin not in self.snapshot.categories))
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                futures = [executor.submit(self.fetch_categories, asin) for asin in todo]
+                try:
+                    for asin, future in zip(todo, futures):
+                        chains = future.result()
+                        self.snapshot.add_categories(asin, chains)
+                        self._write_journal(file, 'categories', asin, chains)
+                except BaseException:
+                    for future in futures:
+                        future.cancel()
+                    raise
+        finally:
+            if file is not None:
+                file.close()
+
+        return self.snapshot
+
+    def fetch_categories(self, asin):
+        """Return the categories of asin as chains (see category_chains()). ASINs that Amazon rejects (a Sender
+        error) have no categories, so that they aren't requested again."""
+        try:
+            return category_chains(self.products.GetProductCategoriesForASIN(MarketplaceId=self.market, ASIN=asin))
+        except MWSError as e:
+            if e.error_type != 'Sender':
+                raise
+            return []
+
+    def fetch_recommendations(self):
+        """Yield (asin, recommendation category, reason) tuples for each recommendation in the marketplace."""
+        for result in iter_pages(self.recommendations, 'ListRecommendations', MarketplaceId=self.market):
+            for group in result:
+                if not group.tag.endswith('Recommendations'):
+                    continue
+
+                category = group.tag[:-len('Recommendations')]
+                for member in group.iterfind('member'):
+                    asin = member.findtext('ItemIdentifier/Asin')
+                    if asin:
+                        yield asin, category, member.findtext('RecommendationReason')
+
+
+class SnapshotIndex:
+    """Reads a snapshot written by CatalogSnapshot.write(). The file is memory-mapped, so opening it doesn't read it
+    into memory, and looking up an ASIN only touches the pages it needs."""
+
+    def __init__(self, path):
+        """Initialize the SnapshotIndex object."""
+        self.path = path
+        with open(path, 'rb') as file:
+            self._data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        if len(self._data) < _HEADER.size:
+            raise ValueError(f'{path} is not a snapshot index.')
+
+        magic, version, self._nodes, self._size, self._count, self._strings = _HEADER.unpack_from(self._data)
+        if magic != _MAGIC:
+            raise ValueError(f'{path} is not a snapshot index.')
+        elif version != SNAPSHOT_VERSION:
+            raise ValueError(f'Unsupported snapshot version: {version}')
+
+        self._mask = self._size - 1
+        self._table = _HEADER.size + self._nodes * _NODE.size
+
+    def _string(self, ref):
+        offset = self._strings + ref
+        length = _COUNT.unpack_from(self._data, offset)[0]
+        return self._data[offset + _COUNT.size:offset + _COUNT.size + length].decode()
+
+    def _record(self, asin):
+        """Return the offset of asin's record, just past the ASIN, or None if it isn't in the index."""
+        encoded = asin.encode()
+        key_hash = _hash(encoded)
+        slot = key_hash & self._mask
+
+        while True:
+            slot_hash, offset = _SLOT.unpack_from(self._data, self._table + slot * _SLOT.size)
+            if not slot_hash:
+                return None
+            elif slot_hash == key_hash:
+                length = _COUNT.unpack_from(self._data, offset)[0]
+                if self._data[offset + _COUNT.size:offset + _COUNT.size + length] == encoded:
+                    return offset + _COUNT.size + length
+
+            slot = (slot + 1) & self._mask
+
+    def chain(self, node):
+        """Return the chain of (category id, name) tuples from the root down to node."""
+        chain = []
+        while node >= 0:
+            parent, category_id, name = _NODE.unpack_from(self._data, _HEADER.size + node * _NODE.size)
+            chain.append((self._string(category_id), self._string(name) or None))
+            node = parent
+
+        return chain[::-1]
+
+    def categories(self, asin):
+        """Return the categories of asin as chains (see category_chains()), or None if asin isn't in the index."""
+        offset = self._record(asin)
+        if offset is None:
+            return None
+
+        count = _COUNT.unpack_from(self._data, offset)[0]
+        nodes = struct.unpack_from(f'<{count}I', self._data, offset + _COUNT.size)
+        return [self.chain(node) for node in nodes]
+
+    def recommendations(self, asin):
+        """Return a list of (recommendation category, reason) tuples for asin."""
+        offset = self._record(asin)
+        if offset is None:
+            return []
+
+        offset += _COUNT.size + _COUNT.unpack_from(self._data, offset)[0] * _REF.size
+        count = _COUNT.unpack_from(self._data, offset)[0]
+        refs = struct.unpack_from(f'<{2 * count}I', self._data, offset + _COUNT.size)
+        return [(self._string(category), self._string(reason) or None) for category, reason in zip(*[iter(refs)] * 2)]
+
+    def __contains__(self, asin):
+        return self._record(asin) is not None
+
+    def __len__(self):
+        return self._count
+
+    def close(self):
+        """Unmap the index."""
+        self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
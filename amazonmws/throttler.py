@@ -1,235 +1,174 @@
+import atexit
+import json
+import weakref
+
+from collections import OrderedDict
+from collections.abc import MutableMapping
 from functools import partial
+from threading import Event, Lock
 from time import time, sleep
 
+from .api import AmzCall, MARKETID, ParamList
+from .budget import HourlyBudget
+from .operations import CatalogLimits, batches, find_operation
+from .watermarks import atomic_write
+
 
 ########################################################################################################################
 
 
-DEFAULT_LIMITS = {
-    # Products
-    'ListMatchingProducts': {
-        'quota_max': 20,
-        'restore_rate': 5,
-        'hourly_max': 720
-    },
-    'GetMatchingProduct': {
-        'quota_max': 20,
-        'restore_rate': 0.5,
-        'hourly_max': 7200
-    },
-    'GetMatchingProductForId': {
-        'quota_max': 20,
-        'restore_rate': 0.2,
-        'hourly_max': 18000,
-    },
-    'GetCompetitivePricingForSKU': {
-        'quota_max': 20,
-        'restore_rate': 0.1,
-        'hourly_max': 36000
-    },
-    'GetCompetitivePricingForASIN': {
-        'quota_max': 20,
-        'restore_rate': 0.1,
-        'hourly_max': 36000
-    },
-    'GetLowestOfferListingsForSKU': {
-        'quota_max': 20,
-        'restore_rate': 0.1,
-        'hourly_max': 36000
-    },
-    'GetLowestOfferListingsForASIN': {
-        'quota_max': 20,
-        'restore_rate': 0.1,
-        'hourly_max': 36000
-    },
-    'GetLowestPricedOffersForSKU': {
-        'quota_max': 10,
-        'restore_rate': 0.2,
-        'hourly_max': 200
-    },
-    'GetLowestPriceOffersForASIN': {
-        'quota_max': 10,
-        'restore_rate': 0.2,
-        'hourly_max': 36000
-    },
-    'GetMyFeesEstimate': {
-        'quota_max': 20,
-        'restore_rate': 0.1,
-        'hourly_max': 36000
-    },
-    'GetMyPriceForSKU': {
-        'quota_max': 20,
-        'restore_rate': 0.1,
-        'hourly_max': 36000
-    },
-    'GetMyPriceForASIN': {
-        'quota_max': 20,
-        'restore_rate': 0.1,
-        'hourly_max': 36000
-    },
-    'GetProductCategoriesForSKU': {
-        'quota_max': 20,
-        'restore_rate': 5,
-        'hourly_max': 720
-    },
-    'GetProductCategoriesForASIN': {
-        'quota_max': 20,
-        'restore_rate': 5,
-        'hourly_max': 720
-    },
-    'GetServiceStatus': {
-        'quota_max': 2,
-        'restore_rate': 300
-    },
-
-    # Product Advertising
-    'ItemLookup': {
-        'quota_max': 1,
-        'restore_rate': 1
-    },
-    'ItemSearch': {
-        'quota_max': 1,
-        'restore_rate': 1
-    },
-    
-    # Fulfillment Inventory
-    'ListInventorySupply': {
-        'quota_max': 30,
-        'restore_rate': .5,
-    },
-    'ListInventorySupplyByNextToken': {
-        'quota_max': 30,
-        'restore_rate': .5
-    },
-
-    # Reports
-    'RequestReport': {
-        'quota_max': 15,
-        'restore_rate': 60,
-        'hourly_max': 60
-    },
-    'GetReportRequestList': {
-        'quota_max': 10,
-        'restore_rate': 45,
-        'hourly_max': 80
-    },
-    'GetReportRequestListByNextToken': {
-        'quota_max': 30,
-        'restore_rate': 2,
-        'hourly_max': 1800
-    },
-    'GetReportRequestCount': {
-        'quota_max': 10,
-        'restore_rate': 45,
-        'hourly_max': 80
-    },
-    'CancelReportRequests': {
-        'quota_max': 10,
-        'restore_rate': 45,
-        'hourly_max': 80
-    },
-    'GetReportList': {
-        'quota_max': 10,
-        'restore_rate': 60,
-        'hourly_max': 60
-    },
-    'GetReportListByNextToken': {
-        'quota_max': 30,
-        'restore_rate': 2,
-        'hourly_max': 1800
-    },
-    'GetReportCount': {
-        'quota_max': 10,
-        'restore_rate': 45,
-        'hourly_max': 80
-    },
-    'GetReport': {
-        'quota_max': 15,
-        'restore_rate': 60,
-        'hourly_max': 60
-    },
-    'ManageReportSchedule': {
-        'quota_max': 10,
-        'restore_rate': 45,
-        'hourly_max': 80
-    },
-    'GetReportScheduleList': {
-        'quota_max': 10,
-        'restore_rate': 45,
-        'hourly_max': 80
-    },
-    'GetReportScheduleListByNextToken': {
-        'quota_max': 30,
-        'restore_rate': 2,
-        'hourly_max': 1800
-    },
-    'GetReportScheduleCount': {
-        'quota_max': 10,
-        'restore_rate': 45,
-        'hourly_max': 80
-    },
-    'UpdateReportAcknowledgements': {
-        'quota_max': 10,
-        'restore_rate': 45,
-        'hourly_max': 80
-    },
-
-    # Orders
-    'ListOrders': {
-        'quota_max': 6,
-        'restore_rate': 60,
-    },
-    'ListOrdersByNextToken': {
-        'quota_max': 6,
-        'restore_rate': 60
-    },
-    'GetOrder': {
-        'quota_max': 6,
-        'restore_rate': 60
-    },
-    'ListOrderItems': {
-        'quota_max': 30,
-        'restore_rate': 2
-    },
-    'ListOrderItemsByNextToken': {
-        'quota_max': 30,
-        'restore_rate': 2
-    },
-
-    # FulfillmentInboundShipment
-    'ListInboundShipments': {
-        'quota_max': 30,
-        'restore_rate': .5
-    },
-    'ListInboundShipmentsByNextToken': {
-        'quota_max': 30,
-        'restore_rate': .5
-    },
-    'ListInboundShipmentItems': {
-        'quota_max': 30,
-        'restore_rate': .5
-    },
-    'ListInboundShipmentItemsByNextToken': {
-        'quota_max': 30,
-        'restore_rate': .5
-    },
-    'GetTransportContent': {
-        'quota_max': 30,
-        'restore_rate': .5
-    }
-}
+#: Throttler limits for every operation in the catalog, keyed by action name. See amazonmws.operations. This is a
+#: plain dict (with its own copy of each limits dict), so it can be extended or adjusted before creating Throttlers.
+DEFAULT_LIMITS = {action: dict(limits) for action, limits in CatalogLimits().items()}
+
+
+#: Version number written to (and expected in) saved throttler state files.
+STATE_VERSION = 1
 
 
 ########################################################################################################################
 
 
+class DeadlineExceeded(TimeoutError):
+    """Raised when an API call can not be completed before its deadline."""
+
+
+class Cancelled(Exception):
+    """Raised when an API call is cancelled using a CancelToken."""
+
+
+class CancelToken:
+    """Allows a call that is waiting on the throttler to be cancelled from another thread (or asyncio task). Pass the
+    token as the cancel argument to Throttler.api_call(); calling cancel() wakes the call up, and it raises
+    Cancelled. A token can be shared by any number of calls."""
+
+    def __init__(self):
+        """Initialize the CancelToken object."""
+        self._event = Event()
+
+    def cancel(self):
+        """Cancel all calls using this token."""
+        self._event.set()
+
+    @property
+    def cancelled(self):
+        """True if cancel() has been called."""
+        return self._event.is_set()
+
+    def check(self):
+        """Raise Cancelled if cancel() has been called."""
+        if self._event.is_set():
+            raise Cancelled()
+
+    def sleep(self, seconds):
+        """Sleep for up to seconds, raising Cancelled if cancel() is called in the meantime."""
+        if self._event.wait(seconds):
+            raise Cancelled()
+
+
+def cache_key(action, **kwargs):
+    """Return a hashable key identifying a call to action with the given parameters. Used with Throttler.cache.
+    Lists, tuples, dicts and ParamLists are converted to tuples, at any depth; raises TypeError if a parameter still
+    can't be hashed."""
+    def hashable(value):
+        if isinstance(value, ParamList):
+            return tuple(value.pairs())
+        elif isinstance(value, dict):
+            return tuple(sorted((key, hashable(item)) for key, item in value.items()))
+        elif isinstance(value, (list, tuple)):
+            return tuple(hashable(item) for item in value)
+
+        hash(value)
+        return value
+
+    return action, hashable(kwargs)
+
+
+class TTLCache(MutableMapping):
+    """A dict-like cache for Throttler.cache (and NotificationConsumer) whose entries expire ttl seconds after they
+    were stored, so that cached data isn't served forever. If maxsize is given, the oldest entries are evicted to
+    make room for new ones. Safe to share between threads."""
+
+    def __init__(self, ttl=300, maxsize=None):
+        """Initialize the TTLCache object."""
+        self.ttl = ttl
+        self.maxsize = maxsize
+        self._data = OrderedDict()      # key: (expiry time, value), oldest first
+        self._lock = Lock()
+
+    def __getitem__(self, key):
+        with self._lock:
+            expires, value = self._data[key]
+            if expires <= time():
+                del self._data[key]
+                raise KeyError(key)
+
+        return value
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            self._data.pop(key, None)
+            self._data[key] = (time() + self.ttl, value)
+            while self.maxsize is not None and len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __delitem__(self, key):
+        with self._lock:
+            del self._data[key]
+
+    def expire(self):
+        """Remove the entries that have expired."""
+        now = time()
+        with self._lock:
+            for key in [key for key, (expires, value) in self._data.items() if expires <= now]:
+                del self._data[key]
+
+    def __iter__(self):
+        self.expire()
+        return iter(list(self._data))
+
+    def __len__(self):
+        self.expire()
+        return len(self._data)
+
+
 class Throttler:
 
-    def __init__(self, api=None, limits=None):
-        """Initialize the Throttler object."""
+    def __init__(self, api=None, limits=None, state_file=None, save_interval=60, cache=None, breaker=None):
+        """Initialize the Throttler object. If state_file is provided, usage information is loaded from it (if it
+        exists), saved to it every save_interval seconds, and saved again when the interpreter exits. If cache is
+        provided (any dict-like object, such as a TTLCache), cache_lookup() returns the value stored in it under
+        cache_key(), if any. If breaker is provided (a CircuitBreaker; see amazonmws.health), calls are refused with
+        CircuitOpen while it is open, before they wait for or use any quota, and the outcome of each call is recorded
+        in it."""
         self.limits = dict(DEFAULT_LIMITS) if limits is None else limits
+        self.weights = {}
         self._usage = {}
+        self._locks = {}
+        self._budgets = {}
+        self._state_lock = Lock()       # Guards adding to _usage, limits and _budgets, so snapshot() can copy them
         self.api = api
+        self.cache = cache
+        self.breaker = breaker
+        self.state_file = state_file
+        self.save_interval = save_interval
+        self._last_save = time()
+        self._save_at_exit = None
+
+        if state_file is not None:
+            self.load_state(state_file)
+
+            # Only hold a weak reference, so that registering doesn't keep the throttler alive until exit
+            ref = weakref.ref(self)
+            self._save_at_exit = lambda: ref() is not None and ref().save_state()
+            atexit.register(self._save_at_exit)
+
+    def close(self):
+        """Save the state (if a state file is set), and stop saving it when the interpreter exits."""
+        if self._save_at_exit is not None:
+            atexit.unregister(self._save_at_exit)
+            self._save_at_exit = None
+            self.save_state()
 
     def restore_quota(self, action):
         """Updates the quota for a given action, based on the elapsed time since the last request."""
@@ -243,8 +182,15 @@ class Throttler:
 
         elapsed = time() - last_request
         restored = elapsed // restore_rate
+        if restored <= 0:
+            return      # Also covers last_request being in the future, e.g. when restored from another host's state
+
+        # Advance last_request by the time 'spent' on restored requests, so that calling restore_quota() more
+        # than once doesn't count the same elapsed time twice
+        if quota_level:
+            usage['last_request'] = last_request + min(restored, quota_level) * restore_rate
 
-        self._usage[action]['quota_level'] = max(quota_level - restored, 0)
+        usage['quota_level'] = max(quota_level - restored, 0)
 
     def calculate_wait(self, action):
         """Return how long to wait, in seconds, before a given action can be performed."""
@@ -260,37 +206,280 @@ class Throttler:
         elapsed = time() - last_request
         return (quota_level + 1 - quota_max) * restore_rate - elapsed
 
-    def add_to_quota(self, action):
-        """Updates the usage information for the given action."""
+    def add_to_quota(self, action, consumer=None):
+        """Updates the usage information for the given action, and counts the request against consumer's hourly
+        budget."""
         if action not in self.limits:
             return
 
-        action_usage = self._usage.get(action, {})
-        action_usage.update(
-            quota_level=action_usage.get('quota_level', 0) + 1,
-            last_request=time()
-        )
-        self._usage[action] = action_usage
+        with self._state_lock:
+            action_usage = self._usage.setdefault(action, {'quota_level': 0})
+            action_usage.update(
+                quota_level=action_usage['quota_level'] + 1,
+                last_request=time()
+            )
+
+        budget = self.budget(action)
+        if budget is not None:
+            budget.record(consumer, action_usage['last_request'])
+
+    def register_consumer(self, consumer, weight=1):
+        """Give consumer (any hashable name, passed to api_call() as consumer) a share of each action's hourly_max
+        in proportion to weight, which must be positive. Consumers that aren't registered have a weight of 1."""
+        if weight <= 0:
+            raise ValueError(f'Consumer weights must be positive, got {weight}.')
+
+        self.weights[consumer] = weight
+
+    def budget(self, action):
+        """Return the HourlyBudget for action, or None if it doesn't have an hourly_max."""
+        budget = self._budgets.get(action)
+        if budget is None:
+            hourly_max = self.limits.get(action, {}).get('hourly_max')
+            if hourly_max is None:
+                return None
+
+            with self._state_lock:
+                budget = self._budgets.setdefault(action, HourlyBudget(hourly_max, self.weights))
+
+        return budget
+
+    def budget_wait(self, action, consumer=None):
+        """Return how long consumer must wait, in seconds, before action fits within its hourly budget."""
+        budget = self.budget(action)
+        return 0 if budget is None else budget.wait(consumer, time())
+
+    def api_call(self, action, timeout=None, deadline=None, cancel=None, consumer=None, **kwargs):
+        """Forwards an API call to the API object (if provided), sleep()ing as necessary. Safe to call from
+        multiple threads: each action's quota is checked and updated under its own lock, but the request itself is
+        made outside of it.
 
-    def api_call(self, action, **kwargs):
-        """Forwards an API call to the API object (if provided), sleep()ing as necessary."""
+        timeout (in seconds) or deadline (an absolute time.time() value) limit how long the call may take. If the
+        throttler would have to wait past the deadline, DeadlineExceeded is raised right away instead of sleeping;
+        otherwise, the time remaining is passed on to the API as timeout. cancel is an optional CancelToken: if it is
+        cancelled while the call is waiting, Cancelled is raised. It is also passed on to the API, which checks it
+        before making the request.
+
+        Actions with an hourly_max are also kept within it, and consumer (see register_consumer()) identifies the
+        job making the call, so that the hourly budget can be shared fairly between jobs."""
         cached_value = self.cache_lookup(action, **kwargs)
         if cached_value is not None:
-            return cached_value
+            return self._decode_cached(cached_value)
+
+        if timeout is not None:
+            deadline = time() + timeout if deadline is None else min(deadline, time() + timeout)
+
+        if self.breaker is not None:
+            self.breaker.check()
+
+        lock = self._locks.setdefault(action, Lock())
+        while True:
+            # Wait for the hourly budget without holding the lock, since that can take a long time, and other
+            # consumers may still have budget left
+            self._sleep(self.budget_wait(action, consumer), action, deadline, cancel)
+            self._acquire(lock, action, deadline, cancel)
+
+            try:
+                # Another call may have used up the budget in the meantime; if so, release the lock and wait again
+                if self.budget_wait(action, consumer) > 0:
+                    continue
 
-        self.restore_quota(action)
-        sleep(self.calculate_wait(action))
-        self.restore_quota(action)
-        self.add_to_quota(action)
+                self.restore_quota(action)
+                self._sleep(self.calculate_wait(action), action, deadline, cancel)
+
+                self.restore_quota(action)
+                self.add_to_quota(action, consumer)
+                self._autosave()
+                break
+            finally:
+                lock.release()
 
         if self.api is not None:
+            if deadline is not None:
+                kwargs['timeout'] = deadline - time()
+            if cancel is not None:
+                kwargs['cancel'] = cancel
+
+            if self.breaker is not None:
+                return self.breaker.run(getattr(self.api, action), **kwargs)
+
             return getattr(self.api, action)(**kwargs)
 
+    @staticmethod
+    def _sleep(wait, action, deadline, cancel):
+        """Sleep for wait seconds (if positive), raising DeadlineExceeded right away if that would pass the deadline,
+        or Cancelled if cancel is cancelled in the meantime."""
+        wait = max(wait, 0)
+        if deadline is not None and time() + wait >= deadline:
+            raise DeadlineExceeded(f'{action} would have to wait {wait:.1f}s, which is past its deadline.')
+
+        if cancel is not None:
+            cancel.sleep(wait)
+        elif wait > 0:
+            sleep(wait)
+
+    @staticmethod
+    def _acquire(lock, action, deadline, cancel, interval=0.1):
+        """Acquire an action's lock, giving up when the deadline passes or cancel is cancelled."""
+        while True:
+            if cancel is not None:
+                cancel.check()
+
+            if deadline is None:
+                wait = interval if cancel is not None else -1
+            else:
+                wait = deadline - time()
+                if wait <= 0:
+                    raise DeadlineExceeded(f'Timed out waiting for other {action} calls.')
+                wait = min(wait, interval) if cancel is not None else wait
+
+            if lock.acquire(timeout=wait):
+                return
+
+    def fan_out(self, action, markets, market_param='MarketplaceId', max_workers=None, **kwargs):
+        """Call action once for each marketplace in markets, concurrently. Returns a dict of results keyed by
+        marketplace. See iter_fan_out() for details."""
+        return dict(self.iter_fan_out(action, markets, market_param, max_workers, **kwargs))
+
+    def iter_fan_out(self, action, markets, market_param='MarketplaceId', max_workers=None, **kwargs):
+        """Call action once for each marketplace in markets, concurrently, and yield (market, result) tuples in
+        the order they complete. Markets can be given as country codes (see MARKETID) or as marketplace IDs; the
+        ID is passed to the API as market_param. All of the calls draw from the same quota, since Amazon shares
+        quotas between the marketplaces of a region."""
+        from concurrent.futures import ThreadPoolExecutor, as_completed
+
+        markets = list(markets)
+        if not markets:
+            return
+
+        with ThreadPoolExecutor(max_workers=max_workers or len(markets)) as executor:
+            futures = {
+                executor.submit(self.api_call, action, **{market_param: MARKETID.get(market, market)}, **kwargs): market
+                for market in markets
+            }
+
+            for future in as_completed(futures):
+                yield futures[future], future.result()
+
+    def call_batched(self, action, param, values, **kwargs):
+        """Call action once for each batch of values, passing the batch as param. Batches are as large as the
+        operation catalog allows for param, so a long list of ids costs as few requests (and as little quota) as
+        possible. Returns a list of results, one per batch."""
+        section = self.api.SECTION if isinstance(self.api, AmzCall) else None
+        operation = find_operation(section, action)
+        return [self.api_call(action, **{param: batch}, **kwargs) for batch in batches(operation, param, values)]
+
     def __getattr__(self, name):
-        """Shortcut for calling api_call() directly."""
-        return partial(self.api_call, name)
+        """Shortcut for calling api_call() directly. The shortcut is stored on the instance, so this only runs the
+        first time an action is used. If the API object is a section with an operation catalog, unknown actions
+        raise AttributeError."""
+        if name.startswith('_'):
+            raise AttributeError(name)
+
+        api = self.__dict__.get('api')
+        if isinstance(api, AmzCall) and api.SECTION is not None and find_operation(api.SECTION, name) is None:
+            raise AttributeError(f'{type(api).__name__} has no operation named {name}.')
+
+        method = partial(self.api_call, name)
+        self.__dict__[name] = method
+        return method
 
     def cache_lookup(self, name, **kwargs):
         """Called prior to making an API call. If this function returns anything other than None,
-        it will be used as the return value for api_call()."""
+        it will be used as the return value for api_call(). Calls whose parameters can't be made into a cache key
+        are never cached."""
+        if self.cache is not None:
+            try:
+                key = cache_key(name, **kwargs)
+            except TypeError:
+                return None
+
+            return self.cache.get(key)
+
         return None
+
+    def _decode_cached(self, value):
+        """Return a cached response decoded the way the API object decodes the responses it returns (see
+        AmzCall's decoder), so that callers get the same type from the cache as from a request."""
+        decoder = self.api.decoder if isinstance(self.api, AmzCall) else None
+        return value if decoder is None else decoder(value)
+
+    def snapshot(self):
+        """Return a compact, JSON-serializable copy of the current usage information, including the requests
+        counted against each hourly budget. Limits that differ from DEFAULT_LIMITS are included as well, so that
+        adjusted limits survive a restart. Safe to call while other threads are making calls."""
+        with self._state_lock:
+            all_usage, all_limits = list(self._usage.items()), list(self.limits.items())
+            budgets = list(self._budgets.items())
+
+        usage = {
+            action: [u['quota_level'], round(u['last_request'], 3)]
+            for action, u in all_usage
+        }
+
+        limits = {
+            action: [l['quota_max'], l['restore_rate'], l.get('hourly_max')]
+            for action, l in all_limits if DEFAULT_LIMITS.get(action) != l
+        }
+
+        return {
+            'version': STATE_VERSION,
+            'saved_at': round(time(), 3),
+            'usage': usage,
+            'limits': limits,
+            'budgets': {action: budget.snapshot() for action, budget in budgets}
+        }
+
+    def restore(self, snapshot):
+        """Restore usage information from a snapshot produced by snapshot(). Quota levels are restored based on
+        the time that has passed since they were saved, and hourly budgets count the requests made within the last
+        hour."""
+        if snapshot.get('version') != STATE_VERSION:
+            raise ValueError(f'Unsupported throttler state version: {snapshot.get("version")}')
+
+        for action, (quota_max, restore_rate, hourly_max) in snapshot.get('limits', {}).items():
+            limits = {'quota_max': quota_max, 'restore_rate': restore_rate}
+            if hourly_max is not None:
+                limits['hourly_max'] = hourly_max
+            with self._state_lock:
+                self.limits[action] = limits
+
+        for action, (quota_level, last_request) in snapshot.get('usage', {}).items():
+            with self._state_lock:
+                self._usage[action] = {'quota_level': quota_level, 'last_request': last_request}
+            self.restore_quota(action)
+
+        for action, budget_snapshot in snapshot.get('budgets', {}).items():
+            budget = self.budget(action)
+            if budget is not None:
+                budget.restore(budget_snapshot)
+
+    def save_state(self, path=None):
+        """Write a snapshot of the current usage to path (default: self.state_file). The file is replaced
+        atomically, so a crash during the write never leaves a corrupt state file behind."""
+        path = path or self.state_file
+        if path is None:
+            raise ValueError('No path given and state_file is not set.')
+
+        with atomic_write(path) as file:
+            json.dump(self.snapshot(), file, separators=(',', ':'))
+
+        self._last_save = time()
+
+    def load_state(self, path=None):
+        """Restore usage information from path (default: self.state_file). Returns True if the state was loaded,
+        or False if the file does not exist or can't be read (including when it was saved by a different version)."""
+        path = path or self.state_file
+        try:
+            with open(path) as file:
+                snapshot = json.load(file)
+            self.restore(snapshot)
+        except (OSError, ValueError, TypeError, AttributeError):
+            return False
+
+        return True
+
+    def _autosave(self):
+        """Save the current state if a state file is set and save_interval seconds have passed."""
+        if self.state_file is not None and time() - self._last_save >= self.save_interval:
+            self.save_state()
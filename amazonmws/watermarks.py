@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+
+"""
+:mod:`watermarks` -- Persistent sync positions
+----------------------------------------------
+
+.. module:: watermarks
+
+Contains WatermarkStore, which remembers how far an incremental sync has gotten, and atomic_write(), which the
+modules that persist state to disk use to replace their files.
+"""
+
+
+import json
+import os
+import tempfile
+
+from contextlib import contextmanager
+
+
+@contextmanager
+def atomic_write(path, mode='w'):
+    """Open a temporary file in path's directory for writing, and replace path with it when the block ends (or
+    remove it, if the block raises). The temporary file's name is unique, so processes writing the same path don't
+    write over each other's."""
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(path)), suffix='.tmp')
+    try:
+        with os.fdopen(fd, mode) as file:
+            yield file
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+class WatermarkStore:
+    """A small JSON-backed dict of watermarks. Every call to set() writes the file (atomically), so a sync that is
+    interrupted resumes from the last watermark it reached. If path is None, watermarks are kept in memory only."""
+
+    def __init__(self, path=None):
+        """Initialize the WatermarkStore object."""
+        self.path = path
+        self._marks = {}
+
+        if path is not None:
+            try:
+                with open(path) as file:
+                    self._marks = json.load(file)
+            except (OSError, ValueError):
+                pass
+
+    def get(self, key, default=None):
+        """Return the watermark for key, or default."""
+        return self._marks.get(key, default)
+
+    def set(self, key, value):
+        """Set the watermark for key, and save the store. value must be JSON-serializable."""
+        self._marks[key] = value
+
+        if self.path is not None:
+            with atomic_write(self.path) as file:
+                json.dump(self._marks, file, separators=(',', ':'))
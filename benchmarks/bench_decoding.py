@@ -0,0 +1,56 @@
+"""Measure how long the event loop is blocked while decoding large responses, with and without a process pool.
+
+Usage: python benchmarks/bench_decoding.py [number of responses] [products per response]
+"""
+
+import asyncio
+import sys
+from time import perf_counter
+
+from amazonmws.decoding import ResponseDecoder
+
+
+def response(products):
+    product = '<Product><ASIN>B000000000</ASIN><Title>A product with a reasonably long title</Title>' \
+              '<Price><Amount>12.34</Amount><Currency>USD</Currency></Price></Product>'
+    return (f'<GetMatchingProductForIdResponse><GetMatchingProductForIdResult><Products>{product * products}'
+            f'</Products></GetMatchingProductForIdResult></GetMatchingProductForIdResponse>').encode()
+
+
+async def run(decoder, responses):
+    """Decode responses concurrently, returning (elapsed time, longest gap between event loop ticks)."""
+    longest = 0
+    done = False
+
+    async def ticker():
+        nonlocal longest
+        last = perf_counter()
+        while not done:
+            await asyncio.sleep(0.001)
+            now = perf_counter()
+            longest = max(longest, now - last)
+            last = now
+
+    task = asyncio.create_task(ticker())
+    start = perf_counter()
+    await asyncio.gather(*(decoder.decode_async(body) for body in responses))
+    elapsed = perf_counter() - start
+    done = True
+    await task
+
+    return elapsed, longest
+
+
+def main(count=20, products=5000):
+    responses = [response(products)] * count
+    print(f'{count} responses of {len(responses[0]) / 1024:.0f} KiB')
+
+    for label, threshold in (('inline', len(responses[0]) + 1), ('process pool', 0)):
+        with ResponseDecoder(threshold=threshold) as decoder:
+            decoder(responses[0])   # Start the pool
+            elapsed, longest = asyncio.run(run(decoder, responses))
+        print(f'{label:14} {elapsed:.3f}s total, event loop blocked for up to {longest * 1000:.1f}ms')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,51 @@
+"""Measure how long `import amazonmws` takes, using python -X importtime in fresh interpreters, and compare the median
+against a budget. For comparison, also measures importing every submodule, which is what the package did before
+imports were made lazy. Exits with status 1 if the package import is over budget.
+
+Usage: python benchmarks/bench_import.py [budget in ms] [number of runs]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+
+#: The budget for `import amazonmws`, in milliseconds. The package itself takes a few ms; importing all of its
+#: submodules takes several times as long.
+BUDGET = 20
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def import_time(code):
+    """Run code in a fresh interpreter with -X importtime, and return the time spent importing amazonmws and its
+    submodules, in ms."""
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], cwd=ROOT, capture_output=True,
+                            text=True, check=True)
+
+    # Lines look like 'import time:  self [us] | cumulative | imported package'; nested imports are indented, and
+    # are already included in the cumulative time of the top-level import they belong to
+    total = 0
+    for line in result.stderr.splitlines():
+        fields = line.split('|')
+        if len(fields) == 3 and fields[2].startswith(' amazonmws'):
+            total += int(fields[1])
+
+    return total / 1000
+
+
+def main(budget=BUDGET, runs=15):
+    lazy = [import_time('import amazonmws') for _ in range(runs)]
+    eager = [import_time('from amazonmws import *') for _ in range(3)]
+
+    median = statistics.median(lazy)
+    print(f'import amazonmws:        {median:5.1f}ms median of {runs} runs (budget: {budget}ms)')
+    print(f'from amazonmws import *: {statistics.median(eager):5.1f}ms')
+
+    if median > budget:
+        print('Over budget.')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
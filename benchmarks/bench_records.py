@@ -0,0 +1,55 @@
+"""Compare the memory used by orders decoded with element_to_dict() against OrderRecords, and the time taken to decode
+them. Times are the best of several runs without tracemalloc, which slows decoding down several times over.
+
+Usage: python benchmarks/bench_records.py [number of orders] [number of runs]
+"""
+
+import sys
+import tracemalloc
+from time import perf_counter
+
+from amazonmws.records import OrderRecord, iter_records
+from amazonmws.responses import element_to_dict, parse_xml, result_element
+
+
+def response(count):
+    orders = ''.join(
+        f'<Order><AmazonOrderId>902-{i:07d}-{i % 9973:07d}</AmazonOrderId><MarketplaceId>ATVPDKIKX0DER</MarketplaceId>'
+        f'<OrderStatus>Shipped</OrderStatus><FulfillmentChannel>AFN</FulfillmentChannel>'
+        f'<PurchaseDate>2017-10-09T20:59:18Z</PurchaseDate><LastUpdateDate>2017-10-10T08:00:00Z</LastUpdateDate>'
+        f'<OrderTotal><CurrencyCode>USD</CurrencyCode><Amount>{i % 100}.99</Amount></OrderTotal>'
+        f'<NumberOfItemsShipped>1</NumberOfItemsShipped><NumberOfItemsUnshipped>0</NumberOfItemsUnshipped></Order>'
+        for i in range(count)
+    )
+    return f'<ListOrdersResponse><ListOrdersResult><Orders>{orders}</Orders></ListOrdersResult></ListOrdersResponse>'
+
+
+def measure(label, decode, result, count, runs):
+    tracemalloc.start()
+    decoded = decode(result)
+    size, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del decoded
+
+    elapsed = []
+    for _ in range(runs):
+        start = perf_counter()
+        decode(result)
+        elapsed.append(perf_counter() - start)
+
+    print(f'{label:16} {size / count:6.0f} bytes/order, {size / 2 ** 20:7.1f} MiB, '
+          f'{min(elapsed) / count * 1e6:5.2f}us/order')
+
+
+def main(count=100000, runs=5):
+    result = result_element(parse_xml(response(count)))
+    print(f'{count} orders, best of {runs} runs')
+
+    measure('element_to_dict', lambda result: [element_to_dict(e) for e in result.iterfind('Orders/Order')], result,
+            count, runs)
+    measure('OrderRecord', lambda result: list(iter_records(result.iterfind('Orders/Order'), OrderRecord)), result,
+            count, runs)
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
@@ -0,0 +1,52 @@
+"""Measure how quickly recorded responses can be replayed through an AmzCall object.
+
+Usage: python benchmarks/bench_replay.py [number of requests]
+"""
+
+import os
+import sys
+import tempfile
+from time import perf_counter
+
+import amazonmws as mws
+from amazonmws.replay import Recorder, Replayer, request_key
+
+
+def main(count=100000):
+    credentials = ('123456789', '123456789abcdefghijklmnopqrstuvwxyz', 'a1b2c3d4e5f6')
+    body = b'<GetMatchingProductForIdResponse>' + b'x' * 2000 + b'</GetMatchingProductForIdResponse>'
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'archive')
+
+        start = perf_counter()
+        with Recorder(path, lambda **kwargs: body) as recorder:
+            api = mws.Products(*credentials, make_request=recorder)
+            for i in range(count):
+                api.GetMatchingProductForId(IdType='UPC', IdList=[f'{i:012d}'])
+        recorded = perf_counter() - start
+
+        with Replayer(path) as replayer:
+            api = mws.Products(*credentials, make_request=replayer)
+            start = perf_counter()
+            for i in range(count):
+                api.GetMatchingProductForId(IdType='UPC', IdList=[f'{i:012d}'])
+            replayed = perf_counter() - start
+
+            keys = [request_key('POST', api.build_request_url('POST', 'GetMatchingProductForId', IdType='UPC',
+                                                                IdList=[f'{i:012d}'])) for i in range(count)]
+            start = perf_counter()
+            for key in keys:
+                replayer.lookup(key)
+            looked_up = perf_counter() - start
+
+        size = os.path.getsize(path) + os.path.getsize(f'{path}.idx')
+
+    print(f'{count} requests, {size / 2 ** 20:.1f} MiB archive')
+    print(f'record:  {recorded:.3f}s ({count / recorded:,.0f} calls/s)')
+    print(f'replay:  {replayed:.3f}s ({count / replayed:,.0f} calls/s)')
+    print(f'lookup:  {looked_up:.3f}s ({count / looked_up:,.0f} lookups/s)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
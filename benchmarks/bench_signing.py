@@ -0,0 +1,39 @@
+"""Compare signing URLs one at a time with AmzCall.build_request_url() against AmzCall.build_request_urls().
+
+Usage: python benchmarks/bench_signing.py [number of requests]
+"""
+
+import sys
+from time import perf_counter
+
+import amazonmws as mws
+
+
+def main(count=10000):
+    api = mws.Products('123456789', '123456789abcdefghijklmnopqrstuvwxyz', 'a1b2c3d4e5f6')
+    requests = [
+        ('GetMatchingProductForId', {'MarketplaceId': 'ATVPDKIKX0DER', 'IdType': 'UPC', 'IdList.Id.1': f'{i:012d}'})
+        for i in range(count)
+    ]
+
+    start = perf_counter()
+    for action, params in requests:
+        api.build_request_url('POST', action, **params)
+    per_call = perf_counter() - start
+
+    start = perf_counter()
+    api.build_request_urls(requests)
+    bulk = perf_counter() - start
+
+    start = perf_counter()
+    api.build_request_urls(requests, processes=4)
+    pooled = perf_counter() - start
+
+    print(f'{count} requests')
+    print(f'build_request_url (per call):   {per_call:.3f}s')
+    print(f'build_request_urls:             {bulk:.3f}s ({per_call / bulk:.1f}x)')
+    print(f'build_request_urls (4 procs):   {pooled:.3f}s ({per_call / pooled:.1f}x)')
+
+
+if __name__ == '__main__':
+    main(*(int(arg) for arg in sys.argv[1:]))
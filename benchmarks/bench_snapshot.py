@@ -0,0 +1,55 @@
+"""Measure building a catalog snapshot with one worker and with several, against a fake Products API with a fixed
+latency, then how quickly the written index answers lookups.
+
+Usage: python benchmarks/bench_snapshot.py [number of ASINs] [latency in ms]
+"""
+
+import os
+import sys
+import tempfile
+from time import perf_counter, sleep
+
+from amazonmws.snapshot import SnapshotBuilder, SnapshotIndex
+
+
+class FakeProducts:
+    """Returns a three-level category chain for each ASIN; there are 50 leaf categories under 10 parents."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def GetProductCategoriesForASIN(self, MarketplaceId, ASIN):
+        sleep(self.latency)
+        leaf = int(ASIN[1:]) % 50
+        return f"""<GetProductCategoriesForASINResponse><GetProductCategoriesForASINResult><Self>
+            <ProductCategoryId>{leaf}</ProductCategoryId><ProductCategoryName>Leaf {leaf}</ProductCategoryName>
+            <Parent><ProductCategoryId>p{leaf % 10}</ProductCategoryId><ProductCategoryName>Parent {leaf % 10}
+            </ProductCategoryName><Parent><ProductCategoryId>root</ProductCategoryId><ProductCategoryName>Root
+            </ProductCategoryName></Parent></Parent></Self>
+            </GetProductCategoriesForASINResult></GetProductCategoriesForASINResponse>"""
+
+
+def main(count=2000, latency=5):
+    asins = [f'B{i:09d}' for i in range(count)]
+    products = FakeProducts(latency / 1000)
+
+    for workers in (1, 8):
+        start = perf_counter()
+        snapshot = SnapshotBuilder(products, max_workers=workers).build(asins)
+        print(f'{workers} worker(s): {perf_counter() - start:.2f}s for {count} ASINs, {len(snapshot.graph)} categories')
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'snapshot')
+        snapshot.write(path)
+        print(f'Index: {os.path.getsize(path)} bytes')
+
+        with SnapshotIndex(path) as index:
+            start = perf_counter()
+            for asin in asins:
+                index.categories(asin)
+            elapsed = perf_counter() - start
+            print(f'Lookups: {elapsed / count * 1e6:.1f}us per ASIN')
+
+
+if __name__ == '__main__':
+    main(*map(int, sys.argv[1:]))
@@ -14,6 +14,7 @@ setup(name='amazonmws',
       author='Garrett Myrick',
       license='MIT',
       packages=['amazonmws'],
+      package_data={'amazonmws': ['operations.json']},
       install_requires=[
             'hmac',
             'urllib',
@@ -0,0 +1,20 @@
+"""Helpers shared by the test modules."""
+
+
+ERROR_RESPONSE = """<?xml version="1.0"?>
+<ErrorResponse xmlns="https://mws.amazonservices.com/Orders/2013-09-01">
+  <Error>
+    <Type>Sender</Type>
+    <Code>RequestThrottled</Code>
+    <Message>Request is throttled</Message>
+  </Error>
+</ErrorResponse>"""
+
+
+def page(action, content, next_token=None):
+    """Build a fake response for action."""
+    token = f'<NextToken>{next_token}</NextToken>' if next_token else ''
+    return f"""<?xml version="1.0"?>
+<{action}Response xmlns="https://mws.amazonservices.com/Orders/2013-09-01">
+  <{action}Result>{token}{content}</{action}Result>
+</{action}Response>"""
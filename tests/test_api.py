@@ -2,6 +2,7 @@ import re
 import pytest
 import unittest.mock as mock
 from amazonmws.api import *
+from amazonmws.throttler import CancelToken, Cancelled
 
 
 TEST_CREDENTIALS = {
@@ -10,6 +11,12 @@ TEST_CREDENTIALS = {
     'seller_id': 'a1b2c3d4e5f6'
 }
 
+PA_CREDENTIALS = {
+    'access_key': TEST_CREDENTIALS['access_key'],
+    'secret_key': TEST_CREDENTIALS['secret_key'],
+    'account_id': TEST_CREDENTIALS['seller_id']
+}
+
 
 @pytest.fixture()
 def amzcall_object():
@@ -202,3 +209,272 @@ def test_getattr(amzcall_object):
     amzcall_object.DoSomething()
 
     amzcall_object._do_api_call.assert_called_with('DoSomething')
+
+
+@pytest.mark.parametrize('processes', [None, 2])
+@mock.patch('amazonmws.api.gmtime')
+def test_build_request_urls(mock_gmtime, processes):
+    """Test that build_request_urls() produces the same URLs as build_request_url()."""
+    mock_gmtime.return_value = (2017, 12, 11, 6, 44, 20, 0, 345, 0)
+    api = Products(**TEST_CREDENTIALS, auth_token='test_token')
+
+    requests = [
+        ('ListMatchingProducts', {'MarketplaceId': 'ATVPDKIKX0DER', 'Query': f'look for {i}'}) for i in range(5)
+    ]
+    requests.append(('GetServiceStatus', {'Query': None}))
+
+    urls = api.build_request_urls(requests, processes=processes, chunk_size=2)
+
+    assert urls == [api.build_request_url('POST', action, **params) for action, params in requests]
+
+
+def test_structured_list():
+    """Test that structured_list() results behave like the equivalent dict."""
+    items = [{'SellerSKU': 'sku1', 'Quantity': 1}, {'SellerSKU': 'sku2', 'Quantity': 2}]
+    expected = {
+        'Items.member.1.SellerSKU': 'sku1',
+        'Items.member.1.Quantity': 1,
+        'Items.member.2.SellerSKU': 'sku2',
+        'Items.member.2.Quantity': 2
+    }
+
+    result = structured_list('Items', 'member', items)
+
+    assert result == expected
+    assert dict(**result) == expected
+    assert len(result) == 4
+    assert 'Items.member.3.SellerSKU' not in result
+    assert 'Items.member.1' not in result
+
+
+def test_encode_params():
+    """Test that encode_params() expands lists and ParamLists, drops None values, and sorts keys."""
+    params = {
+        'Query': 'a b',
+        'Skip': None,
+        'ASINList': ['B1', 'B2'],
+        'items': structured_list('Items', 'member', [{'SellerSKU': 'é'}])
+    }
+
+    result = encode_params(params, quoted={'Version': '1', 'Skip': 'x'})
+
+    assert result == 'ASINList.ASIN.1=B1&ASINList.ASIN.2=B2&Items.member.1.SellerSKU=%C3%A9&Query=a%20b&Version=1'
+
+
+def test_product_advertising_get():
+    """Test that Product Advertising requests are signed and sent using GET."""
+    make_request = mock.Mock()
+    api = ProductAdvertising(**PA_CREDENTIALS, make_request=make_request)
+
+    api.ItemLookup(ItemId='B0000001')
+
+    kwargs = make_request.call_args[1]
+    assert kwargs['method'] == 'GET'
+    assert kwargs['url'].startswith('https://webservices.amazon.com/onca/xml?')
+    assert 'AssociateTag=a1b2c3d4e5f6' in kwargs['url']
+    assert 'Operation=ItemLookup' in kwargs['url']
+    assert 'Service=AWSECommerceService' in kwargs['url']
+
+
+@mock.patch('amazonmws.api.gmtime')
+def test_product_advertising_build_request_urls(mock_gmtime):
+    """Test that bulk-signed Product Advertising URLs include Service, and match the ones signed one at a time."""
+    mock_gmtime.return_value = (2017, 12, 11, 6, 44, 20, 0, 345, 0)
+    api = ProductAdvertising(**PA_CREDENTIALS)
+    requests = [('ItemLookup', {'ItemId': f'B{i:09d}'}) for i in range(3)]
+
+    urls = api.build_request_urls(requests)
+
+    assert urls == [api.build_request_url('GET', action, **params) for action, params in requests]
+    assert urls == [api.sign_request(action, **params).url for action, params in requests]
+    assert all('Service=AWSECommerceService' in url for url in urls)
+
+
+def test_product_advertising_item_lookup():
+    """Test that item_lookup() requests item ids in batches of 10."""
+    api = ProductAdvertising(**PA_CREDENTIALS)
+    api._do_api_call = mock.Mock(side_effect=lambda operation, **kwargs: kwargs['ItemId'])
+    item_ids = [f'B{i:09d}' for i in range(25)]
+
+    results = api.item_lookup(item_ids)
+
+    assert results == [','.join(item_ids[:10]), ','.join(item_ids[10:20]), ','.join(item_ids[20:])]
+
+
+@pytest.mark.parametrize('is_async', [True, False])
+def test_product_advertising_item_lookup_async(is_async):
+    """Test item_lookup_async() with synchronous and asynchronous make_request functions."""
+    import asyncio
+
+    def make_request(method, url, headers):
+        return re.search(r'ItemId=([^&]*)', url)[1]
+
+    async def make_request_async(method, url, headers):
+        return make_request(method, url, headers)
+
+    pacing = mock.Mock(wait_async=mock.AsyncMock())
+    api = ProductAdvertising(**PA_CREDENTIALS, pacing=pacing)
+    api.make_request = make_request_async if is_async else make_request
+    item_ids = [f'B{i:09d}' for i in range(15)]
+
+    results = asyncio.run(api.item_lookup_async(item_ids))
+
+    assert results == ['%2C'.join(item_ids[:10]), '%2C'.join(item_ids[10:])]
+    assert pacing.wait_async.await_count == 2
+
+
+def test_do_api_call_transport_options():
+    """Test that timeout is passed to make_request, and cancelled calls aren't made."""
+    make_request = mock.Mock()
+    api = Products(**TEST_CREDENTIALS, make_request=make_request)
+    token = CancelToken()
+
+    api.GetServiceStatus(timeout=5, cancel=token)
+    assert make_request.call_args[1]['timeout'] == 5
+    assert 'cancel' not in make_request.call_args[1]['url']
+
+    token.cancel()
+    with pytest.raises(Cancelled):
+        api.GetServiceStatus(cancel=token)
+    assert make_request.call_count == 1
+
+
+def test_operation_methods():
+    """Test that operations become methods of the section's class the first time they are used."""
+    api = Orders(**TEST_CREDENTIALS)
+    api._do_api_call = mock.Mock()
+
+    api.ListOrders(CreatedAfter='2017-01-01')
+
+    api._do_api_call.assert_called_with('ListOrders', CreatedAfter='2017-01-01')
+    assert 'ListOrders' in vars(Orders)
+    assert 'GetOrder' in dir(api)
+
+
+def test_unknown_operation():
+    """Test that operations that aren't in the section's catalog raise AttributeError."""
+    api = Orders(**TEST_CREDENTIALS)
+
+    with pytest.raises(AttributeError):
+        api.ListMatchingProducts()
+
+    assert not hasattr(api, '_private')
+
+
+def test_catalog_list_params(amzcall_object):
+    """Test that list parameters are labelled using the catalog, and that its limits are enforced."""
+    api = Orders(**TEST_CREDENTIALS)
+
+    params = api.build_request_params('ListOrders', OrderStatus=['Shipped', 'Pending'], MarketplaceId=['A', 'B'])
+    assert 'OrderStatus.Status.1=Shipped&OrderStatus.Status.2=Pending' in params
+    assert 'MarketplaceId.Id.1=A&MarketplaceId.Id.2=B' in params
+    assert 'Version=2013-09-01' in params
+
+    with pytest.raises(ValueError):
+        api.build_request_params('GetOrder', AmazonOrderId=[str(i) for i in range(51)])
+
+    # Without a catalog, the enumerate_param() heuristic is used
+    assert 'OrderStatus.OrderStatus.1=Shipped' in amzcall_object.build_request_params('ListOrders', OrderStatus=['Shipped'])
+
+
+def test_catalog_section_attributes():
+    """Test that URI, VERSION and METHOD come from the catalog."""
+    assert Sellers.URI == '/Sellers/2011-07-01'
+    assert Orders.VERSION == '2013-09-01'
+    assert Orders.METHOD == 'POST'
+    assert ProductAdvertising.METHOD == 'GET'
+    assert AmzCall.URI == '/'
+
+
+def test_call_batched():
+    """Test that call_batched() splits values into batches the catalog allows."""
+    api = Products(**TEST_CREDENTIALS)
+    api._do_api_call = mock.Mock(side_effect=lambda operation, **kwargs: kwargs['ASINList'])
+    asins = [f'B{i:09d}' for i in range(25)]
+
+    results = api.call_batched('GetMatchingProduct', 'ASINList', asins, MarketplaceId='X')
+
+    assert results == [asins[:10], asins[10:20], asins[20:]]
+    api._do_api_call.assert_called_with('GetMatchingProduct', ASINList=asins[20:], MarketplaceId='X')
+
+
+def test_product_advertising_item_lookup_async_decoder():
+    """Test that item_lookup_async() decodes responses with the given decoder."""
+    import asyncio
+    from amazonmws.decoding import ResponseDecoder
+
+    api = ProductAdvertising(**PA_CREDENTIALS)
+    api.make_request = lambda method, url, headers: '<ItemLookupResponse><Items><Item>1</Item></Items></ItemLookupResponse>'
+
+    with ResponseDecoder() as decoder:
+        results = asyncio.run(api.item_lookup_async(['B0000001'], decoder=decoder))
+
+    assert results == [{'Items': {'Item': '1'}}]
+
+
+def test_product_advertising_item_lookup_async_plain_decoder():
+    """Test that item_lookup_async() accepts any function as the API object's decoder."""
+    import asyncio
+
+    api = ProductAdvertising(**PA_CREDENTIALS, decoder=lambda response: response.upper())
+    api.make_request = lambda method, url, headers: 'item'
+
+    results = asyncio.run(api.item_lookup_async([f'B{i:09d}' for i in range(15)]))
+
+    assert results == ['ITEM', 'ITEM']
+
+
+def test_timestamp_cached():
+    """Test that timestamps are only formatted once per second."""
+    from amazonmws import api as api_module
+
+    with mock.patch('amazonmws.api.gmtime', return_value=(2031, 1, 2, 3, 4, 5, 0, 2, 0)), \
+            mock.patch('amazonmws.api.strftime', wraps=strftime) as mock_strftime:
+        assert api_module._timestamp(0) == '2031-01-02T03:04:05Z'
+        assert api_module._timestamp(0) == '2031-01-02T03:04:05Z'
+
+    assert mock_strftime.call_count == 1
+
+
+def test_server_clock():
+    """Test that ServerClock estimates the offset from Date headers, ignoring differences under a second."""
+    clock = ServerClock()
+    received = 1500000000   # Fri, 14 Jul 2017 02:40:00 GMT
+
+    assert clock.observe('Fri, 14 Jul 2017 02:40:00 GMT', received) == 0
+    assert clock.observe('Fri, 14 Jul 2017 02:45:00 GMT', received) == 300.5
+    assert clock.observe('Fri, 14 Jul 2017 02:45:00 GMT', received + 0.8) == 300.5
+
+    assert clock.observe_response(mock.Mock(headers={'Date': 'Fri, 14 Jul 2017 02:40:00 GMT'})) != 300.5
+    assert ServerClock(5).observe_response(mock.Mock(headers=None)) == 5
+    assert ServerClock(5).observe_response(mock.Mock(headers={'Date': 'garbage'})) == 5
+
+
+@mock.patch('amazonmws.api.time', return_value=1500000000)
+def test_clock_timestamps(mock_time):
+    """Test that request timestamps are taken from the API object's clock."""
+    api = Products(**TEST_CREDENTIALS, clock=ServerClock(offset=3600))
+
+    assert 'Timestamp=2017-07-14T03%3A40%3A00Z' in api.build_request_params('GetServiceStatus')
+    assert 'Timestamp=2017-07-14T03%3A40%3A00Z' in api.build_request_urls([('GetServiceStatus', {})])[0]
+
+
+def test_signed_request_reuse():
+    """Test that signed requests are resent as they are, until they expire."""
+    make_request = mock.Mock(return_value=mock.Mock(headers={}))
+    clock = ServerClock()
+    api = Products(**TEST_CREDENTIALS, make_request=make_request, clock=clock)
+
+    request = api.sign_request('GetMatchingProductForId', IdType='ASIN', IdList=['B1'], body='data')
+    api.send(request)
+    api.send(request, timeout=5)
+
+    first, second = make_request.call_args_list
+    assert first[1]['url'] == second[1]['url'] == request.url
+    assert second[1]['data'] == 'data' and second[1]['timeout'] == 5
+    assert 'Content-MD5' in request.headers
+
+    clock.offset = REQUEST_VALIDITY + 1
+    api.send(request)
+    assert make_request.call_args[1]['url'] != request.url
+    assert 'IdList.Id.1=B1' in make_request.call_args[1]['url']
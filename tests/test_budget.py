@@ -0,0 +1,123 @@
+import json
+import pytest
+from amazonmws.budget import *
+
+
+########################################################################################################################
+
+
+def test_counter_window():
+    """Test that HourlyCounter counts events over a rolling hour."""
+    counter = HourlyCounter()
+    counter.add(now=0)
+    counter.add(2, now=1800)
+
+    assert counter.total(now=3599) == 3
+    assert counter.total(now=3660) == 2         # The first minute has left the window
+    assert counter.total(now=1800 + 3660) == 0
+
+
+def test_counter_large_gap():
+    """Test that a gap longer than the window clears every bucket."""
+    counter = HourlyCounter()
+    for minute in range(60):
+        counter.add(now=minute * 60)
+
+    assert counter.total(now=3599) == 60
+    assert counter.total(now=100000) == 0
+    counter.add(now=100000)
+    assert counter.total(now=100001) == 1
+
+
+def test_counter_next_expiry():
+    """Test next_expiry()."""
+    counter = HourlyCounter()
+    assert counter.next_expiry(now=0) == 0
+
+    counter.add(now=90)
+    counter.add(now=1000)
+    assert counter.next_expiry(now=100) == 3720 - 100
+    assert counter.total(now=3720) == 1
+
+
+def test_counter_old_events():
+    """Test that events older than the window are ignored."""
+    counter = HourlyCounter()
+    counter.add(now=10000)
+    counter.add(now=0)
+
+    assert counter.total(now=10000) == 1
+
+
+def test_budget_shares():
+    """Test that the budget is divided between active consumers by weight."""
+    budget = HourlyBudget(90, weights={'reports': 2})
+    budget.wait('reports', now=0)
+    budget.wait('pricing', now=0)
+
+    assert budget.shares(now=1) == {'reports': 60, 'pricing': 30}
+    assert budget.shares(now=700) == {}
+
+
+def test_budget_fair_share():
+    """Test that a consumer can't use up the shares of other active consumers."""
+    budget = HourlyBudget(10)
+    budget.wait('b', now=0)
+
+    for i in range(5):
+        assert budget.wait('a', now=i) == 0
+        budget.record('a', now=i)
+
+    assert budget.wait('a', now=10) > 0
+    assert budget.wait('b', now=10) == 0
+
+
+def test_budget_reclaim():
+    """Test that unused shares can be used by other consumers."""
+    budget = HourlyBudget(10)
+    budget.wait('b', now=0)
+    budget.record('b', now=0)
+
+    for i in range(8):
+        budget.wait('b', now=i)         # Keep b active
+        budget.record('a', now=i)
+
+    # b has used 1 of its 5, and a has used 8: the one request left is set aside for b
+    assert budget.wait('a', now=10) > 0
+    # Once b goes idle, its share is reclaimed
+    assert budget.wait('a', now=700) == 0
+
+
+def test_budget_exhausted():
+    """Test waiting for the hour to roll over once the whole budget is used."""
+    budget = HourlyBudget(3)
+    for i in range(3):
+        budget.record(now=0)
+
+    assert budget.wait(now=30) == 3660 - 30
+    assert budget.wait(now=3660) == 0
+
+
+def test_budget_snapshot_restore():
+    """Test that a restored budget still counts the requests made within the last hour."""
+    budget = HourlyBudget(3)
+    budget.record('a', now=0)
+    budget.record('a', now=1800)
+    budget.wait('b', now=1800)
+
+    restored = HourlyBudget(3)
+    restored.restore(json.loads(json.dumps(budget.snapshot())))
+
+    assert restored.used.total(now=1800) == 2
+    assert restored._counter('a').total(now=1800) == 2
+    assert restored.used.total(now=3660) == 1           # The first request has left the window since
+    assert restored.wait('b', now=3660) == 0
+
+
+def test_counter_snapshot_empty():
+    """Test that an unused counter has an empty snapshot, and restoring one changes nothing."""
+    counter = HourlyCounter()
+    counter.restore(HourlyCounter().snapshot())
+
+    assert counter.snapshot() == []
+    assert counter.total(now=0) == 0
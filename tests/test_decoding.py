@@ -0,0 +1,69 @@
+import asyncio
+import pickle
+import pytest
+from amazonmws.api import Orders
+from amazonmws.decoding import *
+from amazonmws.responses import MWSError
+from amazonmws.throttler import Throttler
+from helpers import ERROR_RESPONSE, page
+
+
+RESPONSE = page('ListOrders', '<Orders><Order><Id>1</Id></Order><Order><Id>2</Id></Order></Orders>')
+
+
+@pytest.fixture(params=['inline', 'pool'])
+def decoder(request):
+    with ResponseDecoder(threshold=0 if request.param == 'pool' else 1 << 20, max_workers=1) as decoder:
+        yield decoder
+
+
+########################################################################################################################
+
+
+def test_decode_response():
+    """Test that decode_response() returns the response as a dict."""
+    assert decode_response(RESPONSE) == {'ListOrdersResult': {'Orders': {'Order': [{'Id': '1'}, {'Id': '2'}]}}}
+
+
+def test_decoder(decoder):
+    """Test decoding responses inline and in the process pool."""
+    assert decoder(RESPONSE) == decode_response(RESPONSE)
+    assert (decoder._executor is not None) == (decoder.threshold == 0)
+
+
+def test_decoder_error(decoder):
+    """Test that MWSErrors raised while decoding reach the caller intact."""
+    with pytest.raises(MWSError) as info:
+        decoder(ERROR_RESPONSE)
+
+    assert info.value.code == 'RequestThrottled'
+    assert pickle.loads(pickle.dumps(info.value)).error_type == 'Sender'
+
+
+def test_decoder_async(decoder):
+    """Test decode_async()."""
+    async def decode_all():
+        return await asyncio.gather(*(decoder.decode_async(RESPONSE) for i in range(3)))
+
+    assert asyncio.run(decode_all()) == [decode_response(RESPONSE)] * 3
+
+
+def test_decoder_close():
+    """Test that close() shuts the pool down, and the decoder can still be used afterwards."""
+    decoder = ResponseDecoder(threshold=0, max_workers=1)
+    decoder(RESPONSE)
+    decoder.close()
+
+    assert decoder._executor is None
+    assert decoder(RESPONSE) == decode_response(RESPONSE)
+    decoder.close()
+
+
+def test_api_decoder(decoder):
+    """Test that an API object with a decoder returns decoded responses, whether it's called directly or through a
+    Throttler."""
+    api = Orders('123456789', '123456789abcdefghijklmnopqrstuvwxyz', 'a1b2c3d4e5f6',
+                 make_request=lambda **kwargs: RESPONSE, decoder=decoder)
+
+    assert api.ListOrders(CreatedAfter='2017-01-01') == decode_response(RESPONSE)
+    assert Throttler(api).ListOrders(CreatedAfter='2017-01-01') == decode_response(RESPONSE)
@@ -0,0 +1,91 @@
+import pytest
+import unittest.mock as mock
+from amazonmws.api import Products, ParamList
+from amazonmws.fees import *
+from amazonmws.throttler import cache_key
+from helpers import page
+
+
+def fees_response(requests, fail=()):
+    """Build a GetMyFeesEstimate response charging 1.00 plus 15% of the price, for a list of request dicts."""
+    results = []
+    for request in requests:
+        cents = round(float(request['PriceToEstimateFees.ListingPrice.Amount']) * 100)
+        fees = 100 + cents * 15 // 100
+        status = 'ClientError' if request['IdValue'] in fail else 'Success'
+        results.append(f"""<FeesEstimateResult><Status>{status}</Status>
+            <FeesEstimateIdentifier><SellerInputIdentifier>{request['Identifier']}</SellerInputIdentifier>
+            </FeesEstimateIdentifier><FeesEstimate><TotalFeesEstimate><CurrencyCode>USD</CurrencyCode>
+            <Amount>{fees // 100}.{fees % 100:02d}</Amount></TotalFeesEstimate></FeesEstimate></FeesEstimateResult>""")
+
+    return page('GetMyFeesEstimate', f'<FeesEstimateResultList>{"".join(results)}</FeesEstimateResultList>')
+
+
+@pytest.fixture()
+def api():
+    api = mock.Mock()
+    api.GetMyFeesEstimate.side_effect = lambda FeesEstimateRequestList: fees_response(FeesEstimateRequestList.entries)
+    return api
+
+
+########################################################################################################################
+
+
+def test_estimate_batches(api):
+    """Test that estimates are requested in batches of 20, and each (asin, price) only once."""
+    engine = FeesEngine(api)
+    items = [(f'B{i:09d}', 1000) for i in range(45)] + [('B000000000', 1000)]
+
+    estimates = engine.estimate_many(items)
+
+    assert api.GetMyFeesEstimate.call_count == 3
+    assert estimates[0] == FeeEstimate('B000000000', 1000, 250, 'api')
+    assert estimates[-1] == estimates[0]
+
+    request_list = api.GetMyFeesEstimate.call_args[1]['FeesEstimateRequestList']
+    assert isinstance(request_list, ParamList) and len(request_list.entries) == 5
+    assert request_list['FeesEstimateRequestList.FeesEstimateRequest.1.PriceToEstimateFees.ListingPrice.Amount'] == \
+        '10.00'
+
+
+def test_estimate_cache_and_interpolation(api):
+    """Test that known prices come from the cache, and other prices in the same band are interpolated."""
+    engine = FeesEngine(api, band_width=1000)
+
+    assert engine.estimate('A', 1000).source == 'api'
+    assert engine.estimate('A', '10.00') == FeeEstimate('A', 1000, 250, 'cache')
+    assert engine.estimate('A', 1500).source == 'api'          # Only one known price in the band
+    assert engine.estimate('A', 1800) == FeeEstimate('A', 1800, 370, 'interpolated')
+    assert engine.estimate('A', 2500).source == 'api'          # A different band
+    assert engine.estimate('B', 1200).source == 'api'          # A different ASIN
+    assert api.GetMyFeesEstimate.call_count == 4
+
+
+def test_estimate_failures(api):
+    """Test that failed estimates are returned as None, and not cached."""
+    api.GetMyFeesEstimate.side_effect = lambda FeesEstimateRequestList: \
+        fees_response(FeesEstimateRequestList.entries, fail={'BAD'})
+    engine = FeesEngine(api)
+
+    assert engine.estimate_many([('BAD', 1000), ('GOOD', 1000)])[0] is None
+    assert engine.cached('BAD', 1000) is None
+    assert engine.cached('GOOD', 1000).fees == 250
+
+
+def test_products_fees_engine():
+    """Test building a FeesEngine from a Products object, and the parameters it sends."""
+    make_request = mock.Mock(side_effect=lambda **kwargs: fees_response([{
+        'PriceToEstimateFees.ListingPrice.Amount': '19.99', 'IdValue': 'A', 'Identifier': '0'
+    }]))
+    engine = Products('key', 'secret', 'seller', make_request=make_request).fees_engine(fulfilled=False)
+
+    assert engine.estimate('A', 1999).fees == 399
+    url = make_request.call_args[1]['url']
+    assert 'FeesEstimateRequestList.FeesEstimateRequest.1.IdValue=A' in url
+    assert 'FeesEstimateRequestList.FeesEstimateRequest.1.IsAmazonFulfilled=false' in url
+
+
+def test_cache_key_param_list():
+    """Test that calls with structured lists can be cached."""
+    key = cache_key('GetMyFeesEstimate', List=ParamList('List', 'Item', [{'A': 1}]))
+    assert hash(key) == hash(cache_key('GetMyFeesEstimate', List=ParamList('List', 'Item', [{'A': 1}])))
@@ -0,0 +1,116 @@
+import pytest
+import unittest.mock as mock
+from amazonmws.finances import *
+from amazonmws.responses import MWSError
+from helpers import page, ERROR_RESPONSE
+
+
+def amount(value, currency='USD'):
+    return f'<CurrencyAmount>{value}</CurrencyAmount><CurrencyCode>{currency}</CurrencyCode>'
+
+
+SHIPMENT_EVENT = f"""<ShipmentEventList>
+  <ShipmentEvent>
+    <AmazonOrderId>111-1</AmazonOrderId>
+    <OrderChargeList>
+      <ChargeComponent><ChargeType>ShippingCharge</ChargeType><ChargeAmount>{amount('4.99')}</ChargeAmount></ChargeComponent>
+    </OrderChargeList>
+    <PostedDate>2017-01-01T00:00:00Z</PostedDate>
+    <ShipmentItemList>
+      <ShipmentItem>
+        <SellerSKU>sku-1</SellerSKU>
+        <ItemChargeList>
+          <ChargeComponent><ChargeType>Principal</ChargeType><ChargeAmount>{amount('20.00')}</ChargeAmount></ChargeComponent>
+        </ItemChargeList>
+        <ItemFeeList>
+          <FeeComponent><FeeType>Commission</FeeType><FeeAmount>{amount('-3.00')}</FeeAmount></FeeComponent>
+        </ItemFeeList>
+      </ShipmentItem>
+    </ShipmentItemList>
+  </ShipmentEvent>
+</ShipmentEventList>"""
+
+REFUND_EVENT = f"""<RefundEventList>
+  <ShipmentEvent>
+    <AmazonOrderId>111-2</AmazonOrderId>
+    <PostedDate>2017-01-02T00:00:00Z</PostedDate>
+    <ShipmentItemAdjustmentList>
+      <ShipmentItem>
+        <SellerSKU>sku-2</SellerSKU>
+        <ItemChargeAdjustmentList>
+          <ChargeComponent><ChargeType>Principal</ChargeType><ChargeAmount>{amount('-10.00')}</ChargeAmount></ChargeComponent>
+        </ItemChargeAdjustmentList>
+      </ShipmentItem>
+    </ShipmentItemAdjustmentList>
+  </ShipmentEvent>
+</RefundEventList>"""
+
+EXPECTED_EVENTS = [
+    FinancialEvent('ShipmentEvent', '2017-01-01T00:00:00Z', '111-1', None, 'ShippingCharge', 499, 'USD'),
+    FinancialEvent('ShipmentEvent', '2017-01-01T00:00:00Z', '111-1', 'sku-1', 'Principal', 2000, 'USD'),
+    FinancialEvent('ShipmentEvent', '2017-01-01T00:00:00Z', '111-1', 'sku-1', 'Commission', -300, 'USD'),
+    FinancialEvent('RefundEvent', '2017-01-02T00:00:00Z', '111-2', 'sku-2', 'Principal', -1000, 'USD'),
+]
+
+
+@pytest.fixture()
+def api():
+    api = mock.Mock()
+    api.ListFinancialEvents.return_value = page(
+        'ListFinancialEvents', f'<FinancialEvents>{SHIPMENT_EVENT}</FinancialEvents>', 'tok'
+    )
+    api.ListFinancialEventsByNextToken.return_value = page(
+        'ListFinancialEventsByNextToken', f'<FinancialEvents>{REFUND_EVENT}</FinancialEvents>'
+    )
+    return api
+
+
+########################################################################################################################
+
+
+def test_iter_financial_events(api):
+    """Test that events are parsed into records, following NextTokens."""
+    events = list(iter_financial_events(api, PostedAfter='2017-01-01'))
+
+    assert events == EXPECTED_EVENTS
+    api.ListFinancialEvents.assert_called_with(PostedAfter='2017-01-01')
+    api.ListFinancialEventsByNextToken.assert_called_with(NextToken='tok')
+
+
+def test_iter_financial_events_error(api):
+    """Test that error responses raise MWSError."""
+    api.ListFinancialEvents.return_value = ERROR_RESPONSE
+
+    with pytest.raises(MWSError):
+        list(iter_financial_events(api))
+
+
+def test_iter_financial_event_groups():
+    """Test the iter_financial_event_groups() function."""
+    api = mock.Mock()
+    api.ListFinancialEventGroups.return_value = page('ListFinancialEventGroups', f"""<FinancialEventGroupList>
+      <FinancialEventGroup>
+        <FinancialEventGroupId>g1</FinancialEventGroupId>
+        <ProcessingStatus>Closed</ProcessingStatus>
+        <OriginalTotal>{amount('100.50')}</OriginalTotal>
+      </FinancialEventGroup>
+    </FinancialEventGroupList>""")
+
+    groups = list(iter_financial_event_groups(api, FinancialEventGroupStartedAfter='2017-01-01'))
+
+    assert groups == [FinancialEventGroup('g1', 'Closed', None, None, None, 10050, 'USD')]
+
+
+def test_event_spool(api, tmp_path):
+    """Test spooling events to a file and aggregating them."""
+    with EventSpool(str(tmp_path / 'events.tsv')) as spool:
+        list(iter_financial_events(api, spool=spool))
+
+        assert list(spool) == EXPECTED_EVENTS
+        assert spool.totals(['RefundEvent']) == {('RefundEvent', 'Principal', 'USD'): -1000}
+        assert spool.totals()[('ShipmentEvent', 'Commission', 'USD')] == -300
+
+
+def test_event_spool_empty(tmp_path):
+    """Test reading a spool that hasn't been written yet."""
+    assert list(EventSpool(str(tmp_path / 'events.tsv'))) == []
@@ -0,0 +1,269 @@
+import pytest
+import unittest.mock as mock
+from amazonmws.health import *
+from amazonmws.responses import MWSError
+from amazonmws.throttler import Throttler
+from amazonmws.api import Feeds, Orders, Reports
+from helpers import ERROR_RESPONSE, page
+
+
+CREDENTIALS = ('123456789', '123456789abcdefghijklmnopqrstuvwxyz', 'a1b2c3d4e5f6')
+
+
+def status_response(status):
+    return page('GetServiceStatus', f'<Status>{status}</Status><Timestamp>2020-01-01T00:00:00Z</Timestamp>')
+
+
+@pytest.fixture()
+def clock():
+    with mock.patch('amazonmws.health.time') as time:
+        time.return_value = 1000.0
+        yield time
+
+
+@pytest.fixture()
+def api():
+    api = mock.Mock()
+    api.URI = '/Orders/2013-09-01'
+    api.SECTION = 'Orders'
+    api.GetServiceStatus.return_value = status_response('RED')
+    return api
+
+
+def trip(breaker, calls=10):
+    for _ in range(calls):
+        breaker.record(False)
+
+
+########################################################################################################################
+
+
+def test_opens_on_failure_rate(clock, api):
+    """Test that the breaker opens once failure_rate of at least min_calls calls have failed."""
+    breaker = CircuitBreaker(api, min_calls=4, failure_rate=0.5)
+    breaker.record(True)
+    breaker.record(False)
+    breaker.record(True)
+    assert breaker.state == CLOSED
+
+    breaker.record(False)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+
+
+def test_slow_calls_and_window(clock, api):
+    """Test that slow calls count as failures, and that old outcomes leave the window."""
+    breaker = CircuitBreaker(api, window=60, min_calls=4, slow_call=5)
+    breaker.record(True, latency=6)
+    breaker.record(True, latency=6)
+
+    clock.return_value += 61
+    breaker.record(True, latency=6)
+    breaker.record(True)
+    breaker.record(True)
+    breaker.record(True)
+    assert breaker.state == CLOSED
+
+    breaker.record(True, latency=6)
+    breaker.record(True, latency=6)
+    assert breaker.state == OPEN
+
+
+def test_probe_quota(clock, api):
+    """Test that GetServiceStatus is called no more often than its quota (2 burst, 1 per 300s) allows."""
+    breaker = CircuitBreaker(api)
+    trip(breaker)
+
+    for _ in range(5):
+        with pytest.raises(CircuitOpen):
+            breaker.check()
+    assert api.GetServiceStatus.call_count == 2
+    assert breaker.status == 'RED'
+
+    clock.return_value += 300
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+    assert api.GetServiceStatus.call_count == 3
+
+
+def test_gradual_recovery(clock, api):
+    """Test that calls are let through gradually once the section is GREEN, and the breaker closes afterwards."""
+    breaker = CircuitBreaker(api, recovery=100)
+    trip(breaker)
+    api.GetServiceStatus.return_value = status_response('GREEN')
+
+    def admitted(calls):
+        count = 0
+        for _ in range(calls):
+            try:
+                breaker.check()
+                count += 1
+            except CircuitOpen:
+                pass
+        return count
+
+    assert admitted(10) == 0
+    assert breaker.state == RECOVERING
+
+    clock.return_value += 25
+    assert admitted(100) == 25
+
+    clock.return_value += 50
+    assert admitted(100) == 75
+
+    clock.return_value += 25
+    assert admitted(10) == 10
+    assert breaker.state == CLOSED
+
+
+def test_failure_while_recovering(clock, api):
+    """Test that a failure while recovering opens the breaker again."""
+    breaker = CircuitBreaker(api)
+    trip(breaker)
+    api.GetServiceStatus.return_value = status_response('GREEN')
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+    assert breaker.state == RECOVERING
+
+    breaker.record(False)
+    assert breaker.state == OPEN
+
+
+def test_yellow_and_unknown_status(clock, api):
+    """Test that YELLOW starts a recovery even while closed, and that the breaker recovers after probe_interval if
+    the status can't be read."""
+    breaker = CircuitBreaker(api)
+    api.GetServiceStatus.return_value = status_response('YELLOW')
+    assert breaker.probe() == 'YELLOW'
+    assert breaker.state == RECOVERING
+
+    breaker = CircuitBreaker(api, probe_interval=300)
+    trip(breaker)
+    api.GetServiceStatus.side_effect = ConnectionError
+    for _ in range(3):
+        with pytest.raises(CircuitOpen):
+            breaker.check()
+    assert breaker.state == OPEN
+
+    clock.return_value += 300
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+    assert breaker.state == RECOVERING
+
+
+def test_run_classifies_errors(clock, api):
+    """Test that run() counts server errors and 5xx responses as failures, but not the caller's errors."""
+    breaker = CircuitBreaker(api, min_calls=2, failure_rate=1)
+
+    with pytest.raises(MWSError):
+        breaker.run(mock.Mock(side_effect=MWSError('InvalidParameterValue', 'Bad', 'Sender')))
+    breaker.run(mock.Mock(return_value=mock.Mock(status_code=200)))
+    assert breaker.state == CLOSED
+
+    breaker = CircuitBreaker(api, min_calls=2, failure_rate=1)
+    with pytest.raises(MWSError):
+        breaker.run(mock.Mock(side_effect=MWSError('InternalError', 'Oops', 'Receiver')))
+    breaker.run(mock.Mock(return_value=mock.Mock(status_code=503)))
+    assert breaker.state == OPEN
+
+
+def error_response(code, error_type):
+    return ERROR_RESPONSE.replace('RequestThrottled', code).replace('Sender', error_type)
+
+
+@pytest.mark.parametrize('body, failure', [
+    (ERROR_RESPONSE, False),                                        # RequestThrottled, Sender
+    (error_response('QuotaExceeded', 'Receiver'), False),
+    (error_response('InvalidParameterValue', 'Sender'), False),
+    (error_response('InternalError', 'Receiver'), True),
+    ('<html>Bad Gateway</html', True),
+])
+def test_is_failure_error_responses(body, failure):
+    """Test that 5xx responses are read, so that throttling and the caller's errors don't count as failures."""
+    assert is_failure(response=mock.Mock(status_code=503, content=body.encode())) is failure
+
+
+def test_throttled_responses_keep_breaker_closed(clock):
+    """Test that throttled calls made through a Throttler don't open the breaker."""
+    throttled = mock.Mock(status_code=503, content=ERROR_RESPONSE.encode(), headers={})
+    orders = Orders(*CREDENTIALS, make_request=lambda **kwargs: throttled)
+    breaker = CircuitBreaker(orders, min_calls=3)
+    throttler = Throttler(orders, breaker=breaker, limits={})
+
+    for _ in range(5):
+        throttler.ListOrders(CreatedAfter='2020-01-01')
+
+    assert breaker.state == CLOSED
+
+
+def test_breaker_with_throttler(clock):
+    """Test that a breaker can be created from a Throttler, and uses the API object it wraps."""
+    orders = Orders(*CREDENTIALS, make_request=lambda **kwargs: status_response('GREEN'))
+    throttler = Throttler(orders)
+
+    breaker = CircuitBreaker(throttler)
+    assert breaker.api is orders
+    assert breaker.probe() == 'GREEN'
+    assert breaker_for(throttler) is breaker_for(orders)
+
+
+def test_breaker_for(api):
+    """Test that breaker_for() shares a breaker per section, and keeps sections apart."""
+    other = mock.Mock(URI='/Products/2011-10-01', SECTION='Products', _domain=api._domain)
+
+    assert breaker_for(api) is breaker_for(api)
+    assert breaker_for(other) is not breaker_for(api)
+
+
+def test_breaker_for_shared_uri():
+    """Test that sections that share a URI (Feeds and Reports) get separate breakers."""
+    feeds = Feeds(*CREDENTIALS, make_request=mock.Mock())
+    reports = Reports(*CREDENTIALS, make_request=mock.Mock())
+    assert feeds.URI == reports.URI
+
+    assert breaker_for(feeds) is breaker_for(Feeds(*CREDENTIALS))
+    assert breaker_for(feeds) is not breaker_for(reports)
+
+
+def test_timed_recovery_without_service_status(clock):
+    """Test that a breaker for a section without GetServiceStatus never probes, and starts recovering after
+    probe_interval."""
+    make_request = mock.Mock()
+    breaker = CircuitBreaker(Feeds(*CREDENTIALS, make_request=make_request))
+    assert not breaker.can_probe
+    assert breaker.probe_interval == 300
+
+    trip(breaker)
+    for _ in range(3):
+        with pytest.raises(CircuitOpen):
+            breaker.check()
+    assert breaker.probe() is None
+    make_request.assert_not_called()
+    assert breaker.state == OPEN
+
+    clock.return_value += 300
+    with pytest.raises(CircuitOpen):
+        breaker.check()
+    assert breaker.state == RECOVERING
+    make_request.assert_not_called()
+
+
+def test_throttler_sheds_before_quota(clock, api):
+    """Test that a Throttler with an open breaker raises CircuitOpen without using quota, and that a Throttler for
+    another section is unaffected."""
+    breaker = CircuitBreaker(api)
+    trip(breaker)
+    throttler = Throttler(api, breaker=breaker)
+
+    with pytest.raises(CircuitOpen):
+        throttler.ListOrders(CreatedAfter='2020-01-01')
+    api.ListOrders.assert_not_called()
+    assert 'ListOrders' not in throttler._usage
+
+    products = mock.Mock(URI='/Products/2011-10-01', SECTION='Products')
+    healthy = Throttler(products, breaker=CircuitBreaker(products))
+    healthy.GetMatchingProduct(ASINList=['B000000000'])
+    products.GetMatchingProduct.assert_called_once()
+    assert healthy.breaker.state == CLOSED
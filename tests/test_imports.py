@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+import pytest
+import amazonmws
+
+
+def run(code):
+    """Run code in a fresh interpreter, returning its stdout and stderr."""
+    root = os.path.dirname(os.path.dirname(amazonmws.__file__))
+    result = subprocess.run([sys.executable, '-c', code], cwd=root, capture_output=True, text=True, check=True)
+    return result.stdout, result.stderr
+
+
+########################################################################################################################
+
+
+def test_import_is_lazy():
+    """Test that importing amazonmws doesn't import its submodules until they're needed."""
+    stdout, stderr = run(
+        'import sys, amazonmws\n'
+        'print(sorted(name for name in sys.modules if name.startswith("amazonmws")))\n'
+        'amazonmws.Orders\n'
+        'print(sorted(name for name in sys.modules if name.startswith("amazonmws")))'
+    )
+
+    assert stdout.splitlines() == ["['amazonmws']", "['amazonmws', 'amazonmws.api', 'amazonmws.operations']"]
+
+
+def test_lazy_attributes():
+    """Test that exported names resolve to the objects in their submodules."""
+    from amazonmws.throttler import Throttler
+
+    assert amazonmws.Throttler is Throttler
+    assert 'Throttler' in vars(amazonmws)
+    assert 'Orders' in dir(amazonmws)
+
+    with pytest.raises(AttributeError):
+        amazonmws.NoSuchThing
+
+
+def test_submodule_attributes():
+    """Test that submodules can be reached as attributes of the package, as before imports were made lazy."""
+    stdout, stderr = run(
+        'import amazonmws\n'
+        'print(amazonmws.api.__name__, amazonmws.throttler.Throttler.__module__, hasattr(amazonmws, "nosuchmodule"))'
+    )
+
+    assert stdout.split() == ['amazonmws.api', 'amazonmws.throttler', 'False']
+
+
+def test_star_import():
+    """Test that 'from amazonmws import *' imports every exported name."""
+    namespace = {}
+    exec('from amazonmws import *', namespace)
+
+    assert set(amazonmws.__all__) <= set(namespace)
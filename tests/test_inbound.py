@@ -0,0 +1,117 @@
+import re
+import pytest
+import unittest.mock as mock
+from amazonmws.api import FulfillmentInboundShipment
+from amazonmws.inbound import *
+from helpers import page
+
+
+SHIP_FROM = {'Name': 'Warehouse', 'AddressLine1': '1 Main St', 'City': 'Springfield', 'CountryCode': 'US'}
+
+
+def plan_response(items, shipment_id='FBA1'):
+    members = ''.join(
+        f'<member><SellerSKU>{sku}</SellerSKU><Quantity>{quantity}</Quantity></member>' for sku, quantity in items
+    )
+    return page('CreateInboundShipmentPlan', f"""<InboundShipmentPlans><member>
+        <ShipmentId>{shipment_id}</ShipmentId><DestinationFulfillmentCenterId>ABE2</DestinationFulfillmentCenterId>
+        <LabelPrepType>SELLER_LABEL</LabelPrepType><ShipToAddress><City>Allentown</City></ShipToAddress>
+        <Items>{members}</Items></member></InboundShipmentPlans>""")
+
+
+def items_page(items, next_token=None):
+    members = ''.join(
+        f'<member><SellerSKU>{sku}</SellerSKU><QuantityShipped>{shipped}</QuantityShipped>'
+        f'<QuantityReceived>{received}</QuantityReceived></member>' for sku, shipped, received in items
+    )
+    return page('ListInboundShipmentItems', f'<ItemData>{members}</ItemData>', next_token)
+
+
+########################################################################################################################
+
+
+def test_nested_params():
+    """Test that nested_params() flattens structured parameters."""
+    from amazonmws.api import nested_params
+
+    assert nested_params('Header', {'Name': 'x', 'Address': {'City': 'y'}, 'Count': 2}) == \
+        {'Header.Name': 'x', 'Header.Address.City': 'y', 'Header.Count': 2}
+    assert nested_params('Name', 'x') == {'Name': 'x'}
+
+
+def test_plan():
+    """Test that plan() sends items in chunks of 200, and collects the plans."""
+    def create_plan(**kwargs):
+        items = kwargs['InboundShipmentPlanRequestItems']
+        return plan_response([(item['SellerSKU'], item['Quantity']) for item in items], items[0]['SellerSKU'])
+
+    api = mock.Mock()
+    api.CreateInboundShipmentPlan.side_effect = create_plan
+    planner = InboundPlanner(api, SHIP_FROM, ship_to_country='US')
+
+    plans = planner.plan([(f'SKU{i}', i) for i in range(450)] + [{'SellerSKU': 'extra', 'Quantity': 1}])
+
+    assert [plan.shipment_id for plan in plans] == ['SKU0', 'SKU200', 'SKU400']
+    assert [len(plan.items) for plan in plans] == [200, 200, 51]
+    assert plans[0] == ShipmentPlan('SKU0', 'ABE2', 'SELLER_LABEL', {'City': 'Allentown'}, plans[0].items)
+    assert plans[2].items[-1] == ('extra', 1)
+
+    kwargs = api.CreateInboundShipmentPlan.call_args[1]
+    assert kwargs['ShipFromAddress.City'] == 'Springfield'
+    assert kwargs['ShipToCountryCode'] == 'US'
+
+
+def test_plan_params():
+    """Test the parameters a FulfillmentInboundShipment object sends for a plan."""
+    make_request = mock.Mock(return_value=plan_response([('A', 1)]))
+    api = FulfillmentInboundShipment('key', 'secret', 'seller', make_request=make_request)
+
+    InboundPlanner(api, SHIP_FROM).plan([('A', 1)])
+
+    url = make_request.call_args[1]['url']
+    assert 'InboundShipmentPlanRequestItems.member.1.SellerSKU=A' in url
+    assert 'ShipFromAddress.Name=Warehouse' in url
+
+
+def test_create():
+    """Test that create() creates each shipment, and adds the items that don't fit with UpdateInboundShipment."""
+    response = page('CreateInboundShipment', '<ShipmentId>x</ShipmentId>')
+    api = mock.Mock(**{'CreateInboundShipment.return_value': response, 'UpdateInboundShipment.return_value': response})
+    planner = InboundPlanner(api, SHIP_FROM)
+    plans = [
+        ShipmentPlan('FBA1', 'ABE2', 'SELLER_LABEL', {}, [(f'SKU{i}', 1) for i in range(450)]),
+        ShipmentPlan('FBA2', 'PHX3', 'SELLER_LABEL', {}, [('SKU', 5)])
+    ]
+
+    assert planner.create(plans, 'Shipment', AreCasesRequired='false') == ['FBA1', 'FBA2']
+
+    assert api.CreateInboundShipment.call_count == 2
+    assert api.UpdateInboundShipment.call_count == 2
+
+    for call in api.UpdateInboundShipment.call_args_list:
+        assert call[1]['ShipmentId'] == 'FBA1'
+        assert call[1]['InboundShipmentHeader.ShipmentStatus'] == 'WORKING'
+        assert call[1]['InboundShipmentHeader.AreCasesRequired'] == 'false'
+
+    sizes = sorted(len(call[1]['InboundShipmentItems']) for call in api.CreateInboundShipment.call_args_list)
+    assert sizes == [1, 200]
+
+
+def test_reconcile():
+    """Test that reconcile() follows NextTokens and indexes the items of each shipment."""
+    def list_items(ShipmentId):
+        return items_page([('A', 10, 10), ('B', 5, 3)], next_token=ShipmentId)
+
+    api = mock.Mock()
+    api.ListInboundShipmentItems.side_effect = list_items
+    api.ListInboundShipmentItemsByNextToken.return_value = items_page([('B', 1, 0), ('C', 2, 2)])
+
+    index = InboundPlanner(api, SHIP_FROM).reconcile(['FBA1', 'FBA2'])
+
+    assert len(index) == 2 and 'FBA1' in index
+    assert sorted(index) == ['FBA1', 'FBA2']
+    assert list(index.items('FBA1')) == [('A', 10, 10), ('B', 6, 3), ('C', 2, 2)]
+    assert index.quantities('FBA2', 'B') == (6, 3)
+    assert index.quantities('FBA2', 'D') is None
+    assert index.totals('FBA1') == (18, 15)
+    assert sorted(index.discrepancies()) == [('FBA1', 'B', 6, 3), ('FBA2', 'B', 6, 3)]
@@ -0,0 +1,90 @@
+import pytest
+import unittest.mock as mock
+from amazonmws.api import FulfillmentInventory
+from amazonmws.inventory import *
+from amazonmws.throttler import Throttler
+from amazonmws.watermarks import WatermarkStore
+from helpers import page
+
+
+def supply(*members):
+    members = ''.join(
+        f'<member><SellerSKU>{sku}</SellerSKU><TotalSupplyQuantity>{total}</TotalSupplyQuantity>'
+        f'<InStockSupplyQuantity>{in_stock}</InStockSupplyQuantity></member>'
+        for sku, total, in_stock in members
+    )
+    return f'<InventorySupplyList>{members}</InventorySupplyList>'
+
+
+@pytest.fixture()
+def api():
+    api = mock.Mock()
+    api.ListInventorySupply.return_value = page('ListInventorySupply', supply(('a', 5, 4)), 'tok')
+    api.ListInventorySupplyByNextToken.return_value = page('ListInventorySupplyByNextToken', supply(('b', 1, 1)))
+    return api
+
+
+########################################################################################################################
+
+
+def test_poll(api):
+    """Test that the first poll reports every SKU, and follows NextTokens."""
+    tracker = InventoryTracker(api, market='US')
+
+    changes = list(tracker.poll())
+
+    assert changes == [InventoryChange('a', None, 5, None, 4), InventoryChange('b', None, 1, None, 1)]
+    assert tracker.quantities('a') == (5, 4)
+    assert len(tracker) == 2 and 'b' in tracker
+    api.ListInventorySupply.assert_called_with(
+        QueryStartDateTime=INITIAL_QUERY_START, ResponseGroup='Basic', MarketplaceId='ATVPDKIKX0DER'
+    )
+
+
+def test_poll_changes_only(api):
+    """Test that later polls start from the watermark and report only changed quantities."""
+    tracker = InventoryTracker(api)
+    list(tracker.poll())
+    watermark = tracker.watermarks.get('inventory')
+
+    api.ListInventorySupply.return_value = page('ListInventorySupply', supply(('a', 5, 4), ('b', 0, 0)))
+    changes = list(tracker.poll())
+
+    assert changes == [InventoryChange('b', 1, 0, 1, 0)]
+    assert api.ListInventorySupply.call_args[1]['QueryStartDateTime'] == watermark
+
+
+def test_update_unchanged():
+    """Test that update() returns None when the quantities haven't changed."""
+    tracker = InventoryTracker(mock.Mock())
+    tracker.update('a', 1, 1)
+
+    assert tracker.update('a', 1, 1) is None
+    assert tracker.quantities('missing') is None
+
+
+def test_watermark_per_marketplace(api):
+    """Test that trackers for different marketplaces keep their own watermarks in a shared store."""
+    watermarks = WatermarkStore()
+    us = InventoryTracker(api, market='US', watermarks=watermarks)
+    uk = InventoryTracker(api, market='UK', watermarks=watermarks)
+
+    list(us.poll())
+    list(uk.poll())
+
+    assert us.key == 'inventory/ATVPDKIKX0DER'
+    assert uk.key == 'inventory/A1F83G8C2ARO7P'
+    assert watermarks.get(us.key) and watermarks.get(uk.key)
+
+
+def test_watermark_server_clock(api):
+    """Test that the watermark is taken from the API object's server clock, not the local one."""
+    clock = mock.Mock()
+    clock.time.return_value = 1483228800.0         # 2017-01-01T00:00:00Z
+    section = FulfillmentInventory('key', 'secret', 'seller', clock=clock)
+    assert InventoryTracker(Throttler(section)).clock is clock
+
+    tracker = InventoryTracker(api, clock=clock)
+    list(tracker.poll())
+
+    assert tracker.watermarks.get(tracker.key) == '2017-01-01T00:00:00Z'
@@ -0,0 +1,209 @@
+import pytest
+import unittest.mock as mock
+from amazonmws.api import Products
+from amazonmws.decoding import decode_response
+from amazonmws.notifications import *
+from amazonmws.records import offer_records
+from amazonmws.throttler import Throttler, TTLCache, cache_key
+
+
+def notification(asin='B000000001', changed_at='2017-01-01T00:00:00Z', notification_type='AnyOfferChanged'):
+    return f"""<?xml version="1.0"?>
+<Notification>
+  <NotificationMetaData>
+    <NotificationType>{notification_type}</NotificationType>
+    <PublishTime>2017-01-01T00:00:01Z</PublishTime>
+  </NotificationMetaData>
+  <NotificationPayload>
+    <AnyOfferChangedNotification>
+      <OfferChangeTrigger>
+        <MarketplaceId>ATVPDKIKX0DER</MarketplaceId>
+        <ASIN>{asin}</ASIN>
+        <ItemCondition>new</ItemCondition>
+        <TimeOfOfferChange>{changed_at}</TimeOfOfferChange>
+      </OfferChangeTrigger>
+      <Summary>
+        <NumberOfOffers><OfferCount condition="new" fulfillmentChannel="Amazon">1</OfferCount></NumberOfOffers>
+        <LowestPrices>
+          <LowestPrice condition="new" fulfillmentChannel="Amazon">
+            <LandedPrice><Amount>19.99</Amount><CurrencyCode>USD</CurrencyCode></LandedPrice>
+          </LowestPrice>
+        </LowestPrices>
+      </Summary>
+      <Offers>
+        <Offer>
+          <SellerId>S1</SellerId>
+          <SubCondition>new</SubCondition>
+          <ListingPrice><Amount>19.99</Amount><CurrencyCode>USD</CurrencyCode></ListingPrice>
+          <Shipping><Amount>0.00</Amount><CurrencyCode>USD</CurrencyCode></Shipping>
+          <IsFulfilledByAmazon>true</IsFulfilledByAmazon>
+          <IsBuyBoxWinner>true</IsBuyBoxWinner>
+        </Offer>
+      </Offers>
+    </AnyOfferChangedNotification>
+  </NotificationPayload>
+</Notification>"""
+
+
+@pytest.fixture(params=['memory', 'file'])
+def queue(request, tmp_path):
+    return MemoryQueue() if request.param == 'memory' else FileQueue(str(tmp_path / 'queue'))
+
+
+########################################################################################################################
+
+
+def test_decode_any_offer_changed():
+    """Test decoding an AnyOfferChanged notification."""
+    change = decode_any_offer_changed(notification())
+
+    assert change.asin == 'B000000001'
+    assert change.market == 'ATVPDKIKX0DER'
+    assert change.offers == (NotificationOffer('S1', 'new', 1999, 0, 'USD', True, True),)
+
+
+@pytest.mark.parametrize('body', ['not xml', notification(notification_type='FeedProcessingFinished')])
+def test_decode_invalid(body):
+    """Test that decoding something other than an AnyOfferChanged notification raises ValueError."""
+    with pytest.raises(ValueError):
+        decode_any_offer_changed(body)
+
+
+@pytest.mark.parametrize('missing', [
+    '<ItemCondition>new</ItemCondition>',
+    '<OfferChangeTrigger>',
+    '<AnyOfferChangedNotification>',
+])
+def test_decode_malformed(missing):
+    """Test that notifications missing the parts that identify the offers raise ValueError."""
+    body = notification()
+    if missing.startswith('<ItemCondition>'):
+        body = body.replace(missing, '')
+    else:
+        body = body[:body.index(missing)] + '</NotificationPayload></Notification>'
+
+    with pytest.raises(ValueError):
+        decode_any_offer_changed(body)
+
+
+def test_queue(queue):
+    """Test sending, receiving and deleting messages."""
+    for body in ['one', 'two', 'three']:
+        queue.send(body)
+
+    first = queue.receive(2)
+    assert [body for receipt, body in first] == ['one', 'two']
+
+    queue.delete([receipt for receipt, body in first])
+    assert [body for receipt, body in queue.receive(10)] == ['three']
+    assert queue.receive(10) == []
+
+
+def test_consumer(queue):
+    """Test that the consumer feeds notifications into a Throttler's cache, and deletes them from the queue."""
+    api = mock.Mock()
+    throttler = Throttler(api=api, cache=TTLCache())
+    consumer = NotificationConsumer(queue, throttler.cache)
+
+    queue.send(notification(changed_at='2017-01-02T00:00:00Z'))
+    queue.send(notification(changed_at='2017-01-01T00:00:00Z'))     # Out of order; should be ignored
+    queue.send('garbage')
+    queue.send(notification().replace('<ItemCondition>new</ItemCondition>', ''))
+
+    assert len(consumer.poll()) == 2
+
+    result = throttler.GetLowestPricedOffersForASIN(
+        MarketplaceId='ATVPDKIKX0DER', ASIN='B000000001', ItemCondition='New'
+    )
+    assert api.GetLowestPricedOffersForASIN.call_count == 0
+    assert parse_xml(result).findtext('*/Identifier/TimeOfOfferChange') == '2017-01-02T00:00:00Z'
+
+
+def test_offers_response():
+    """Test that cached offers read like a GetLowestPricedOffersForASIN response."""
+    response = offers_response(decode_any_offer_changed(notification()))
+
+    [offer] = offer_records(response)
+    assert (offer.asin, offer.market, offer.sub_condition) == ('B000000001', 'ATVPDKIKX0DER', 'new')
+    assert (offer.listing_price, offer.shipping, offer.currency) == (1999, 0, 'USD')
+    assert offer.fulfilled_by_amazon and offer.buy_box_winner
+
+    summary = parse_xml(response).find('*/Summary')
+    assert summary.findtext('NumberOfOffers/OfferCount') == '1'
+    assert summary.findtext('LowestPrices/LowestPrice/LandedPrice/Amount') == '19.99'
+
+
+def test_cache_hits_decoded():
+    """Test that cached responses are decoded like live ones when the API object has a decoder."""
+    response = offers_response(decode_any_offer_changed(notification()))
+    products = Products('key', 'secret', 'seller', make_request=lambda **kwargs: response, decoder=decode_response)
+    cache = TTLCache()
+    throttler = Throttler(products, cache=cache)
+    params = {'MarketplaceId': 'ATVPDKIKX0DER', 'ASIN': 'B000000001', 'ItemCondition': 'New'}
+
+    live = throttler.GetLowestPricedOffersForASIN(**params)
+    cache[cache_key('GetLowestPricedOffersForASIN', **params)] = response
+    cached = throttler.GetLowestPricedOffersForASIN(**params)
+
+    assert isinstance(cached, dict)
+    assert cached == live
+    assert cached['GetLowestPricedOffersForASINResult']['Summary']['NumberOfOffers']['OfferCount'] == '1'
+
+
+@mock.patch('amazonmws.throttler.time')
+def test_consumer_cache_expires(mock_time):
+    """Test that offers stored in a TTLCache stop being served once they expire."""
+    mock_time.return_value = 1000
+    cache = TTLCache(ttl=60)
+    queue = MemoryQueue()
+    queue.send(notification())
+    NotificationConsumer(queue, cache).poll()
+    key = NotificationConsumer.key(decode_any_offer_changed(notification()))
+    assert cache.get(key) is not None
+
+    mock_time.return_value = 1060
+    assert cache.get(key) is None
+    assert len(cache) == 0
+
+
+def test_consumer_run():
+    """Test that run() stops when the stop event is set."""
+    stop = mock.Mock()
+    stop.is_set.side_effect = [False, True]
+    queue = MemoryQueue()
+    queue.send(notification())
+    cache = {}
+
+    NotificationConsumer(queue, cache).run(stop=stop)
+
+    assert len(cache) == 1
+
+
+def test_manager_subscribe():
+    """Test the parameters sent by NotificationManager.subscribe()."""
+    api = mock.Mock()
+    NotificationManager(api).subscribe('https://sqs/queue')
+
+    kwargs = api.CreateSubscription.call_args[1]
+    params = {**{k: v for k, v in kwargs.items() if k != 'attributes'}, **kwargs['attributes']}
+    assert params == {
+        'MarketplaceId': 'ATVPDKIKX0DER',
+        'Subscription.NotificationType': 'AnyOfferChanged',
+        'Subscription.IsEnabled': 'true',
+        'Subscription.Destination.DeliveryChannel': 'SQS',
+        'Subscription.Destination.AttributeList.member.1.Key': 'sqsQueueUrl',
+        'Subscription.Destination.AttributeList.member.1.Value': 'https://sqs/queue'
+    }
+
+
+def test_sqs_queue():
+    """Test the SQSQueue adapter."""
+    client = mock.Mock()
+    client.receive_message.return_value = {'Messages': [{'ReceiptHandle': 'r1', 'Body': 'b1'}]}
+    queue = SQSQueue(client, 'https://sqs/queue')
+
+    assert queue.receive() == [('r1', 'b1')]
+    queue.delete(['r1'])
+    client.delete_message_batch.assert_called_with(
+        QueueUrl='https://sqs/queue', Entries=[{'Id': '0', 'ReceiptHandle': 'r1'}]
+    )
@@ -0,0 +1,86 @@
+import inspect
+import pytest
+from amazonmws.operations import *
+from amazonmws.throttler import DEFAULT_LIMITS
+
+
+########################################################################################################################
+
+
+def test_load_catalog():
+    """Test that the catalog loads, and only once."""
+    catalog = load_catalog()
+
+    assert load_catalog() is catalog
+    assert 'ListMatchingProducts' in catalog['Products']
+    assert isinstance(catalog['Orders']['ListOrders'], Operation)
+
+
+def test_find_operation():
+    """Test the find_operation() function."""
+    operation = find_operation('Products', 'GetMatchingProductForId')
+
+    assert operation.section == 'Products'
+    assert operation.lists == {'IdList': ('Id', 5)}
+    assert find_operation('Products', 'ListOrders') is None
+    assert find_operation('NoSuchSection', 'ListOrders') is None
+
+
+def test_catalog_limits():
+    """Test that DEFAULT_LIMITS is built from the catalog's quotas."""
+    assert type(DEFAULT_LIMITS) is dict
+    assert DEFAULT_LIMITS == dict(CatalogLimits())
+    assert DEFAULT_LIMITS['ListMatchingProducts'] == {'quota_max': 20, 'restore_rate': 5, 'hourly_max': 720}
+    assert DEFAULT_LIMITS['GetLowestPricedOffersForASIN']['hourly_max'] == 200
+    assert 'ListOrders' in DEFAULT_LIMITS and 'NoSuchAction' not in DEFAULT_LIMITS
+
+    for name, limits in DEFAULT_LIMITS.items():
+        operation = find_operation(None, name)
+        assert operation.quota == (limits['quota_max'], limits['restore_rate'], limits.get('hourly_max'))
+
+
+def test_default_limits_mutable():
+    """Test that DEFAULT_LIMITS can be extended without changing the catalog."""
+    DEFAULT_LIMITS['Custom'] = {'quota_max': 1, 'restore_rate': 1}
+    DEFAULT_LIMITS['ListOrders']['quota_max'] += 1
+    try:
+        assert 'Custom' not in CatalogLimits()
+        assert CatalogLimits()['ListOrders']['quota_max'] == DEFAULT_LIMITS['ListOrders']['quota_max'] - 1
+    finally:
+        del DEFAULT_LIMITS['Custom']
+        DEFAULT_LIMITS['ListOrders']['quota_max'] -= 1
+
+
+def test_catalog_attribute():
+    """Test that CatalogAttribute reads section attributes from the catalog, and caches them on the class."""
+    class Section:
+        SECTION = 'Sellers'
+        URI = CatalogAttribute('uri', '/')
+
+    class NoSection:
+        SECTION = None
+        URI = CatalogAttribute('uri', '/')
+
+    assert Section.URI == '/Sellers/2011-07-01'
+    assert vars(Section)['URI'] == '/Sellers/2011-07-01'
+    assert NoSection.URI == '/'
+
+
+def test_batches():
+    """Test that batches() splits values using the catalog's limits."""
+    get_matching = find_operation('Products', 'GetMatchingProductForId')
+    item_lookup = find_operation('ProductAdvertising', 'ItemLookup')
+
+    assert batches(get_matching, 'IdList', range(12)) == [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9], [10, 11]]
+    assert batches(get_matching, 'Other', range(3)) == [[0, 1, 2]]
+    assert batches(None, 'IdList', range(3)) == [[0, 1, 2]]
+    assert batches(item_lookup, 'ItemId', range(12)) == ['0,1,2,3,4,5,6,7,8,9', '10,11']
+
+
+def test_operation_method():
+    """Test that operation_method() builds a method with a useful signature."""
+    method = operation_method(find_operation('Products', 'ListMatchingProducts'))
+    signature = inspect.signature(method)
+
+    assert method.__name__ == 'ListMatchingProducts'
+    assert list(signature.parameters) == ['self', 'MarketplaceId', 'Query', 'QueryContextId', 'kwargs']
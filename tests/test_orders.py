@@ -0,0 +1,140 @@
+import threading
+import pytest
+import unittest.mock as mock
+from amazonmws.orders import *
+from amazonmws.watermarks import WatermarkStore
+from helpers import page
+
+
+def order(order_id, purchased, updated):
+    return f"""<Order>
+  <AmazonOrderId>{order_id}</AmazonOrderId>
+  <PurchaseDate>{purchased}</PurchaseDate>
+  <LastUpdateDate>{updated}</LastUpdateDate>
+  <OrderStatus>Shipped</OrderStatus>
+</Order>"""
+
+
+@pytest.fixture()
+def api():
+    api = mock.Mock()
+    api.ListOrders.return_value = page('ListOrders', '<Orders>' + order('1', '2017-01-01T00:00:00Z', '2017-01-03T00:00:00Z') + '</Orders>', 'tok')
+    api.ListOrdersByNextToken.return_value = page('ListOrdersByNextToken', '<Orders>' + order('2', '2017-01-02T12:00:00Z', '2017-01-03T00:00:00.000Z') + '</Orders>')
+    api.ListOrderItems.side_effect = lambda AmazonOrderId: page('ListOrderItems', f'<OrderItems><OrderItem><SellerSKU>{AmazonOrderId}-sku</SellerSKU></OrderItem></OrderItems>')
+    return api
+
+
+########################################################################################################################
+
+
+def test_sync(api, tmp_path):
+    """Test a sync pass: paging, event kinds, items and the saved watermark."""
+    watermarks = WatermarkStore(str(tmp_path / 'marks.json'))
+    sync = OrderSync(api, 'seller', ['US'], watermarks=watermarks, start='2017-01-02T00:00:00Z')
+
+    events = list(sync.sync())
+
+    assert [(e.kind, e.order_id) for e in events] == [('updated', '1'), ('created', '2')]
+    assert events[1].items == [{'SellerSKU': '2-sku'}]
+    assert events[1].order['OrderStatus'] == 'Shipped'
+    api.ListOrders.assert_called_with(MarketplaceId=['ATVPDKIKX0DER'], LastUpdatedAfter='2017-01-02T00:00:00Z')
+
+    saved = WatermarkStore(str(tmp_path / 'marks.json')).get('seller/ATVPDKIKX0DER')
+    assert saved == {'after': '2017-01-03T00:00:00Z', 'ids': ['1', '2']}
+
+
+def test_watermarks_temporary_files(tmp_path):
+    """Test that stores sharing a file write through their own temporary files, and leave none behind."""
+    path = str(tmp_path / 'marks.json')
+    stores = [WatermarkStore(path) for _ in range(4)]
+
+    threads = [threading.Thread(target=lambda s=s: [s.set(f'key{i}', i) for i in range(50)]) for s in stores]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert WatermarkStore(path).get('key49') == 49
+    assert [p.name for p in tmp_path.iterdir()] == ['marks.json']
+
+    with pytest.raises(TypeError):
+        stores[0].set('bad', object())
+    assert [p.name for p in tmp_path.iterdir()] == ['marks.json']
+
+
+def test_sync_skips_seen(api):
+    """Test that orders reported at the watermark aren't reported again, and no items are fetched for them."""
+    sync = OrderSync(api, 'seller', ['US'], start='2017-01-02T00:00:00Z')
+    list(sync.sync())
+    api.ListOrderItems.reset_mock()
+
+    events = list(sync.sync())
+
+    assert events == []
+    assert api.ListOrderItems.call_count == 0
+    api.ListOrders.assert_called_with(MarketplaceId=['ATVPDKIKX0DER'], LastUpdatedAfter='2017-01-03T00:00:00Z')
+
+
+def test_sync_no_items(api):
+    """Test a sync pass with fetch_items=False."""
+    sync = OrderSync(api, 'seller', ['US'], start='2017-01-02T00:00:00Z', fetch_items=False)
+
+    assert [e.items for e in sync.sync()] == [None, None]
+    assert api.ListOrderItems.call_count == 0
+
+
+def test_fetch_items(api):
+    """Test that OrderItemFetcher yields the items for every order."""
+    fetcher = OrderItemFetcher(api, max_in_flight=3)
+
+    results = dict(fetcher.fetch(str(i) for i in range(10)))
+
+    assert results == {str(i): [{'SellerSKU': f'{i}-sku'}] for i in range(10)}
+
+
+def test_fetch_items_bounded(api):
+    """Test that OrderItemFetcher limits concurrency, and doesn't read ahead of a slow consumer."""
+    lock = threading.Lock()
+    in_flight, max_seen, pulled = [0], [0], []
+    started, release = threading.Semaphore(0), threading.Event()
+    list_order_items = api.ListOrderItems.side_effect
+
+    def slow_list_order_items(AmazonOrderId):
+        with lock:
+            in_flight[0] += 1
+            max_seen[0] = max(max_seen[0], in_flight[0])
+        started.release()
+        release.wait(timeout=5)
+        with lock:
+            in_flight[0] -= 1
+        return list_order_items(AmazonOrderId)
+
+    def order_ids():
+        for i in range(20):
+            pulled.append(i)
+            yield str(i)
+
+    def release_when_full():
+        # Hold the first requests until max_in_flight of them are under way at once
+        for _ in range(4):
+            started.acquire(timeout=5)
+        release.set()
+
+    api.ListOrderItems.side_effect = slow_list_order_items
+    releaser = threading.Thread(target=release_when_full)
+    releaser.start()
+    results = OrderItemFetcher(api, max_in_flight=4).fetch(order_ids())
+
+    next(results)
+    releaser.join()
+    assert max_seen[0] == 4
+    assert len(pulled) <= 5
+
+    assert len(list(results)) == 19
+    assert max_seen[0] <= 4
+
+
+def test_fetch_items_invalid(api):
+    """Test that max_in_flight must be positive."""
+    with pytest.raises(ValueError):
+        OrderItemFetcher(api, max_in_flight=0)
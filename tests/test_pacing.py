@@ -0,0 +1,52 @@
+import asyncio
+import pytest
+import unittest.mock as mock
+from amazonmws.pacing import PacingClock
+
+
+@pytest.fixture(params=['memory', 'file'])
+def clock_path(request, tmp_path):
+    return None if request.param == 'memory' else str(tmp_path / 'pacing')
+
+
+########################################################################################################################
+
+
+@mock.patch('amazonmws.pacing.time')
+def test_reserve(mock_time, clock_path):
+    """Test that reserve() hands out evenly spaced slots."""
+    mock_time.return_value = 1000
+    clock = PacingClock(interval=2, path=clock_path)
+
+    assert [clock.reserve() for i in range(3)] == [0, 2, 4]
+
+    mock_time.return_value = 1010
+    assert clock.reserve() == 0
+
+
+@mock.patch('amazonmws.pacing.time')
+def test_reserve_shared(mock_time, tmp_path):
+    """Test that two clocks using the same file share one schedule."""
+    mock_time.return_value = 1000
+    path = str(tmp_path / 'pacing')
+    first, second = PacingClock(path=path), PacingClock(path=path)
+
+    assert [first.reserve(), second.reserve(), first.reserve()] == [0, 1, 2]
+
+
+@mock.patch('amazonmws.pacing.sleep')
+def test_wait(mock_sleep):
+    """Test that wait() sleeps until the reserved slot."""
+    clock = PacingClock(interval=5)
+    clock.reserve = mock.Mock(return_value=3)
+
+    clock.wait()
+
+    mock_sleep.assert_called_with(3)
+
+
+def test_wait_async():
+    """Test that wait_async() waits for the reserved slot."""
+    clock = PacingClock(interval=0.01)
+    asyncio.run(clock.wait_async())
+    assert clock.reserve() > 0
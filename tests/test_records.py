@@ -0,0 +1,82 @@
+import pickle
+import pytest
+import unittest.mock as mock
+from amazonmws.records import *
+from helpers import page
+
+
+ORDER = """<Order><AmazonOrderId>902-1</AmazonOrderId><MarketplaceId>ATVPDKIKX0DER</MarketplaceId>
+    <OrderStatus>Shipped</OrderStatus><PurchaseDate>2017-01-01T00:00:00Z</PurchaseDate>
+    <OrderTotal><CurrencyCode>USD</CurrencyCode><Amount>12.34</Amount></OrderTotal>
+    <NumberOfItemsShipped>2</NumberOfItemsShipped></Order>"""
+
+OFFERS = page('GetLowestPricedOffersForASIN', """
+    <Identifier><MarketplaceId>ATVPDKIKX0DER</MarketplaceId><ASIN>B000000001</ASIN></Identifier>
+    <Offers><Offer><SubCondition>new</SubCondition>
+        <SellerFeedbackRating><SellerPositiveFeedbackRating>98</SellerPositiveFeedbackRating></SellerFeedbackRating>
+        <ListingPrice><CurrencyCode>USD</CurrencyCode><Amount>19.99</Amount></ListingPrice>
+        <Shipping><Amount>0.00</Amount></Shipping>
+        <IsFulfilledByAmazon>true</IsFulfilledByAmazon><IsBuyBoxWinner>false</IsBuyBoxWinner></Offer>
+    <Offer><SubCondition>used</SubCondition><ListingPrice><Amount>5.5</Amount></ListingPrice></Offer></Offers>""")
+
+PRICES = """<GetMyPriceForASINResponse>
+    <GetMyPriceForASINResult><Product>
+        <Identifiers><MarketplaceASIN><MarketplaceId>M</MarketplaceId><ASIN>A1</ASIN></MarketplaceASIN></Identifiers>
+        <Offers><Offer><SellerSKU>SKU1</SellerSKU><BuyingPrice><LandedPrice><Amount>10.00</Amount></LandedPrice>
+        </BuyingPrice><RegularPrice><Amount>9.00</Amount></RegularPrice></Offer></Offers></Product>
+    </GetMyPriceForASINResult>
+    <GetMyPriceForASINResult><Product>
+        <Identifiers><MarketplaceASIN><MarketplaceId>M</MarketplaceId><ASIN>A2</ASIN></MarketplaceASIN></Identifiers>
+        <Offers><Offer><SellerSKU>SKU2</SellerSKU></Offer><Offer><SellerSKU>SKU3</SellerSKU></Offer></Offers>
+    </Product></GetMyPriceForASINResult>
+</GetMyPriceForASINResponse>"""
+
+
+########################################################################################################################
+
+
+def test_record_fields():
+    """Test building records by position and by name."""
+    record = InventoryRecord('SKU', total=5)
+
+    assert record.sku == 'SKU' and record.total == 5 and record.asin is None
+    assert record == InventoryRecord('SKU', None, None, None, 5)
+    assert record.as_dict()['total'] == 5
+    assert repr(record).startswith("InventoryRecord(sku='SKU', asin=None")
+    assert not hasattr(record, '__dict__')
+    assert pickle.loads(pickle.dumps(record)) == record
+
+    with pytest.raises(TypeError):
+        InventoryRecord(colour='red')
+    with pytest.raises(TypeError):
+        InventoryRecord(*range(7))
+
+
+def test_page_records():
+    """Test reading OrderRecords from ListOrders pages."""
+    api = mock.Mock()
+    api.ListOrders.return_value = page('ListOrders', f'<Orders>{ORDER}</Orders>', next_token='abc')
+    api.ListOrdersByNextToken.return_value = page('ListOrdersByNextToken', f'<Orders>{ORDER}</Orders>')
+
+    orders = list(page_records(api, 'ListOrders', 'Orders/Order', OrderRecord, CreatedAfter='x'))
+
+    assert len(orders) == 2
+    assert orders[0].total == 1234 and orders[0].currency == 'USD' and orders[0].items_shipped == 2
+    assert orders[0].items_unshipped is None
+    assert orders[0].market is orders[1].market
+
+
+def test_offer_records():
+    """Test reading OfferRecords from a GetLowestPricedOffersForASIN response."""
+    new, used = offer_records(OFFERS)
+
+    assert new == OfferRecord('B000000001', 'ATVPDKIKX0DER', 'new', 'USD', 1999, 0, 98, True, False)
+    assert used.listing_price == 550 and used.asin == 'B000000001' and used.fulfilled_by_amazon is None
+
+
+def test_price_records():
+    """Test reading PriceRecords from a GetMyPriceForASIN response with several results."""
+    records = list(price_records(PRICES))
+
+    assert [(record.asin, record.sku) for record in records] == [('A1', 'SKU1'), ('A2', 'SKU2'), ('A2', 'SKU3')]
+    assert records[0].landed_price == 1000 and records[0].regular_price == 900
@@ -0,0 +1,102 @@
+import pytest
+import unittest.mock as mock
+from amazonmws.api import Products
+from amazonmws.replay import *
+from amazonmws.throttler import Throttler
+
+
+CREDENTIALS = ('123456789', '123456789abcdefghijklmnopqrstuvwxyz', 'a1b2c3d4e5f6')
+
+
+def transport(method, url, **kwargs):
+    """A fake transport that echoes the request back."""
+    return mock.Mock(content=f'{method} {url.split("?")[0]} {kwargs.get("data")}'.encode())
+
+
+@pytest.fixture()
+def archive(tmp_path):
+    path = str(tmp_path / 'archive')
+    with Recorder(path, transport) as recorder:
+        api = Products(*CREDENTIALS, make_request=recorder)
+        for i in range(100):
+            api.GetMatchingProductForId(IdType='ASIN', IdList=[f'B{i:09d}'])
+        api.GetServiceStatus(body='feed')
+
+    return path
+
+
+########################################################################################################################
+
+
+def test_request_key():
+    """Test that request keys leave out the timestamp and signature."""
+    key = request_key('post', 'https://host/Products?A=1&Signature=x&Timestamp=y&Z=2', 'body')
+    assert key == b'POST host/Products?A=1&Z=2\nbody'
+
+
+def test_record_replay(archive):
+    """Test replaying recorded requests, with a new API object and a new timestamp."""
+    with Replayer(archive) as replayer:
+        assert len(replayer) == 101
+
+        api = Products(*CREDENTIALS, make_request=replayer)
+        with mock.patch('amazonmws.api.gmtime', return_value=(2030, 1, 1, 0, 0, 0, 1, 1, 0)):
+            assert api.GetMatchingProductForId(IdType='ASIN', IdList=['B000000042']) == \
+                b'POST https://mws.amazonservices.com/Products/2011-10-01 None'
+            assert api.GetServiceStatus(body='feed').endswith(b' feed')
+
+        with pytest.raises(KeyError):
+            api.GetMatchingProductForId(IdType='ASIN', IdList=['B999999999'])
+
+
+def test_replay_through_throttler(archive):
+    """Test replaying requests made through a Throttler."""
+    with Replayer(archive) as replayer:
+        throttler = Throttler(api=Products(*CREDENTIALS, make_request=replayer), limits={})
+        assert throttler.GetMatchingProductForId(IdType='ASIN', IdList=['B000000001']).startswith(b'POST')
+
+
+@mock.patch('amazonmws.replay.sleep')
+def test_replay_speed(mock_sleep, tmp_path):
+    """Test that replays are paced using the recorded times."""
+    path = str(tmp_path / 'archive')
+    with Recorder(path, transport) as recorder:
+        recorder.record(b'key', b'body', elapsed=2)
+
+    with Replayer(path, speed=4) as replayer:
+        replayer.lookup = mock.Mock(return_value=(b'body', 2))
+        assert replayer('GET', 'https://host/') == b'body'
+
+    mock_sleep.assert_called_once_with(0.5)
+
+
+def test_record_append(archive):
+    """Test that recording into an existing archive adds to it, and replaces requests recorded again."""
+    with Recorder(archive, transport) as recorder:
+        recorder.record(b'new', b'one')
+        recorder.record(b'POST mws.amazonservices.com/Products?x', b'two')
+        recorder.record(b'new', b'three')
+
+    with Replayer(archive) as replayer:
+        assert len(replayer) == 103
+        assert replayer.lookup(b'new') == (b'three', 0)
+        assert b'missing' not in replayer
+
+
+def test_empty_archive(tmp_path):
+    """Test replaying an archive with nothing in it."""
+    path = str(tmp_path / 'archive')
+    Recorder(path, transport).close()
+
+    with Replayer(path) as replayer:
+        assert len(replayer) == 0
+        assert b'key' not in replayer
+
+
+def test_bad_index(tmp_path):
+    """Test that files that aren't archive indexes are rejected."""
+    (tmp_path / 'archive').write_bytes(b'')
+    (tmp_path / 'archive.idx').write_bytes(b'not an index, but long enough to have a header')
+
+    with pytest.raises(ValueError):
+        Replayer(str(tmp_path / 'archive'))
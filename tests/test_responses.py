@@ -0,0 +1,71 @@
+import pytest
+import unittest.mock as mock
+from amazonmws.responses import *
+from helpers import ERROR_RESPONSE, page
+
+
+########################################################################################################################
+
+
+@pytest.mark.parametrize('response', [b'<a/>', '<a/>', mock.Mock(content=b'<a/>'), mock.Mock(content=None, text='<a/>')])
+def test_response_body(response):
+    """Test response_body() with different kinds of responses."""
+    assert response_body(response) == b'<a/>'
+
+
+def test_response_body_unreadable():
+    """Test response_body() with something that isn't a response."""
+    with pytest.raises(TypeError):
+        response_body(1234)
+
+
+def test_parse_xml():
+    """Test that parse_xml() removes namespaces."""
+    root = parse_xml(page('ListOrders', '<Orders><Order><AmazonOrderId>1</AmazonOrderId></Order></Orders>'))
+
+    assert root.tag == 'ListOrdersResponse'
+    assert root.findtext('ListOrdersResult/Orders/Order/AmazonOrderId') == '1'
+
+
+def test_parse_xml_error():
+    """Test that parse_xml() raises MWSError for error responses."""
+    with pytest.raises(MWSError) as error:
+        parse_xml(ERROR_RESPONSE)
+
+    assert error.value.code == 'RequestThrottled'
+    assert error.value.error_type == 'Sender'
+
+
+def test_element_to_dict():
+    """Test the element_to_dict() function."""
+    root = parse_xml('<Order><Id>1</Id><Item><Sku>a</Sku></Item><Item><Sku>b</Sku></Item></Order>')
+    assert element_to_dict(root) == {'Id': '1', 'Item': [{'Sku': 'a'}, {'Sku': 'b'}]}
+
+
+def test_iter_pages():
+    """Test that iter_pages() follows NextTokens."""
+    api = mock.Mock()
+    api.ListOrders.return_value = page('ListOrders', '<Page>1</Page>', next_token='abc')
+    api.ListOrdersByNextToken.return_value = page('ListOrdersByNextToken', '<Page>2</Page>')
+
+    pages = [result.findtext('Page') for result in iter_pages(api, 'ListOrders', CreatedAfter='x')]
+
+    assert pages == ['1', '2']
+    api.ListOrders.assert_called_with(CreatedAfter='x')
+    api.ListOrdersByNextToken.assert_called_with(NextToken='abc')
+
+
+@pytest.mark.parametrize('value, cents', [
+    ('12.34', 1234), ('-0.5', -50), ('3', 300), ('1.005', 101), ('-2.994', -299), ('0.07', 7), (' 4.20\n', 420),
+    ('-1.25', -125), ('.99', 99), ('+5.00', 500)
+])
+def test_to_cents(value, cents):
+    """Test the to_cents() function."""
+    assert to_cents(value) == cents
+
+
+@pytest.mark.parametrize('cents, value', [(1234, '12.34'), (-50, '-0.50'), (300, '3.00'), (-299, '-2.99'), (0, '0.00')])
+def test_amount(cents, value):
+    """Test that amount() formats hundredths, and reverses to_cents()."""
+    assert amount(cents) == value
+    assert to_cents(amount(cents)) == cents
@@ -0,0 +1,190 @@
+import pytest
+import unittest.mock as mock
+from amazonmws.responses import MWSError
+from amazonmws.snapshot import *
+from amazonmws.api import Products
+from helpers import ERROR_RESPONSE, page
+
+
+CREDENTIALS = ('123456789', '123456789abcdefghijklmnopqrstuvwxyz', 'a1b2c3d4e5f6')
+
+
+#: Each ASIN's categories, as chains from the root down. Books/Fiction is shared.
+CATEGORIES = {
+    'B000000001': [[('1000', 'Books'), ('17', 'Fiction'), ('170', 'Mystery')]],
+    'B000000002': [[('1000', 'Books'), ('17', 'Fiction'), ('171', 'Romance')], [('2000', 'Kindle'), ('21', 'Ebooks')]],
+    'B000000003': [[('1000', 'Books'), ('17', 'Fiction')]],
+}
+
+
+def categories_response(chains):
+    selves = []
+    for chain in chains:
+        xml = ''
+        for category_id, name in chain:
+            parent = f'<Parent>{xml}</Parent>' if xml else ''
+            xml = f'<ProductCategoryId>{category_id}</ProductCategoryId><ProductCategoryName>{name}' \
+                  f'</ProductCategoryName>{parent}'
+        selves.append(f'<Self>{xml}</Self>')
+
+    return page('GetProductCategoriesForASIN', ''.join(selves))
+
+
+def recommendations_response():
+    return page('ListRecommendations', """
+        <InventoryRecommendations><member><ItemIdentifier><Asin>B000000001</Asin></ItemIdentifier>
+        <RecommendationReason>Low stock</RecommendationReason></member></InventoryRecommendations>
+        <PricingRecommendations><member><ItemIdentifier><Asin>B000000009</Asin></ItemIdentifier>
+        <RecommendationReason>Lower price</RecommendationReason></member></PricingRecommendations>""")
+
+
+@pytest.fixture()
+def products():
+    def categories(MarketplaceId, ASIN):
+        if ASIN not in CATEGORIES:
+            raise MWSError('InvalidParameterValue', f'Invalid ASIN {ASIN}', 'Sender')
+        return categories_response(CATEGORIES[ASIN])
+
+    products = mock.Mock()
+    products.GetProductCategoriesForASIN.side_effect = categories
+    return products
+
+
+@pytest.fixture()
+def recommendations():
+    recommendations = mock.Mock()
+    recommendations.ListRecommendations.return_value = recommendations_response()
+    return recommendations
+
+
+########################################################################################################################
+
+
+def test_category_chains():
+    """Test reading the categories from a GetProductCategoriesForASIN response."""
+    assert category_chains(categories_response(CATEGORIES['B000000002'])) == CATEGORIES['B000000002']
+
+
+def test_graph_shares_categories(products):
+    """Test that categories shared by several ASINs are only stored once."""
+    snapshot = SnapshotBuilder(products).build(CATEGORIES)
+
+    assert len(snapshot.graph) == 6
+    assert snapshot.chains('B000000001') == CATEGORIES['B000000001']
+    assert snapshot.chains('B000000003') == CATEGORIES['B000000003']
+    assert snapshot.categories['B000000003'] == (snapshot.graph.slot('17'),)
+    assert snapshot.chains('B000000009') is None
+
+
+def test_graph_category_with_two_parents(tmp_path):
+    """Test that a category under two parents keeps both chains."""
+    chains = [[('1', 'Root1'), ('9', 'Shared')], [('2', 'Root2'), ('9', 'Shared')]]
+    snapshot = CatalogSnapshot()
+    snapshot.add_categories('B000000001', chains)
+    snapshot.add_categories('B000000002', chains[1:])
+
+    assert len(snapshot.graph) == 4
+    assert snapshot.chains('B000000001') == chains
+    assert snapshot.chains('B000000002') == chains[1:]
+    assert snapshot.graph.slot('9') == snapshot.graph.slot('9', snapshot.graph.slot('1', -1))
+    assert snapshot.categories['B000000002'] == (snapshot.graph.slot('9', snapshot.graph.slot('2', -1)),)
+    assert snapshot.graph.slot('9', -1) is None
+
+    path = str(tmp_path / 'snapshot')
+    snapshot.write(path)
+    with SnapshotIndex(path) as index:
+        assert index.categories('B000000001') == chains
+
+
+def test_build_with_recommendations(products, recommendations):
+    """Test that recommendations are collected for the marketplace, and that rejected ASINs have no categories."""
+    snapshot = SnapshotBuilder(products, recommendations, market='UK').build([*CATEGORIES, 'BAD'])
+
+    recommendations.ListRecommendations.assert_called_once_with(MarketplaceId='A1F83G8C2ARO7P')
+    assert snapshot.recommendations == {
+        'B000000001': [('Inventory', 'Low stock')],
+        'B000000009': [('Pricing', 'Lower price')]
+    }
+    assert snapshot.chains('BAD') == []
+
+
+def test_rejected_asin_error_response():
+    """Test that an ErrorResponse returned by the API (which is how a real API object reports errors) for a rejected
+    ASIN doesn't stop the build."""
+    invalid = ERROR_RESPONSE.replace('RequestThrottled', 'InvalidParameterValue')
+
+    def transport(method, url, **kwargs):
+        if 'ASIN=BAD' in url:
+            return mock.Mock(status_code=400, content=invalid.encode(), headers={})
+        return mock.Mock(status_code=200, content=categories_response(CATEGORIES['B000000001']).encode(), headers={})
+
+    snapshot = SnapshotBuilder(Products(*CREDENTIALS, make_request=transport)).build(['BAD', 'B000000001'])
+
+    assert snapshot.chains('BAD') == []
+    assert snapshot.chains('B000000001') == CATEGORIES['B000000001']
+
+
+def test_server_errors_propagate(products):
+    """Test that errors other than a rejected ASIN stop the build."""
+    products.GetProductCategoriesForASIN.side_effect = MWSError('InternalError', 'Oops', 'Receiver')
+
+    with pytest.raises(MWSError):
+        SnapshotBuilder(products, max_workers=1).build(CATEGORIES)
+
+
+def test_resume_from_journal(tmp_path, products, recommendations):
+    """Test that a build that was interrupted resumes without requesting results again."""
+    journal = str(tmp_path / 'journal')
+    original = products.GetProductCategoriesForASIN.side_effect
+
+    def interrupted(MarketplaceId, ASIN):
+        if ASIN == 'B000000003':
+            raise ConnectionError()
+        return original(MarketplaceId, ASIN)
+
+    products.GetProductCategoriesForASIN.side_effect = interrupted
+    with pytest.raises(ConnectionError):
+        SnapshotBuilder(products, recommendations, journal=journal, max_workers=1).build(CATEGORIES)
+
+    with open(journal, 'a') as file:
+        file.write('["categories","B0000')            # A line cut short by the interruption
+
+    products.reset_mock()
+    products.GetProductCategoriesForASIN.side_effect = original
+    recommendations.reset_mock()
+    snapshot = SnapshotBuilder(products, recommendations, journal=journal).build(CATEGORIES)
+
+    products.GetProductCategoriesForASIN.assert_called_once_with(MarketplaceId=mock.ANY, ASIN='B000000003')
+    recommendations.ListRecommendations.assert_not_called()
+    assert snapshot.chains('B000000002') == CATEGORIES['B000000002']
+    assert snapshot.recommendations['B000000009'] == [('Pricing', 'Lower price')]
+
+
+def test_write_and_read_index(tmp_path, products, recommendations):
+    """Test writing a snapshot and looking ASINs up in the index."""
+    path = str(tmp_path / 'snapshot')
+    snapshot = SnapshotBuilder(products, recommendations).build([*CATEGORIES, 'BAD'])
+    snapshot.write(path)
+
+    with SnapshotIndex(path) as index:
+        assert len(index) == 5
+        for asin, chains in CATEGORIES.items():
+            assert asin in index
+            assert index.categories(asin) == chains
+
+        assert index.categories('BAD') == []
+        assert index.recommendations('B000000001') == [('Inventory', 'Low stock')]
+        assert index.categories('B000000009') == []
+        assert index.recommendations('B000000009') == [('Pricing', 'Lower price')]
+        assert 'B000000404' not in index
+        assert index.categories('B000000404') is None
+        assert index.recommendations('B000000404') == []
+
+
+def test_not_an_index(tmp_path):
+    """Test that files that aren't snapshot indexes are rejected."""
+    path = tmp_path / 'other'
+    path.write_bytes(b'not a snapshot index at all, just some bytes')
+
+    with pytest.raises(ValueError):
+        SnapshotIndex(str(path))
@@ -1,6 +1,10 @@
+import gc
+import threading
+import weakref
 import pytest
 import unittest.mock as mock
-from amazonmws.throttler import Throttler, DEFAULT_LIMITS
+from amazonmws.api import MARKETID
+from amazonmws.throttler import *
 
 
 @pytest.fixture(params=['under_quota', 'at_quota', 'over_quota'])
@@ -172,3 +176,379 @@ def test_add_to_quota_no_limits(throttler):
 
 
 
+@mock.patch('amazonmws.throttler.time')
+def test_restore_quota_repeated(mock_time, throttler):
+    """Test that calling restore_quota() twice doesn't restore the same elapsed time twice."""
+    quota_level = throttler._usage['ListMatchingProducts']['quota_level']
+
+    mock_time.return_value = 1027
+    throttler.restore_quota('ListMatchingProducts')
+    throttler.restore_quota('ListMatchingProducts')
+
+    assert throttler._usage['ListMatchingProducts']['quota_level'] == quota_level - 5
+
+
+@mock.patch('amazonmws.throttler.time')
+def test_snapshot_restore(mock_time, throttler):
+    """Test that restore() applies the time elapsed since snapshot() was called."""
+    mock_time.return_value = 1000
+    quota_level = throttler._usage['ListMatchingProducts']['quota_level']
+    throttler.limits['Custom'] = {'quota_max': 3, 'restore_rate': 7}
+    snapshot = throttler.snapshot()
+
+    assert snapshot['usage'] == {'ListMatchingProducts': [quota_level, 1000]}
+    assert snapshot['limits'] == {'Custom': [3, 7, None]}
+
+    mock_time.return_value = 1010
+    restored = Throttler()
+    restored.restore(snapshot)
+
+    assert restored._usage['ListMatchingProducts']['quota_level'] == quota_level - 2
+    assert restored.limits['Custom'] == {'quota_max': 3, 'restore_rate': 7}
+
+
+def test_restore_bad_version(throttler):
+    """Test that restore() rejects snapshots with an unknown version."""
+    with pytest.raises(ValueError):
+        throttler.restore({'version': -1})
+
+
+def test_save_load_state(tmp_path, throttler):
+    """Test writing state to a file and reading it back."""
+    path = str(tmp_path / 'state.json')
+    throttler.save_state(path)
+
+    restored = Throttler()
+    assert restored.load_state(path) is True
+    assert set(restored._usage) == {'ListMatchingProducts'}
+
+
+def test_load_state_missing(tmp_path):
+    """Test that load_state() returns False when the file doesn't exist."""
+    assert Throttler().load_state(str(tmp_path / 'missing.json')) is False
+
+
+def test_load_state_other_version(tmp_path):
+    """Test that a state file saved by another version is treated as unreadable, rather than failing __init__."""
+    path = tmp_path / 'state.json'
+    path.write_text('{"version": -1, "usage": {}}')
+
+    assert Throttler().load_state(str(path)) is False
+    assert Throttler(state_file=str(path))._usage == {}
+
+
+def test_save_state_temporary_file(tmp_path, throttler):
+    """Test that save_state() leaves no temporary files behind."""
+    throttler.save_state(str(tmp_path / 'state.json'))
+    assert [p.name for p in tmp_path.iterdir()] == ['state.json']
+
+
+@mock.patch('amazonmws.throttler.atexit')
+def test_state_file_autosave(mock_atexit, tmp_path):
+    """Test that a throttler with a state_file saves its usage periodically."""
+    path = tmp_path / 'state.json'
+    throttler = Throttler(api=mock.Mock(), state_file=str(path), save_interval=0)
+    save_at_exit = mock_atexit.register.call_args[0][0]
+
+    throttler.api_call('GetServiceStatus')
+
+    assert path.exists()
+    assert Throttler(state_file=str(path))._usage['GetServiceStatus']['quota_level'] == 1
+
+    throttler.close()
+    mock_atexit.unregister.assert_called_with(save_at_exit)
+
+
+@mock.patch('amazonmws.throttler.atexit')
+def test_state_file_not_kept_alive(mock_atexit, tmp_path):
+    """Test that the exit handler doesn't keep the throttler alive, and does nothing once it's gone."""
+    throttler = Throttler(state_file=str(tmp_path / 'state.json'))
+    save_at_exit = mock_atexit.register.call_args[0][0]
+    ref = weakref.ref(throttler)
+
+    del throttler
+    gc.collect()
+
+    assert ref() is None
+    save_at_exit()
+    assert not (tmp_path / 'state.json').exists()
+
+
+def test_snapshot_while_adding_actions():
+    """Test that snapshot() can be called while other threads add actions to the usage and limits."""
+    actions = [f'Action{i}' for i in range(2000)]
+    throttler = Throttler(limits={action: {'quota_max': 10, 'restore_rate': 1} for action in actions})
+    done = threading.Event()
+    errors = []
+
+    def take_snapshots():
+        while not done.is_set():
+            try:
+                throttler.snapshot()
+            except RuntimeError as e:
+                errors.append(e)
+
+    thread = threading.Thread(target=take_snapshots)
+    thread.start()
+    try:
+        for i, action in enumerate(actions):
+            throttler.api_call(action)
+            throttler.restore({'version': STATE_VERSION, 'limits': {f'Custom{i}': [1, 1, None]}})
+    finally:
+        done.set()
+        thread.join()
+
+    assert errors == []
+    assert len(throttler.snapshot()['usage']) == len(actions)
+
+
+def test_fan_out():
+    """Test that fan_out() calls the action once per marketplace and keys the results by marketplace."""
+    api = mock.Mock()
+    api.ListMatchingProducts.side_effect = lambda **kwargs: kwargs['MarketplaceId']
+    throttler = Throttler(api=api)
+
+    results = throttler.fan_out('ListMatchingProducts', ['DE', 'FR', 'UK'], Query='turtles')
+
+    assert results == {'DE': MARKETID['DE'], 'FR': MARKETID['FR'], 'UK': MARKETID['UK']}
+    assert api.ListMatchingProducts.call_count == 3
+    assert throttler._usage['ListMatchingProducts']['quota_level'] == 3
+
+
+def test_fan_out_no_markets():
+    """Test fan_out() with an empty list of marketplaces."""
+    assert Throttler(api=mock.Mock()).fan_out('ListMatchingProducts', []) == {}
+
+
+@mock.patch('amazonmws.throttler.time')
+def test_restore_quota_future(mock_time, throttler):
+    """Test that restore_quota() doesn't add to the quota when last_request is in the future."""
+    quota_level = throttler._usage['ListMatchingProducts']['quota_level']
+    mock_time.return_value = 999.9
+
+    throttler.restore_quota('ListMatchingProducts')
+
+    assert throttler._usage['ListMatchingProducts']['quota_level'] == quota_level
+
+
+def test_cache_lookup():
+    """Test that api_call() returns values from the cache instead of calling the API."""
+    api = mock.Mock()
+    cache = {cache_key('GetMyPriceForASIN', ASIN=['B1'], MarketplaceId='M'): 'cached'}
+    throttler = Throttler(api=api, cache=cache)
+
+    assert throttler.api_call('GetMyPriceForASIN', MarketplaceId='M', ASIN=['B1']) == 'cached'
+    assert api.GetMyPriceForASIN.call_count == 0
+
+    throttler.api_call('GetMyPriceForASIN', MarketplaceId='M', ASIN=['B2'])
+    assert api.GetMyPriceForASIN.call_count == 1
+
+
+def test_cache_key_nested():
+    """Test that cache_key() handles nested lists and dicts, and rejects values it can't hash."""
+    assert cache_key('A', x={'b': [1, {'c': 2}], 'a': 1}) == cache_key('A', x={'a': 1, 'b': [1, {'c': 2}]})
+
+    with pytest.raises(TypeError):
+        cache_key('A', x=[{1, 2}])
+
+
+def test_cache_uncacheable():
+    """Test that calls with parameters that can't be hashed skip the cache instead of failing."""
+    api = mock.Mock()
+    throttler = Throttler(api=api, cache={})
+
+    throttler.ListOrders(x={'a': 1}, y=[{1, 2}])
+    assert api.ListOrders.call_count == 1
+
+
+@mock.patch('amazonmws.throttler.time')
+def test_ttl_cache(mock_time):
+    """Test that TTLCache entries expire, and that the oldest are evicted past maxsize."""
+    mock_time.return_value = 1000
+    cache = TTLCache(ttl=10, maxsize=2)
+    cache['a'] = 1
+    mock_time.return_value = 1005
+    cache['b'] = 2
+    mock_time.return_value = 1008
+    cache['c'] = 3
+
+    assert 'a' not in cache
+    assert cache.get('b') == 2
+
+    mock_time.return_value = 1015
+    assert cache.get('b') is None
+    assert list(cache) == ['c']
+
+
+def test_api_call_timeout():
+    """Test that api_call() passes the remaining time on to the API."""
+    api = mock.Mock()
+    Throttler(api=api).api_call('ListMatchingProducts', timeout=10, Query='x')
+
+    kwargs = api.ListMatchingProducts.call_args[1]
+    assert kwargs['Query'] == 'x'
+    assert 9 < kwargs['timeout'] <= 10
+
+
+@mock.patch('amazonmws.throttler.sleep')
+def test_api_call_deadline_exceeded(mock_sleep):
+    """Test that api_call() fails right away if it would have to wait past the deadline."""
+    api = mock.Mock()
+    throttler = Throttler(api=api)
+    for i in range(DEFAULT_LIMITS['GetServiceStatus']['quota_max']):
+        throttler.add_to_quota('GetServiceStatus')
+
+    with pytest.raises(DeadlineExceeded):
+        throttler.api_call('GetServiceStatus', timeout=5)
+
+    assert mock_sleep.call_count == 0
+    assert api.GetServiceStatus.call_count == 0
+    assert throttler.api_call('GetServiceStatus', timeout=301) is not None
+
+
+def test_api_call_cancelled():
+    """Test that cancelling a token from another thread interrupts a waiting call."""
+    api = mock.Mock()
+    throttler = Throttler(api=api)
+    for i in range(DEFAULT_LIMITS['GetServiceStatus']['quota_max']):
+        throttler.add_to_quota('GetServiceStatus')
+
+    token = CancelToken()
+    threading.Timer(0.05, token.cancel).start()
+
+    with pytest.raises(Cancelled):
+        throttler.api_call('GetServiceStatus', cancel=token)
+
+    assert api.GetServiceStatus.call_count == 0
+
+    with pytest.raises(Cancelled):
+        throttler.api_call('ListMatchingProducts', cancel=token)
+
+
+def test_getattr_cached():
+    """Test that action shortcuts are stored on the Throttler instance."""
+    throttler = Throttler(api=mock.Mock())
+    shortcut = throttler.ListMatchingProducts
+
+    assert vars(throttler)['ListMatchingProducts'] is shortcut
+    assert shortcut.args == ('ListMatchingProducts',)
+
+
+def test_getattr_unknown_action():
+    """Test that the Throttler rejects actions its API object doesn't support."""
+    from amazonmws.api import Orders
+    throttler = Throttler(api=Orders('key', 'secret', 'seller'))
+
+    with pytest.raises(AttributeError):
+        throttler.ListMatchingProducts
+
+
+def test_call_batched():
+    """Test that call_batched() makes one throttled call per batch the catalog allows."""
+    api = mock.Mock()
+    api.GetMatchingProductForId.side_effect = lambda **kwargs: kwargs['IdList']
+    throttler = Throttler(api=api)
+
+    results = throttler.call_batched('GetMatchingProductForId', 'IdList', range(12), IdType='ASIN')
+
+    assert results == [[0, 1, 2, 3, 4], [5, 6, 7, 8, 9], [10, 11]]
+    assert throttler._usage['GetMatchingProductForId']['quota_level'] == 3
+
+
+@mock.patch('amazonmws.throttler.sleep')
+@mock.patch('amazonmws.throttler.time')
+def test_hourly_budget(mock_time, mock_sleep):
+    """Test that api_call() keeps each consumer within its share of an action's hourly_max."""
+    clock = [0]
+    mock_time.side_effect = lambda: clock[0]
+    mock_sleep.side_effect = lambda seconds: clock.__setitem__(0, clock[0] + seconds)
+
+    throttler = Throttler(api=mock.Mock(), limits={'RequestReport': {'quota_max': 100, 'restore_rate': 1,
+                                                                     'hourly_max': 6}})
+    throttler.register_consumer('reports', weight=2)
+    throttler.budget_wait('RequestReport', 'pricing')      # Make pricing an active consumer
+
+    for i in range(4):
+        throttler.api_call('RequestReport', consumer='reports')
+    assert clock[0] == 0
+
+    # reports has used its share (4 of 6); the rest is set aside for pricing, until it goes idle
+    throttler.api_call('RequestReport', consumer='reports')
+    assert clock[0] == 600
+
+    assert throttler.budget('RequestReport').used.total(clock[0]) == 5
+    assert throttler.budget('ListMatchingProducts') is None
+
+
+@mock.patch('amazonmws.throttler.time')
+def test_hourly_budget_saved(mock_time, tmp_path):
+    """Test that hourly budget usage survives a restart, so a restarted process can't exceed hourly_max."""
+    mock_time.return_value = 960             # The start of a one-minute bucket
+    limits = {'RequestReport': {'quota_max': 100, 'restore_rate': 1, 'hourly_max': 3}}
+    path = str(tmp_path / 'state.json')
+
+    throttler = Throttler(api=mock.Mock(), limits=dict(limits))
+    for _ in range(3):
+        throttler.api_call('RequestReport', consumer='reports')
+    throttler.save_state(path)
+
+    mock_time.return_value = 1600
+    restarted = Throttler(api=mock.Mock(), limits=dict(limits))
+    assert restarted.load_state(path) is True
+    assert restarted.budget_wait('RequestReport', 'reports') == 960 + 3660 - 1600
+
+    mock_time.return_value = 960 + 3660
+    assert restarted.budget_wait('RequestReport', 'reports') == 0
+
+
+def test_hourly_budget_wait_releases_lock():
+    """Test that a consumer waiting for its hourly budget doesn't block consumers that still have budget left."""
+    api = mock.Mock()
+    throttler = Throttler(api=api, limits={'RequestReport': {'quota_max': 100, 'restore_rate': 1, 'hourly_max': 4}})
+    throttler.api_call('RequestReport', consumer='pricing')
+    throttler.api_call('RequestReport', consumer='reports')
+    throttler.api_call('RequestReport', consumer='reports')
+
+    # reports has used its share, and the rest is set aside for pricing, so this call waits
+    cancel = CancelToken()
+    errors = []
+
+    def wait_for_budget():
+        try:
+            throttler.api_call('RequestReport', consumer='reports', cancel=cancel)
+        except Cancelled as e:
+            errors.append(e)
+
+    waiting = threading.Thread(target=wait_for_budget)
+    waiting.start()
+
+    try:
+        other = threading.Thread(target=throttler.api_call, args=('RequestReport',), kwargs={'consumer': 'pricing'})
+        other.start()
+        other.join(timeout=5)
+
+        assert not other.is_alive()
+        assert api.RequestReport.call_count == 4
+        assert waiting.is_alive()
+    finally:
+        cancel.cancel()
+        waiting.join()
+
+    assert len(errors) == 1
+
+
+def test_register_consumer_weight():
+    """Test that consumer weights must be positive."""
+    with pytest.raises(ValueError):
+        Throttler().register_consumer('reports', weight=0)
+
+
+@mock.patch('amazonmws.throttler.time', return_value=0)
+def test_hourly_budget_deadline(mock_time):
+    """Test that calls that would exceed the hourly budget before their deadline fail right away."""
+    throttler = Throttler(api=mock.Mock(), limits={'RequestReport': {'quota_max': 100, 'restore_rate': 1,
+                                                                     'hourly_max': 1}})
+    throttler.api_call('RequestReport')
+
+    with pytest.raises(DeadlineExceeded):
+        throttler.api_call('RequestReport', timeout=60)